@@ -0,0 +1,226 @@
+import json
+import dateutil.parser
+from datetime import datetime
+from flask import (Blueprint, Response, request, jsonify, stream_with_context)
+from sqlalchemy import tuple_
+from models import (db, Venue, Artist, Show, venue_genres, artist_genres)
+from queries import (encode_cursor, decode_cursor)
+from genres import (split_genres, genre_filter)
+from replicas import read_only
+
+
+# ----------------------------------------------------------------------------#
+# JSON API.
+#
+#   GET /api/venues    ?genre=
+#   GET /api/artists   ?genre=
+#   GET /api/shows     ?from= &to= &venue_id= &artist_id=
+#
+# Common parameters:
+#   fields  comma separated subset of the resource fields, default all
+#   limit   rows per page, default API_PAGE_SIZE, 0 streams every row
+#   after   next_cursor of the previous page
+#   format  json (default) or ndjson
+#
+# Responses are generated while the rows come off a server side cursor,
+# so a full export never sits in memory. json bodies are
+# {"data": [...], "next_cursor": ...}; ndjson bodies are one object per
+# line, followed by a {"next_cursor": ...} line when there is a next page.
+# ----------------------------------------------------------------------------#
+
+API_PAGE_SIZE = 100
+API_MAX_PAGE_SIZE = 10000
+# rows fetched from the cursor and written to the response at a time
+API_CHUNK_SIZE = 500
+
+VENUE_FIELDS = {
+    'id': Venue.id,
+    'name': Venue.name,
+    'city': Venue.city,
+    'state': Venue.state,
+    'address': Venue.address,
+    'phone': Venue.phone,
+    'genres': Venue.genres_text,
+    'image_link': Venue.image_link,
+    'facebook_link': Venue.facebook_link,
+    'upcoming_shows_count': Venue.upcoming_shows_count,
+    'past_shows_count': Venue.past_shows_count,
+}
+
+ARTIST_FIELDS = {
+    'id': Artist.id,
+    'name': Artist.name,
+    'city': Artist.city,
+    'state': Artist.state,
+    'phone': Artist.phone,
+    'genres': Artist.genres_text,
+    'image_link': Artist.image_link,
+    'facebook_link': Artist.facebook_link,
+    'upcoming_shows_count': Artist.upcoming_shows_count,
+    'past_shows_count': Artist.past_shows_count,
+}
+
+SHOW_FIELDS = {
+    'id': Show.id,
+    'venue_id': Show.venue_id,
+    'venue_name': Venue.name,
+    'artist_id': Show.artist_id,
+    'artist_name': Artist.name,
+    'artist_image_link': Artist.image_link,
+    'start_time': Show.show_time,
+}
+
+api = Blueprint('api', __name__, url_prefix='/api')
+
+
+class ApiError(Exception):
+    pass
+
+
+@api.errorhandler(ApiError)
+def bad_request(error):
+    return jsonify({'error': 400, 'message': str(error)}), 400
+
+
+def _fields(available):
+    names = request.args.get('fields')
+    if not names:
+        return list(available)
+    fields = [name.strip() for name in names.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in available]
+    if unknown or not fields:
+        raise ApiError('unknown fields: {}, choose from {}'.format(
+            ', '.join(unknown), ', '.join(available)))
+    return fields
+
+
+def _limit():
+    limit = request.args.get('limit', API_PAGE_SIZE, type=int)
+    if limit is None or limit < 0 or limit > API_MAX_PAGE_SIZE:
+        raise ApiError('limit must be between 0 and {}'.format(API_MAX_PAGE_SIZE))
+    return limit
+
+
+def _arg(key, parse):
+    value = request.args.get(key)
+    if not value:
+        return None
+    try:
+        return parse(value)
+    except (ValueError, OverflowError):
+        raise ApiError('invalid {}: {}'.format(key, value))
+
+
+def _value(field, value):
+    if field == 'genres':
+        return split_genres(value)
+    if isinstance(value, datetime):
+        return value.isoformat()
+    return value
+
+
+def _stream(query, fields, limit, cursor_of):
+    '''
+    Stream the rows of `query` as a page of at most `limit` rows. The
+    query selects the requested fields followed by the cursor columns.
+    '''
+    fmt = request.args.get('format', 'json')
+    if fmt not in ('json', 'ndjson'):
+        raise ApiError('format must be json or ndjson')
+    if limit:
+        # one extra row tells whether there is a next page
+        query = query.limit(limit + 1)
+    rows = query.execution_options(stream_results=True).yield_per(API_CHUNK_SIZE)
+    width = len(fields)
+
+    def generate():
+        try:
+            count = 0
+            last = None
+            next_cursor = None
+            chunk = []
+            yield '' if fmt == 'ndjson' else '{"data": ['
+            for row in rows:
+                if limit and count == limit:
+                    next_cursor = cursor_of(last)
+                    break
+                record = json.dumps(dict((field, _value(field, value))
+                                         for field, value in zip(fields, row[:width])))
+                if fmt == 'ndjson':
+                    chunk.append(record + '\n')
+                else:
+                    chunk.append(',' + record if count else record)
+                count += 1
+                last = row
+                if len(chunk) == API_CHUNK_SIZE:
+                    yield ''.join(chunk)
+                    chunk = []
+            yield ''.join(chunk)
+            if fmt == 'ndjson':
+                if next_cursor is not None:
+                    yield json.dumps({'next_cursor': next_cursor}) + '\n'
+            else:
+                yield '], "next_cursor": {}}}'.format(json.dumps(next_cursor))
+        finally:
+            db.session.close()
+
+    mimetype = 'application/x-ndjson' if fmt == 'ndjson' else 'application/json'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
+
+def _entities(model, available, association):
+    fields = _fields(available)
+    limit = _limit()
+    after = _arg('after', int)
+    query = db.session.query(*([available[field] for field in fields] + [model.id]))
+    if request.args.get('genre'):
+        query = genre_filter(query, model, association, request.args.get('genre'))
+    if after is not None:
+        query = query.filter(model.id > after)
+    query = query.order_by(model.id)
+    return _stream(query, fields, limit, lambda row: str(row[-1]))
+
+
+@api.route('/venues')
+@read_only
+def venues():
+    return _entities(Venue, VENUE_FIELDS, venue_genres)
+
+
+@api.route('/artists')
+@read_only
+def artists():
+    return _entities(Artist, ARTIST_FIELDS, artist_genres)
+
+
+@api.route('/shows')
+@read_only
+def shows():
+    fields = _fields(SHOW_FIELDS)
+    limit = _limit()
+    after = _arg('after', decode_cursor)
+    start = _arg('from', dateutil.parser.parse)
+    end = _arg('to', dateutil.parser.parse)
+    venue_id = _arg('venue_id', int)
+    artist_id = _arg('artist_id', int)
+
+    query = db.session.query(*([SHOW_FIELDS[field] for field in fields] + [Show.show_time, Show.id])) \
+        .select_from(Show) \
+        .filter(Show.show_time.isnot(None))
+    # only join the tables the selected fields come from
+    if 'venue_name' in fields:
+        query = query.join(Venue, Venue.id == Show.venue_id)
+    if 'artist_name' in fields or 'artist_image_link' in fields:
+        query = query.join(Artist, Artist.id == Show.artist_id)
+    if start is not None:
+        query = query.filter(Show.show_time >= start)
+    if end is not None:
+        query = query.filter(Show.show_time < end)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if after is not None:
+        query = query.filter(tuple_(Show.show_time, Show.id) > tuple_(*after))
+    query = query.order_by(Show.show_time, Show.id)
+    return _stream(query, fields, limit, lambda row: encode_cursor(row[-2], row[-1]))
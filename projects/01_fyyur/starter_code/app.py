@@ -7,7 +7,9 @@ import dateutil.parser
 import babel
 import datetime
 import sys
+import click
 from flask import (render_template,
+                    g,
                     request,
                     Response,
                     flash,
@@ -16,15 +18,42 @@ from flask import (render_template,
                     jsonify)
 from flask_moment import Moment
 import logging
-from logging import (Formatter, FileHandler)
 from flask_wtf import Form
 from forms import *
 from sqlalchemy import (or_, and_)
-from models import (db, app, Venue, Artist, Show)
+from models import (db, app, Venue, Artist, Show, artist_genres)
+from queries import (iter_venue_areas,
+                     iter_show_page,
+                     venue_detail,
+                     artist_detail,
+                     venue_artist_ids,
+                     artist_venue_ids,
+                     DETAIL_PAST_SHOWS_LIMIT,
+                     STREAM_CHUNK_ROWS)
+import counters
+import bulk
+import archive
+import booking
+import partitions
+import synthetic
+import search
+from streaming import render_page
+from cache import PageCache
+from genres import (set_genres, genre_filter)
+import dates
+import pool
+from replicas import (read_only, get_router)
+from instrumentation import Instrumentation
+import applog
+from api import api
 #----------------------------------------------------------------------------#
 # App Config.
 #----------------------------------------------------------------------------#
 
+page_cache = PageCache.from_config(app.config)
+app.register_blueprint(api)
+instrumentation = Instrumentation(app)
+applog.init_app(app)
 
 
 
@@ -32,15 +61,122 @@ from models import (db, app, Venue, Artist, Show)
 # Filters.
 #----------------------------------------------------------------------------#
 
-def format_datetime(value, format='medium'):
-    date = dateutil.parser.parse(value)
-    if format == 'full':
-        format="EEEE MMMM, d, y 'at' h:mma"
-    elif format == 'medium':
-        format="EE MM, dd, y h:mma"
-    return babel.dates.format_datetime(date, format)
+# memoized, takes datetime objects, see dates.py
+app.jinja_env.filters['datetime'] = dates.format_datetime
 
-app.jinja_env.filters['datetime'] = format_datetime
+#----------------------------------------------------------------------------#
+# Show counters.
+#----------------------------------------------------------------------------#
+
+def invalidate_rolled_over(rolled):
+    if rolled is None:
+        # every counter was rebuilt
+        page_cache.clear()
+        return
+    venue_ids, artist_ids = rolled
+    if venue_ids or artist_ids:
+        page_cache.invalidate('venues', 'artists',
+                              *(['venue:%s' % venue_id for venue_id in venue_ids] +
+                                ['artist:%s' % artist_id for artist_id in artist_ids]))
+
+
+@app.before_request
+def roll_over_show_counters():
+    # move started shows from upcoming to past, at most once a minute
+    if not app.config['ROLLOVER_IN_REQUESTS']:
+        return
+    try:
+        invalidate_rolled_over(counters.roll_over_if_due())
+    except Exception as e:
+        app.logger.exception('roll_over_show_counters failed')
+        db.session.rollback()
+    finally:
+        # upkeep, not a write of this reader: do not pin them to the
+        # primary, see replicas.py
+        g.pop('wrote', None)
+
+
+@app.cli.command('roll-over-counters')
+def roll_over_counters():
+    """Move the shows that started since the last roll over to the past counters."""
+    rolled = counters.roll_over()
+    invalidate_rolled_over(rolled)
+    if rolled is None:
+        click.echo('counters rebuilt')
+    else:
+        click.echo('{} venues, {} artists rolled over'.format(len(rolled[0]), len(rolled[1])))
+
+
+@app.cli.command('rebuild-counters')
+def rebuild_counters():
+    """Recompute the upcoming/past show counters of every venue and artist."""
+    counters.rebuild()
+    page_cache.clear()
+
+#----------------------------------------------------------------------------#
+# Bulk import / export.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('import-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(exists=True, dir_okay=False))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to csv for .csv files, ndjson otherwise.')
+@click.option('--chunk-size', default=bulk.CHUNK_SIZE, show_default=True)
+def import_data(kind, path, fmt, chunk_size):
+    """Import venues, artists or shows from a CSV or NDJSON file."""
+    def on_error(line_num, message):
+        click.echo('line {}: {}'.format(line_num, message), err=True)
+
+    with open(path, newline='') as stream:
+        report = bulk.import_rows(kind, stream, fmt or bulk.guess_format(path),
+                                  chunk_size, on_error)
+    page_cache.invalidate('venues', 'artists', 'shows')
+    click.echo('{accepted} {kind} imported, {rejected} rejected in {seconds:.1f}s '
+               '({rows_per_second:.0f} rows/s)'.format(**report))
+
+
+@app.cli.command('export-data')
+@click.argument('kind', type=click.Choice(['venues', 'artists', 'shows']))
+@click.argument('path', type=click.Path(dir_okay=False, writable=True))
+@click.option('--format', 'fmt', type=click.Choice(['csv', 'ndjson']),
+              help='Defaults to csv for .csv files, ndjson otherwise.')
+def export_data(kind, path, fmt):
+    """Export venues, artists or shows to a CSV or NDJSON file."""
+    with open(path, 'w', newline='') as stream:
+        count = bulk.export_rows(kind, stream, fmt or bulk.guess_format(path))
+    click.echo('{} {} exported to {}'.format(count, kind, path))
+
+
+@app.cli.command('generate-data')
+@click.option('--rows', default=100000, show_default=True,
+              help='Rows added across Venue, Artist, venue_artists and Show.')
+@click.option('--seed', default=42, show_default=True)
+@click.option('--anchor', type=click.DateTime(formats=['%Y-%m-%d']),
+              help='Date the show times spread around, defaults to today.')
+@click.option('--chunk-size', default=synthetic.GENERATE_CHUNK_SIZE, show_default=True)
+def generate_data(rows, seed, anchor, chunk_size):
+    """Fill the database with deterministic synthetic venues, artists and shows."""
+    report = synthetic.generate(rows, seed, anchor, chunk_size)
+    page_cache.invalidate('venues', 'artists', 'shows')
+    click.echo('{venues} venues, {artists} artists, {venue_artists} venue_artists, '
+               '{shows} shows generated in {seconds:.1f}s ({rows_per_second:.0f} rows/s)'
+               .format(**report))
+
+#----------------------------------------------------------------------------#
+# Show partitions.
+#----------------------------------------------------------------------------#
+
+@app.cli.command('create-show-partitions')
+@click.option('--months', default=partitions.PARTITION_MONTHS_AHEAD, show_default=True,
+              help='Months to create after the current one.')
+def create_show_partitions(months):
+    """Create the monthly Show partitions of the coming months (postgres)."""
+    with db.engine.connect() as connection:
+        if not partitions.is_partitioned(connection):
+            raise click.ClickException('Show is not partitioned, see partitions.py')
+        created = partitions.create_partitions(connection, months)
+    click.echo('created {}'.format(', '.join(created)) if created else 'nothing to create')
 
 #----------------------------------------------------------------------------#
 # Controllers.
@@ -55,53 +191,49 @@ def index():
 #  ----------------------------------------------------------------
 
 @app.route('/venues')
+@page_cache.cached(lambda: ['venues'])
+@read_only
 def venues():
     try:
         data = []
-        # Get distinct venue depending on city and state
-        venue_data = db.session.query(Venue).distinct(Venue.city).distinct(Venue.state).all()
-        for elem in venue_data:
-            venues = []
-            # filter venues in depending city and state
-            query = db.session.query(Venue).filter(and_(Venue.city==elem.city,Venue.state==elem.state)).all()
-            for u in query:
-                venues.append({
-                  'id': u.id,
-                  'name': u.name,
-                  'num_upcoming_shows': 0,
-                })
-            data.append({
-              'city' : elem.city,
-              'state': elem.state,
-              'venues': venues
-            })
+        # ------------------------------------------------
+        # venues grouped by city and state in one query,
+        # read while the page is written, see streaming.py
+        # ------------------------------------------------
+        data = iter_venue_areas(genre=request.args.get('genre'))
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('venues failed')
         db.session.rollback()
     finally:
-        db.session.close()
-        return render_template('pages/venues.html', areas=data)
+        return render_page('pages/venues.html', areas=data)
 
 
 @app.route('/venues/search', methods=['POST'])
+@read_only
 def search_venues():
     try:
         error = False
-        venue_count = db.session.query(Venue).filter(Venue.name.ilike('%'+request.form.get('search_term', '')+'%')).count()
+        # ---------------------------------------------------
+        # ranked match on name, city, state and genres, the
+        # count and the requested page come back together
+        # ---------------------------------------------------
+        page = request.form.get('page', 1, type=int)
+        venue_count, query = search.search(Venue, request.form.get('search_term', ''), page)
         data=[]
-        query = db.session.query(Venue).filter(Venue.name.ilike('%'+request.form.get('search_term', '')+'%')).all()
         for u in query:
             data.append({
               "id": u.id,
               "name": u.name,
-              "num_upcoming_shows": 0,
+              "num_upcoming_shows": u.upcoming_shows_count,
             })
         response = {
           "count": venue_count,
-          "data": data
+          "data": data,
+          "page": page,
+          "has_next": page * search.RESULTS_PER_PAGE < venue_count
         }
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('search_venues failed')
         db.session.rollback()
         error = True
     finally:
@@ -113,63 +245,36 @@ def search_venues():
             return render_template('pages/search_venues.html', results=response, search_term=request.form.get('search_term', ''))
 
 @app.route('/venues/<int:venue_id>')
+@page_cache.cached(lambda venue_id: ['venue:%s' % venue_id])
+@read_only
 def show_venue(venue_id):
     try:
-        # -----------------------------------------------
-        # @DONE prepare Past Shows and upcoming Shows
-        # -----------------------------------------------
-        past_shows_array = []
-        upcoming_shows_array = []
-        past_shows_query = db.session.query(Show, Venue, Artist).join(Venue, Artist).filter(Venue.id==venue_id, Show.show_time<=datetime.now()).all() 
-        upcoming_shows_query = db.session.query(Show, Venue, Artist).join(Venue, Artist).filter(Venue.id==venue_id, Show.show_time>=datetime.now()).all()
-        for p in past_shows_query:
-            show = p[0]
-            venue = p[1]
-            artist = p[2]
-            past_shows_array.append({
-              "artist_id": artist.id,
-              "artist_name": artist.name,
-              "artist_image_link": artist.image_link,
-              "start_time": datetime.strftime(show.show_time,'%Y-%m-%d %H:%M:%S')
-            })
-        for u in upcoming_shows_query:
-            show = u[0]
-            venue = u[1]
-            artist = u[2]
-            upcoming_shows_array.append({
-              "artist_id": artist.id,
-              "artist_name": artist.name,
-              "artist_image_link": artist.image_link,
-              "start_time": datetime.strftime(show.show_time,'%Y-%m-%d %H:%M:%S')
+        error = False
+        data = None
+        # ---------------------------------------------------
+        # the venue with its past and upcoming shows, loaded
+        # in a single query and split around one point in time,
+        # or as three concurrent queries, see queries.py
+        # ---------------------------------------------------
+        venue = venue_detail(venue_id, past_limit=DETAIL_PAST_SHOWS_LIMIT,
+                             concurrent=app.config['DETAIL_CONCURRENT_QUERIES'])
+        if venue is not None:
+            venue.update({
+              "website": "https://www.themusicalhop.com",
+              "seeking_talent": True,
+              "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
             })
-
-        # -----------------------
-        # @DONE Handle the Venue
-        # -----------------------
-        venue_data = db.session.query(Venue).get(venue_id)
-        venue = {
-            "id": venue_data.id,
-            "name":venue_data.name,
-            "genres": ((venue_data.genres).strip()).split(' '),
-            "address": venue_data.address,
-            "city": venue_data.city,
-            "state": venue_data.state,
-            "phone":venue_data.phone,
-            "website": "https://www.themusicalhop.com",
-            "facebook_link": venue_data.facebook_link,
-            "seeking_talent": True,
-            "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-            "image_link": venue_data.image_link,
-            "past_shows": past_shows_array,
-            "upcoming_shows": upcoming_shows_array,
-            "past_shows_count": len(past_shows_array),
-            "upcoming_shows_count": len(upcoming_shows_array),
-        }
-        data = list(filter(lambda d: d['id'] == venue_id, [venue]))[0]
+            data = venue
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('show_venue failed')
         db.session.rollback()
+        error = True
     finally:
+        db.session.close()
+        if error:
+            return render_template('errors/500.html'), 500
+        if data is None:
+            return render_template('errors/404.html'), 404
         return render_template('pages/show_venue.html', venue=data)
 
 #  Create Venue
@@ -187,26 +292,21 @@ def create_venue_submission():
   # --------------------------------------------------
     try:
         error = False
-        # --------------------------------------
-        # @DONE Handle genres as space separated
-        # -------------------------------------
-        genres = ''
-        for element in request.form.getlist('genres') :
-            genres += element+' '
-
         new_venue = Venue(name=request.form.get('name'),
                           city=request.form.get('city'),
                           state=request.form.get('state'),
                           address=request.form.get('address'),
                           phone=request.form.get('phone'),
-                          genres=genres,
                           facebook_link=request.form.get('facebook_link'),
                           image_link=request.form.get('image_link')
                           )
+        set_genres(new_venue, request.form.getlist('genres'))
         db.session.add(new_venue)
         db.session.commit()
+        search.invalidate(Venue)
+        page_cache.invalidate('venues')
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('create_venue_submission failed')
         db.session.rollback()
         error = True
     finally:
@@ -226,18 +326,19 @@ def delete_venue(venue_id):
     try:
         error = False
         # ------------------------------------------------
-        # @DONE Remove all show related to this venue
-        # recuresivly before deleting the Venue
+        # one DELETE, the database removes the shows and
+        # venue_artists rows through ON DELETE CASCADE
         # ------------------------------------------------
-        venue = Venue.query.get(venue_id)
-        shows = Show.query.filter_by(venue_id=venue_id).all() 
-        for s in shows: 
-            db.session.delete(s)
-
-        db.session.delete(venue)  
-        db.session.commit()
+        artist_ids = venue_artist_ids(venue_id)
+        deleted = archive.delete(Venue, venue_id,
+                                 archive=app.config['DELETE_MODE'] == 'archive',
+                                 batch_size=app.config['ARCHIVE_BATCH_SIZE'])
+        error = not deleted
+        search.invalidate(Venue)
+        page_cache.invalidate('venues', 'shows', 'venue:%s' % venue_id,
+                              *['artist:%s' % i for i in artist_ids])
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('delete_venue failed')
         db.session.rollback()
         error = True
     finally:
@@ -250,40 +351,49 @@ def delete_venue(venue_id):
 #  Artists
 #  ------------------------------------------------
 @app.route('/artists')
+@page_cache.cached(lambda: ['artists'])
+@read_only
 def artists():
     try:
         data = []
-        query = db.session.query(Artist).all()
-        for artist in query:
-            data.append({
-              'id': artist.id,
-              'name': artist.name
-            })     
+        query = db.session.query(Artist.id, Artist.name)
+        if request.args.get('genre'):
+            query = genre_filter(query, Artist, artist_genres, request.args.get('genre'))
+        rows = iter(query.order_by(Artist.name, Artist.id)
+                    .execution_options(stream_results=True)
+                    .yield_per(STREAM_CHUNK_ROWS))
+        data = ({
+          'id': artist.id,
+          'name': artist.name
+        } for artist in rows)
     except Exception as e:
-        print(sys.exc_info())  
+        app.logger.exception('artists failed')
         db.session.rollback()
     finally:
-        db.session.close()
-        return render_template('pages/artists.html', artists=data)
+        return render_page('pages/artists.html', artists=data)
 
 @app.route('/artists/search', methods=['POST'])
+@read_only
 def search_artists():
     try:
         error = False
         data = []
-        result_count = db.session.query(Artist).filter(Artist.name.ilike('%'+request.form.get('search_term', '')+'%')).count()
-        query = db.session.query(Artist).filter(Artist.name.ilike('%'+request.form.get('search_term', '')+'%')).all()
+        page = request.form.get('page', 1, type=int)
+        result_count, query = search.search(Artist, request.form.get('search_term', ''), page)
         for artist in query:
             data.append({
                 "id": artist.id,
                 "name": artist.name,
+                "num_upcoming_shows": artist.upcoming_shows_count,
             })
         response = {
         "count":result_count,
-        "data": data
+        "data": data,
+        "page": page,
+        "has_next": page * search.RESULTS_PER_PAGE < result_count
         }
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('search_artists failed')
         db.session.rollback()
         error = True
     finally:
@@ -296,59 +406,53 @@ def search_artists():
 
 
 @app.route('/artists/<int:artist_id>')
+@page_cache.cached(lambda artist_id: ['artist:%s' % artist_id])
+@read_only
 def show_artist(artist_id):
     try:
-        past_shows_array = []
-        upcoming_shows_array = []
-        artist_data = db.session.query(Artist).get(artist_id)
-        past_shows_query = db.session.query(Show,Venue,Artist).join(Venue,Artist).filter(Artist.id==artist_id,Show.show_time<=datetime.now()).all() 
-        upcoming_shows_query = db.session.query(Show,Venue,Artist).join(Venue,Artist).filter(Artist.id==artist_id,Show.show_time>=datetime.now()).all()
-
-        for p in past_shows_query:
-            show = p[0]
-            venue = p[1]
-            artist = p[2]
-            past_shows_array.append({
-              "venue_id": venue.id,
-              "venue_name": venue.name,
-              "venue_image_link": venue.image_link,
-              "start_time": datetime.strftime(show.show_time,'%Y-%m-%d %H:%M:%S')
-            })
-        for u in upcoming_shows_query:
-            show = u[0]
-            venue = u[1]
-            artist = u[2]
-            upcoming_shows_array.append({
-              "venue_id": venue.id,
-              "venue_name": venue.name,
-              "venue_image_link": venue.image_link,
-              "start_time": datetime.strftime(show.show_time,'%Y-%m-%d %H:%M:%S')
+        error = False
+        data = None
+        artist = artist_detail(artist_id, past_limit=DETAIL_PAST_SHOWS_LIMIT,
+                               concurrent=app.config['DETAIL_CONCURRENT_QUERIES'])
+        if artist is not None:
+            artist.update({
+              "website": "https://www.themusicalhop.com",
+              "seeking_talent": True,
+              "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
             })
-        artist = {
-          "id": artist_data.id,
-          "name":artist_data.name,
-          "genres": ((artist_data.genres).strip()).split(' '),
-          "city": artist_data.city,
-          "state": artist_data.state,
-          "phone":artist_data.phone,
-          "website": "https://www.themusicalhop.com",
-          "facebook_link": artist_data.facebook_link,
-          "seeking_talent": True,
-          "seeking_description": "We are on the lookout for a local artist to play every two weeks. Please call us.",
-          "image_link": artist_data.image_link,
-          "past_shows": past_shows_array,
-          "upcoming_shows":upcoming_shows_array,
-          "past_shows_count": len(past_shows_array),
-          "upcoming_shows_count": len(upcoming_shows_array),
-        }
-        data = list(filter(lambda d: d['id'] == artist_id, [artist]))[0]
+            data = artist
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('show_artist failed')
         db.session.rollback()
+        error = True
     finally:
         db.session.close()
+        if error:
+            return render_template('errors/500.html'), 500
+        if data is None:
+            return render_template('errors/404.html'), 404
         return render_template('pages/show_artist.html', artist=data)
 
+
+@app.route('/artists/<int:artist_id>', methods=['DELETE'])
+def delete_artist(artist_id):
+    try:
+        error = False
+        venue_ids = artist_venue_ids(artist_id)
+        deleted = archive.delete(Artist, artist_id,
+                                 archive=app.config['DELETE_MODE'] == 'archive',
+                                 batch_size=app.config['ARCHIVE_BATCH_SIZE'])
+        error = not deleted
+        search.invalidate(Artist)
+        page_cache.invalidate('artists', 'venues', 'shows', 'artist:%s' % artist_id,
+                              *['venue:%s' % i for i in venue_ids])
+    except Exception as e:
+        app.logger.exception('delete_artist failed')
+        db.session.rollback()
+        error = True
+    finally:
+        return jsonify({'success':not error})
+
 # --------------------------------------
 #  Update Artist
 #  -------------------------------------
@@ -356,11 +460,12 @@ def show_artist(artist_id):
 def edit_artist(artist_id):
     form = ArtistForm()
     artist_data = db.session.query(Artist).get(artist_id)
-    
+    form.genres.data = [genre.name for genre in artist_data.genres]
+
     artist={
       "id": artist_data.id,
       "name": artist_data.name,
-      "genres": artist_data.genres,
+      "genres": form.genres.data,
       "city": artist_data.city,
       "state": artist_data.state,
       "phone": artist_data.phone,
@@ -375,13 +480,9 @@ def edit_artist(artist_id):
 @app.route('/artists/<int:artist_id>/edit', methods=['POST'])
 def edit_artist_submission(artist_id):
     try:
-        genres = ''
-        for element in request.form.getlist('genres') :
-            genres += element+' '
-
         artist = db.session.query(Artist).get(artist_id)
         artist.name=request.form.get('name')
-        artist.genres= genres
+        set_genres(artist, request.form.getlist('genres'))
         artist.city= request.form.get('city')
         artist.state= request.form.get('state')
         artist.phone=request.form.get('phone')
@@ -389,8 +490,11 @@ def edit_artist_submission(artist_id):
         artist.image_link= request.form.get('image_link')
         db.session.add(artist)
         db.session.commit()
+        search.invalidate(Artist)
+        page_cache.invalidate('artists', 'shows', 'artist:%s' % artist_id,
+                              *['venue:%s' % i for i in artist_venue_ids(artist_id)])
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('edit_artist_submission failed')
         db.session.rollback()
     finally:
         db.session.close()  
@@ -400,10 +504,11 @@ def edit_artist_submission(artist_id):
 def edit_venue(venue_id):
     form = VenueForm()
     venue_data = db.session.query(Venue).get(venue_id)
+    form.genres.data = [genre.name for genre in venue_data.genres]
     venue={
       "id": venue_data.id,
       "name":venue_data.name,
-      "genres": venue_data.genres,
+      "genres": form.genres.data,
       "address": venue_data.address,
       "city": venue_data.city,
       "state": venue_data.state,
@@ -419,12 +524,9 @@ def edit_venue(venue_id):
 @app.route('/venues/<int:venue_id>/edit', methods=['POST'])
 def edit_venue_submission(venue_id):
     try:
-        genres = ''
-        for element in request.form.getlist('genres') :
-            genres += element+' '
         venue = db.session.query(Venue).get(venue_id)
         venue.name=request.form.get('name')
-        venue.genres= genres
+        set_genres(venue, request.form.getlist('genres'))
         venue.address= request.form.get('address')
         venue.city= request.form.get('city')
         venue.state= request.form.get('state')
@@ -433,8 +535,11 @@ def edit_venue_submission(venue_id):
         venue.image_link= request.form.get('image_link')
         db.session.add(venue)
         db.session.commit()
+        search.invalidate(Venue)
+        page_cache.invalidate('venues', 'shows', 'venue:%s' % venue_id,
+                              *['artist:%s' % i for i in venue_artist_ids(venue_id)])
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('edit_venue_submission failed')
         db.session.rollback()
     finally:
         db.session.close()  
@@ -455,22 +560,20 @@ def create_artist_submission():
   # ---------------------------
     try:
         error = False
-        genres = ''
-        for element in request.form.getlist('genres') :
-            genres += element+' '
-
         new_artist = Artist(name=request.form.get('name'),
                           city=request.form.get('city'),
                           state=request.form.get('state'),
                           phone=request.form.get('phone'),
-                          genres=genres,
                           facebook_link=request.form.get('facebook_link'),
                           image_link=request.form.get('image_link')
                           )
+        set_genres(new_artist, request.form.getlist('genres'))
         db.session.add(new_artist)
         db.session.commit()
+        search.invalidate(Artist)
+        page_cache.invalidate('artists')
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('create_artist_submission failed')
         db.session.rollback()
         error = True
     finally:
@@ -489,28 +592,38 @@ def create_artist_submission():
 #  ----------------------------------------------------------------
 
 @app.route('/shows')
+@page_cache.cached(lambda: ['shows'])
+@read_only
 def shows():
     try:
         data = []
-        query = db.session.query(Show,Artist,Venue).join(Artist,Venue).all()
-        for result in query:
-          show = result[0]
-          artist = result[1]
-          venue = result[2]
-          data.append({
-            "venue_id": venue.id,
-            "venue_name": venue.name,
-            "artist_id": artist.id,
-            "artist_name": artist.name,
-            "artist_image_link": artist.image_link,
-            "start_time": datetime.strftime(show.show_time,'%Y-%m-%d %H:%M:%S')
-          })
+        page = None
+        # ------------------------------------------------
+        # optional filters, kept on the next page link
+        # ------------------------------------------------
+        filters = {}
+        for key in ('from', 'to', 'venue_id', 'artist_id'):
+            if request.args.get(key):
+                filters[key] = request.args.get(key)
+        page = iter_show_page(
+            after=request.args.get('after'),
+            start=dateutil.parser.parse(filters['from']) if 'from' in filters else None,
+            end=dateutil.parser.parse(filters['to']) if 'to' in filters else None,
+            venue_id=request.args.get('venue_id', type=int),
+            artist_id=request.args.get('artist_id', type=int))
+        data = ({
+          "venue_id": show.venue_id,
+          "venue_name": show.venue_name,
+          "artist_id": show.artist_id,
+          "artist_name": show.artist_name,
+          "artist_image_link": show.artist_image_link,
+          "start_time": show.show_time
+        } for show in page)
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('shows failed')
         db.session.rollback()
     finally:
-        db.session.close()
-        return render_template('pages/shows.html', shows=data)
+        return render_page('pages/shows.html', shows=data, filters=filters, page=page)
 
 # ---------------------------
 #  CREATE A SHOW
@@ -524,35 +637,87 @@ def create_shows():
 def create_show_submission():
     try:
         error = True
+        message = None
         # -----------------------------------------------
-        # @DONE Check first if venue and Artist is exist
+        # one query checks the venue and the artist, the
+        # venue must be free for the slot of the show
         # -----------------------------------------------
-        venue = db.session.query(Venue).get(request.form.get('venue_id'))
-        artist = db.session.query(Artist).get(request.form.get('artist_id'))
-
-        if venue is None or artist is None:
-            error = True
+        result = booking.book_shows([{
+          'venue_id': request.form.get('venue_id'),
+          'artist_id': request.form.get('artist_id'),
+          'start_time': request.form.get('start_time'),
+        }], slot_minutes=app.config['SHOW_SLOT_MINUTES'])
+        show = result['results'][0]
+        if show['status'] == 'created':
+            page_cache.invalidate('venues', 'shows', 'venue:%s' % show['venue_id'],
+                                  'artist:%s' % show['artist_id'])
+            error = False
         else:
-            show = Show(
-              artist_id=request.form.get('artist_id'),
-              venue_id=request.form.get('venue_id'),
-              show_time=request.form.get('start_time'),
-              )
-            db.session.add(show)
-            db.session.commit()
-            error=False
+            message = '; '.join(show['errors'])
     except Exception as e:
-        print(sys.exc_info())
+        app.logger.exception('create_show_submission failed')
         db.session.rollback()
         error = True
     finally:
         db.session.close()  
         if(error):
-            flash('An error occurred. Show could not be listed.')
+            flash('An error occurred. Show could not be listed.' + (' ' + message if message else ''))
         else:
             flash('Show was successfully listed!')
         return render_template('pages/home.html')
 
+
+@app.route('/shows/batch', methods=['POST'])
+def book_shows():
+    '''
+    Book many shows at once, e.g. a tour:
+
+      {"shows": [{"venue_id": 1, "artist_id": 2, "start_time": "2030-05-01T20:00:00"}, ...],
+       "all_or_nothing": false}
+
+    Answers with the created / rejected counts and one result per show,
+    see booking.py.
+    '''
+    body = request.get_json(silent=True) or {}
+    shows = body.get('shows')
+    if not isinstance(shows, list) or not shows or len(shows) > booking.MAX_BATCH_SIZE:
+        return jsonify({
+          'error': 400,
+          'message': 'shows must be a list of 1 to {} shows'.format(booking.MAX_BATCH_SIZE),
+        }), 400
+    try:
+        error = False
+        result = booking.book_shows(shows, all_or_nothing=bool(body.get('all_or_nothing')),
+                                    slot_minutes=app.config['SHOW_SLOT_MINUTES'])
+        created = [show for show in result['results'] if show['status'] == 'created']
+        if created:
+            page_cache.invalidate('venues', 'shows',
+                                  *sorted(set(['venue:%s' % show['venue_id'] for show in created] +
+                                              ['artist:%s' % show['artist_id'] for show in created])))
+    except Exception as e:
+        app.logger.exception('book_shows failed')
+        db.session.rollback()
+        error = True
+    finally:
+        db.session.close()
+        if error:
+            return jsonify({'error': 500, 'message': 'shows could not be booked'}), 500
+        return jsonify(result)
+
+# ---------------------------
+#  Cache and pool metrics
+# ---------------------------
+# endpoints, pool internals and replica URLs, only with /metrics, see
+# instrumentation.py
+if app.config['INSTRUMENTATION_EXPOSE_METRICS']:
+    @app.route('/cache/metrics')
+    def cache_metrics():
+        return jsonify(dict(page_cache.stats(), datetime_filter=dates.cache_info()))
+
+    @app.route('/db/metrics')
+    def db_metrics():
+        return jsonify(dict(pool.telemetry.stats(db.engine), routing=get_router(app).stats()))
+
 # ---------------------------
 # ERORR HANDLING
 # --------------------------
@@ -565,16 +730,6 @@ def server_error(error):
     return render_template('errors/500.html'), 500
 
 
-if not app.debug:
-    file_handler = FileHandler('error.log')
-    file_handler.setFormatter(
-        Formatter('%(asctime)s %(levelname)s: %(message)s [in %(pathname)s:%(lineno)d]')
-    )
-    app.logger.setLevel(logging.INFO)
-    file_handler.setLevel(logging.INFO)
-    app.logger.addHandler(file_handler)
-    app.logger.info('errors')
-
 #----------------------------------------------------------------------------#
 # Launch.
 #----------------------------------------------------------------------------#
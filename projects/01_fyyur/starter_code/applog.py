@@ -0,0 +1,187 @@
+import json
+import time
+import uuid
+import queue
+import atexit
+import random
+import logging
+import threading
+from logging.handlers import (QueueHandler, QueueListener, RotatingFileHandler)
+from flask import (g, request, has_request_context)
+from flask.logging import default_handler
+
+
+# ----------------------------------------------------------------------------#
+# Logging.
+#
+#   applog.init_app(app)
+#
+# app.logger hands its records to a bounded queue and returns at once, a
+# background QueueListener writes them as JSON lines to LOG_FILE, rotated
+# every LOG_MAX_BYTES. When the queue is full records are dropped rather
+# than blocking the request, and counted: a WARNING with the count is
+# logged as soon as the queue has room again, or when the app exits.
+#
+# Every request gets an id (X-Request-ID, or a new one) echoed back in
+# the response, and one 'request' record with its status and latency.
+# Records logged while handling a request carry the request id, method,
+# path and endpoint. LOG_SAMPLE_RATES keeps only a share of the records
+# below WARNING for busy endpoints, e.g. {'venues': 0.1}.
+#
+# Fyyur and the coffee shop backend each ship a copy of this file, the
+# trivia backend's test_flaskr.py fails when the two copies differ.
+# ----------------------------------------------------------------------------#
+
+REQUEST_ID_HEADER = 'X-Request-ID'
+
+# record attributes that are not user supplied `extra` fields
+_STANDARD_FIELDS = set(vars(logging.LogRecord('', 0, '', 0, '', (), None))) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            'time': self.formatTime(record, '%Y-%m-%dT%H:%M:%S') + '.%03dZ' % record.msecs,
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _STANDARD_FIELDS and not key.startswith('_'):
+                entry[key] = value
+        if record.exc_info and not record.exc_text:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            entry['exception'] = record.exc_text
+        return json.dumps(entry, default=str)
+
+    def converter(self, timestamp):
+        return time.gmtime(timestamp)
+
+
+class RequestQueueHandler(QueueHandler):
+    '''
+    Adds the request context to each record, renders its traceback and
+    queues it without ever waiting for room.
+    '''
+    def __init__(self, log_queue, sample_rates=None):
+        QueueHandler.__init__(self, log_queue)
+        self.sample_rates = {} if sample_rates is None else sample_rates
+        self.dropped = 0
+        # dropped since the last drop_report()
+        self.unreported = 0
+        # not self.lock: Handler.handle() already holds that around emit()
+        self.drop_lock = threading.Lock()
+
+    def filter(self, record):
+        if record.levelno < logging.WARNING and has_request_context():
+            rate = self.sample_rates.get(request.endpoint)
+            if rate is not None and random.random() >= rate:
+                return False
+        return QueueHandler.filter(self, record)
+
+    def prepare(self, record):
+        if has_request_context():
+            record.request_id = g.get('request_id')
+            record.method = request.method
+            record.path = request.path
+            record.endpoint = request.endpoint
+            if 'request_started' in g:
+                record.latency_ms = round((time.perf_counter() - g.request_started) * 1000, 3)
+        if record.exc_info:
+            # tracebacks cannot cross to the listener thread
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            with self.drop_lock:
+                self.dropped += 1
+                self.unreported += 1
+            return
+        report = self.drop_report() if self.unreported else None
+        if report is not None:
+            # None would be the listener's stop sentinel
+            try:
+                self.queue.put_nowait(report)
+            except queue.Full:
+                with self.drop_lock:
+                    self.unreported += report.dropped
+
+    def drop_report(self):
+        '''
+        A WARNING record counting the records dropped since the last
+        report, None when there are none.
+        '''
+        with self.drop_lock:
+            count, self.unreported = self.unreported, 0
+            total = self.dropped
+        if not count:
+            return None
+        return logging.makeLogRecord({
+            'name': __name__,
+            'levelno': logging.WARNING,
+            'levelname': 'WARNING',
+            'msg': '{} log records dropped, the log queue was full'.format(count),
+            'dropped': count,
+            'dropped_total': total,
+        })
+
+
+def init_app(app):
+    app.config.setdefault('LOG_FILE', 'app.log')
+    app.config.setdefault('LOG_LEVEL', 'INFO')
+    app.config.setdefault('LOG_MAX_BYTES', 10 * 1024 * 1024)
+    app.config.setdefault('LOG_BACKUP_COUNT', 5)
+    app.config.setdefault('LOG_QUEUE_SIZE', 10000)
+    app.config.setdefault('LOG_SAMPLE_RATES', {})
+
+    formatter = JsonFormatter()
+    handlers = []
+    if app.config['LOG_FILE']:
+        file_handler = RotatingFileHandler(app.config['LOG_FILE'],
+                                           maxBytes=app.config['LOG_MAX_BYTES'],
+                                           backupCount=app.config['LOG_BACKUP_COUNT'])
+        handlers.append(file_handler)
+    if app.debug or not handlers:
+        handlers.append(logging.StreamHandler())
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    log_queue = queue.Queue(app.config['LOG_QUEUE_SIZE'])
+    queue_handler = RequestQueueHandler(log_queue, app.config['LOG_SAMPLE_RATES'])
+    listener = QueueListener(log_queue, *handlers, respect_handler_level=True)
+    listener.start()
+
+    @atexit.register
+    def stop_listener():
+        listener.stop()
+        report = queue_handler.drop_report()
+        if report is not None:
+            for handler in handlers:
+                handler.handle(report)
+
+    app.logger.removeHandler(default_handler)
+    app.logger.addHandler(queue_handler)
+    app.logger.setLevel(app.config['LOG_LEVEL'])
+    app.logger.propagate = False
+
+    @app.before_request
+    def start_request_log():
+        g.request_id = request.headers.get(REQUEST_ID_HEADER) or uuid.uuid4().hex
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if 'request_started' in g:
+            response.headers[REQUEST_ID_HEADER] = g.request_id
+            app.logger.info('request', extra={'status': response.status_code})
+        return response
+
+    app.extensions['applog'] = queue_handler
+    return listener
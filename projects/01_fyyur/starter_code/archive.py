@@ -0,0 +1,70 @@
+from datetime import datetime
+from sqlalchemy import (select, literal)
+from models import (db, Venue, Artist, Show, ShowArchive)
+import counters
+
+
+# ----------------------------------------------------------------------------#
+# Venue / artist deletes.
+#
+# A delete is one DELETE of the venue or artist row: the database cascades
+# it to Show, venue_artists and the genre links (ON DELETE CASCADE).
+# In archive mode the shows are first moved to ShowArchive in batches of
+# ARCHIVE_BATCH_SIZE, one short transaction each, so a venue with years
+# of history never holds long locks or fills the session.
+# ----------------------------------------------------------------------------#
+
+ARCHIVE_BATCH_SIZE = 1000
+
+SHOW_KEYS = {
+    Venue: Show.venue_id,
+    Artist: Show.artist_id,
+}
+
+
+def archive_shows(key, entity_id, batch_size=ARCHIVE_BATCH_SIZE, now=None):
+    '''
+    Move the shows having `key` == `entity_id` to ShowArchive, committing
+    after every batch. Returns the number of shows moved.
+    '''
+    now = now or datetime.now()
+    archive = ShowArchive.__table__
+    moved = 0
+    while True:
+        ids = [show_id for show_id, in db.session.query(Show.id)
+               .filter(key == entity_id)
+               .order_by(Show.id)
+               .limit(batch_size)]
+        if not ids:
+            return moved
+        counters.forget_shows(Show.id.in_(ids))
+        rows = select([Show.id, Show.artist_id, Artist.name, Show.venue_id, Venue.name,
+                       Show.show_time, literal(now, db.DateTime)]) \
+            .select_from(Show.__table__
+                         .join(Venue.__table__, Venue.id == Show.venue_id)
+                         .join(Artist.__table__, Artist.id == Show.artist_id)) \
+            .where(Show.id.in_(ids))
+        db.session.execute(archive.insert().from_select(
+            ['id', 'artist_id', 'artist_name', 'venue_id', 'venue_name', 'show_time', 'archived_at'],
+            rows))
+        db.session.query(Show).filter(Show.id.in_(ids)).delete(synchronize_session=False)
+        db.session.commit()
+        moved += len(ids)
+
+
+def delete(model, entity_id, archive=False, batch_size=ARCHIVE_BATCH_SIZE):
+    '''
+    Delete a venue or an artist and, through the cascades, its shows and
+    links. With `archive` the shows are kept in ShowArchive. Returns the
+    number of rows deleted, 0 when there was no such venue / artist.
+    '''
+    key = SHOW_KEYS[model]
+    if archive:
+        archive_shows(key, entity_id, batch_size)
+    else:
+        counters.forget_shows(key == entity_id)
+    deleted = db.session.query(model) \
+        .filter(model.id == entity_id) \
+        .delete(synchronize_session=False)
+    db.session.commit()
+    return deleted
@@ -0,0 +1,68 @@
+'''
+Helpers shared by the Fyyur benchmark scripts.
+
+Run a benchmark from the starter_code directory, e.g.
+
+    $ python -m benchmarks.bench_venues --venues 10000
+
+By default every benchmark runs against a throw-away SQLite file, pass
+--database to point it at a real postgres database instead.
+'''
+import os
+import time
+import tempfile
+from sqlalchemy import event
+
+
+def use_database(uri=None):
+    '''
+    Point the app at `uri` (a temporary SQLite file when empty) and
+    create the schema. Must run before anything touches db.engine.
+    '''
+    from models import app, db
+    if not uri:
+        handle, path = tempfile.mkstemp(prefix='fyyur-bench-', suffix='.db')
+        os.close(handle)
+        uri = 'sqlite:///' + path
+    app.config['SQLALCHEMY_DATABASE_URI'] = uri
+    db.create_all()
+    return uri
+
+
+class QueryCounter(object):
+    '''
+    Context manager counting the SQL statements sent through an engine.
+    '''
+    def __init__(self, engine):
+        self.engine = engine
+        self.count = 0
+
+    def _count(self, *args):
+        self.count += 1
+
+    def __enter__(self):
+        event.listen(self.engine, 'before_cursor_execute', self._count)
+        return self
+
+    def __exit__(self, *exc):
+        event.remove(self.engine, 'before_cursor_execute', self._count)
+
+
+def measure(engine, fn, repeat=5):
+    '''
+    Call `fn` `repeat` times and return (queries per call, best seconds).
+    '''
+    best = None
+    queries = 0
+    for _ in range(repeat):
+        with QueryCounter(engine) as counter:
+            start = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - start
+        queries = counter.count
+        best = elapsed if best is None else min(best, elapsed)
+    return queries, best
+
+
+def report(label, queries, seconds):
+    print('{:<32} {:>8} queries {:>10.2f} ms'.format(label, queries, seconds * 1000))
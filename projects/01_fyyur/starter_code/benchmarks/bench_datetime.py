@@ -0,0 +1,65 @@
+'''
+Benchmark the `datetime` template filter over a page of shows: the old
+parse-then-format filter on strftime'd strings vs. dates.format_datetime
+on the datetime objects.
+
+    $ python -m benchmarks.bench_datetime --shows 5000
+'''
+import time
+import random
+import argparse
+import babel.dates
+import dateutil.parser
+from datetime import (datetime, timedelta)
+
+
+def old_format_datetime(value, format='medium'):
+    date = dateutil.parser.parse(value)
+    if format == 'full':
+        format = "EEEE MMMM, d, y 'at' h:mma"
+    elif format == 'medium':
+        format = "EE MM, dd, y h:mma"
+    return babel.dates.format_datetime(date, format)
+
+
+def best_of(fn, repeat):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--days', type=int, default=90,
+                        help='spread of the show times, fewer days repeat more values')
+    parser.add_argument('--repeat', type=int, default=5)
+    args = parser.parse_args()
+
+    from dates import format_datetime
+
+    rng = random.Random(42)
+    now = datetime.now().replace(minute=0, second=0, microsecond=0)
+    times = [now + timedelta(days=rng.randint(0, args.days), hours=rng.choice([19, 20, 21]))
+             for _ in range(args.shows)]
+    strings = [t.strftime('%Y-%m-%d %H:%M:%S') for t in times]
+
+    assert [old_format_datetime(s, 'full') for s in strings[:50]] == \
+           [format_datetime(t, 'full') for t in times[:50]]
+
+    print('{} show times over {} days'.format(args.shows, args.days))
+    for label, fn in [
+        ('strftime + parse + format', lambda: [old_format_datetime(t.strftime('%Y-%m-%d %H:%M:%S'), 'full')
+                                               for t in times]),
+        ('parse + format', lambda: [old_format_datetime(s, 'full') for s in strings]),
+        ('memoized filter', lambda: [format_datetime(t, 'full') for t in times]),
+    ]:
+        print('{:<32} {:>10.2f} ms'.format(label, best_of(fn, args.repeat) * 1000))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+'''
+Benchmark the venue detail page: three separate queries vs. the
+single-query loader vs. three queries running at the same time.
+
+    $ python -m benchmarks.bench_detail --shows 5000
+
+The concurrent loader should take about as long as the slowest of its
+statements, listed below it. It is off by default, the last line says
+whether FYYUR_DETAIL_CONCURRENT_QUERIES=1 pays for its extra pool
+connections on this database.
+'''
+import random
+import argparse
+from datetime import (datetime, timedelta)
+from benchmarks import (use_database, measure, report)
+
+
+def seed(db, Venue, Artist, Show, artists, shows):
+    rng = random.Random(42)
+    now = datetime.now()
+    db.engine.execute(Venue.__table__.insert(), [{'name': 'Venue 1', 'genres': 'Jazz Blues'}])
+    db.engine.execute(Artist.__table__.insert(), [{
+        'name': 'Artist {}'.format(i),
+        'image_link': 'https://example.com/{}.jpg'.format(i),
+    } for i in range(artists)])
+    db.engine.execute(Show.__table__.insert(), [{
+        'venue_id': 1,
+        'artist_id': rng.randint(1, artists),
+        'show_time': now + timedelta(hours=rng.randint(-24 * 365 * 5, 24 * 90)),
+    } for _ in range(shows)])
+
+
+def three_queries(db, Venue, Artist, Show, venue_id):
+    '''
+    The detail page as it used to load: past shows, upcoming shows and
+    the venue, each with full ORM rows.
+    '''
+    now = datetime.now()
+    past = db.session.query(Show, Venue, Artist).join(Venue, Artist) \
+        .filter(Venue.id == venue_id, Show.show_time <= now).all()
+    upcoming = db.session.query(Show, Venue, Artist).join(Venue, Artist) \
+        .filter(Venue.id == venue_id, Show.show_time >= now).all()
+    # a query, not get(): the joins above put the venue in the identity
+    # map, get() would answer from it without a statement
+    venue = db.session.query(Venue).filter(Venue.id == venue_id).first()
+    db.session.close()
+    return venue, past, upcoming
+
+
+def concurrent_statements(db, Venue, Artist, Show, venue_id, past_limit):
+    '''
+    The statements of the concurrent loader, to time them one by one.
+    '''
+    now = datetime.now()
+    shows = db.session.query(Show.show_time, Artist.id, Artist.name, Artist.image_link) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.venue_id == venue_id)
+    return [
+        ('venue', db.session.query(Venue).filter(Venue.id == venue_id).statement),
+        ('upcoming shows', shows.filter(Show.show_time >= now).order_by(Show.show_time).statement),
+        ('past shows', shows.filter(Show.show_time < now).order_by(Show.show_time.desc())
+                            .limit(past_limit).statement),
+    ]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--artists', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=5000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    use_database(args.database)
+    from models import (db, Venue, Artist, Show)
+    from queries import (venue_detail, DETAIL_PAST_SHOWS_LIMIT)
+
+    seed(db, Venue, Artist, Show, args.artists, args.shows)
+
+    def loader(past_limit, concurrent=False):
+        venue_detail(1, past_limit=past_limit, concurrent=concurrent)
+        db.session.close()
+
+    print('1 venue with {} shows by {} artists'.format(args.shows, args.artists))
+    report('three queries', *measure(db.engine, lambda: three_queries(db, Venue, Artist, Show, 1),
+                                     args.repeat))
+    report('single query, all shows', *measure(db.engine, lambda: loader(None), args.repeat))
+    single = measure(db.engine, lambda: loader(DETAIL_PAST_SHOWS_LIMIT), args.repeat)
+    report('single query, {} past'.format(DETAIL_PAST_SHOWS_LIMIT), *single)
+    concurrent = measure(db.engine, lambda: loader(DETAIL_PAST_SHOWS_LIMIT, True), args.repeat)
+    report('concurrent, {} past'.format(DETAIL_PAST_SHOWS_LIMIT), *concurrent)
+    for name, statement in concurrent_statements(db, Venue, Artist, Show, 1, DETAIL_PAST_SHOWS_LIMIT):
+        report('  ' + name, *measure(db.engine, lambda: db.engine.execute(statement).fetchall(),
+                                     args.repeat))
+
+    # three connections a page for less than a 1.5x speedup is not worth it
+    enable = concurrent[1] * 1.5 < single[1]
+    print('\nFYYUR_DETAIL_CONCURRENT_QUERIES={} ({:.1f}x)'.format(
+        int(enable), single[1] / concurrent[1]))
+
+
+if __name__ == '__main__':
+    main()
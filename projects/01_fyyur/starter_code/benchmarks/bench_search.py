@@ -0,0 +1,65 @@
+'''
+Benchmark venue search: ilike count + fetch vs. the indexed search.
+
+    $ python -m benchmarks.bench_search --venues 100000
+'''
+import random
+import argparse
+from benchmarks import (use_database, measure, report)
+
+WORDS = ['blue', 'moon', 'hall', 'club', 'room', 'jazz', 'park', 'house', 'river',
+         'lounge', 'garage', 'cellar', 'union', 'arena', 'stage', 'loft', 'barn']
+GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk', 'Funk',
+          'Hip-Hop', 'Jazz', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll', 'Soul']
+TERMS = ['jazz', 'moon hall', 'city 42', 'folk', 'zzz']
+
+
+def seed(db, Venue, venues):
+    rng = random.Random(42)
+    db.engine.execute(Venue.__table__.insert(), [{
+        'name': ' '.join(rng.choice(WORDS) for _ in range(3)).title(),
+        'city': 'City {}'.format(rng.randint(1, 1000)),
+        'state': 'S{}'.format(rng.randint(1, 50)),
+        'genres': ' '.join(rng.sample(GENRES, 2)),
+    } for _ in range(venues)])
+
+
+def ilike_search(db, Venue, term):
+    '''
+    The search as it used to run: a count and a fetch over name only.
+    '''
+    count = db.session.query(Venue).filter(Venue.name.ilike('%' + term + '%')).count()
+    rows = db.session.query(Venue).filter(Venue.name.ilike('%' + term + '%')).all()
+    db.session.close()
+    return count, rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--venues', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    use_database(args.database)
+    from models import (db, Venue)
+    import search
+
+    seed(db, Venue, args.venues)
+
+    def indexed_search(term):
+        search.search(Venue, term)
+        db.session.close()
+
+    print('{} venues, {} backend'.format(args.venues, db.engine.dialect.name))
+    report('index build (cold)', *measure(db.engine, lambda: (search.invalidate(Venue),
+                                                              indexed_search('jazz')), 1))
+    for term in TERMS:
+        report('ilike "{}"'.format(term),
+               *measure(db.engine, lambda: ilike_search(db, Venue, term), args.repeat))
+        report('indexed "{}"'.format(term),
+               *measure(db.engine, lambda: indexed_search(term), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,115 @@
+'''
+Benchmark the show queries of the venue / artist pages and /shows
+without and with the (venue_id, show_time) / (artist_id, show_time)
+indexes, printing the plan of each query.
+
+    $ python -m benchmarks.bench_shows --shows 1000000
+
+Against a postgres database upgraded with FYYUR_PARTITION_SHOWS=1 the
+plans also show which monthly partitions are scanned.
+'''
+import random
+import argparse
+from datetime import (datetime, timedelta)
+from sqlalchemy import event
+from benchmarks import (use_database, measure, report)
+
+CHUNK_SIZE = 50000
+
+SHOW_INDEXES = ('ix_show_venue_id_show_time', 'ix_show_artist_id_show_time')
+
+
+def seed(db, Venue, Artist, Show, venues, artists, shows):
+    rng = random.Random(42)
+    now = datetime.now()
+    db.engine.execute(Venue.__table__.insert(), [{'name': 'Venue {}'.format(i)} for i in range(venues)])
+    db.engine.execute(Artist.__table__.insert(), [{
+        'name': 'Artist {}'.format(i),
+        'image_link': 'https://example.com/{}.jpg'.format(i),
+    } for i in range(artists)])
+    for start in range(0, shows, CHUNK_SIZE):
+        db.engine.execute(Show.__table__.insert(), [{
+            'venue_id': rng.randint(1, venues),
+            'artist_id': rng.randint(1, artists),
+            'show_time': now + timedelta(hours=rng.randint(-24 * 365 * 5, 24 * 365)),
+        } for _ in range(start, min(start + CHUNK_SIZE, shows))])
+
+
+def explain(db, fn):
+    '''
+    The plan of the last statement `fn` runs.
+    '''
+    executed = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        executed.append((statement, parameters))
+
+    event.listen(db.engine, 'before_cursor_execute', capture)
+    try:
+        fn()
+    finally:
+        event.remove(db.engine, 'before_cursor_execute', capture)
+    statement, parameters = executed[-1]
+    prefix = 'EXPLAIN ANALYZE ' if db.engine.dialect.name == 'postgresql' else 'EXPLAIN QUERY PLAN '
+    connection = db.engine.raw_connection()
+    try:
+        cursor = connection.cursor()
+        cursor.execute(prefix + statement, parameters)
+        return '\n'.join('    ' + ' '.join(str(column) for column in row) for row in cursor.fetchall())
+    finally:
+        connection.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--venues', type=int, default=1000)
+    parser.add_argument('--artists', type=int, default=5000)
+    parser.add_argument('--shows', type=int, default=1000000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database')
+    parser.add_argument('--no-plans', dest='plans', action='store_false')
+    args = parser.parse_args()
+
+    use_database(args.database)
+    from models import (db, Venue, Artist, Show)
+    from queries import (venue_detail, artist_detail, show_page, DETAIL_PAST_SHOWS_LIMIT)
+
+    indexes = [index for index in Show.__table__.indexes if index.name in SHOW_INDEXES]
+    # loading is faster without them, they are created for the second round
+    for index in indexes:
+        index.drop(db.engine)
+    seed(db, Venue, Artist, Show, args.venues, args.artists, args.shows)
+    db.engine.execute('ANALYZE')
+
+    now = datetime.now()
+    month_start = now.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+    def call(fn, *args, **kwargs):
+        def run():
+            fn(*args, **kwargs)
+            db.session.close()
+        return run
+
+    cases = [
+        ('show_venue', call(venue_detail, 1, past_limit=DETAIL_PAST_SHOWS_LIMIT)),
+        ('show_artist', call(artist_detail, 1, past_limit=DETAIL_PAST_SHOWS_LIMIT)),
+        ('shows', call(show_page)),
+        ('shows, one month', call(show_page, start=month_start, end=month_start + timedelta(days=31))),
+        ('shows of a venue', call(show_page, venue_id=1)),
+    ]
+
+    print('{} shows, {} venues, {} artists'.format(args.shows, args.venues, args.artists))
+    for label in ('without show indexes', 'with show indexes'):
+        if label == 'with show indexes':
+            for index in indexes:
+                index.create(db.engine)
+            db.engine.execute('ANALYZE')
+        print('\n' + label)
+        for name, fn in cases:
+            report(name, *measure(db.engine, fn, args.repeat))
+            if args.plans:
+                print(explain(db, fn))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+'''
+Benchmark the /venues listing: one query per area vs. the grouped query.
+
+    $ python -m benchmarks.bench_venues --venues 10000 --areas 500
+'''
+import random
+import argparse
+from datetime import (datetime, timedelta)
+from sqlalchemy import and_
+from benchmarks import (use_database, measure, report)
+
+
+def seed(db, Venue, Show, Artist, venues, areas, shows):
+    rng = random.Random(42)
+    now = datetime.now()
+    db.engine.execute(Artist.__table__.insert(), [{'name': 'Artist 1'}])
+    db.engine.execute(Venue.__table__.insert(), [{
+        'name': 'Venue {}'.format(i),
+        'city': 'City {}'.format(i % areas),
+        'state': 'S{}'.format(i % 50),
+    } for i in range(venues)])
+    db.engine.execute(Show.__table__.insert(), [{
+        'venue_id': rng.randint(1, venues),
+        'artist_id': 1,
+        'show_time': now + timedelta(days=rng.randint(-365, 365)),
+    } for _ in range(shows)])
+
+
+def per_area_listing(db, Venue):
+    '''
+    The listing as it used to be built: one Venue query per area.
+    '''
+    data = []
+    for area in db.session.query(Venue.city, Venue.state).distinct().all():
+        venues = db.session.query(Venue).filter(and_(Venue.city == area.city,
+                                                     Venue.state == area.state)).all()
+        data.append({
+          'city': area.city,
+          'state': area.state,
+          'venues': [{'id': v.id, 'name': v.name, 'num_upcoming_shows': 0} for v in venues]
+        })
+    db.session.close()
+    return data
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--venues', type=int, default=10000)
+    parser.add_argument('--areas', type=int, default=500)
+    parser.add_argument('--shows', type=int, default=50000)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    use_database(args.database)
+    from models import (db, Venue, Artist, Show)
+    from queries import venue_areas
+    from app import (app, page_cache)
+
+    seed(db, Venue, Show, Artist, args.venues, args.areas, args.shows)
+    client = app.test_client()
+
+    def grouped_listing():
+        venue_areas()
+        db.session.close()
+
+    print('{} venues in {} areas, {} shows'.format(args.venues, args.areas, args.shows))
+    report('per-area queries', *measure(db.engine, lambda: per_area_listing(db, Venue), args.repeat))
+    report('grouped query', *measure(db.engine, grouped_listing, args.repeat))
+    # every repeat but the first would be a page cache hit, time the
+    # listing itself, then the hit on its own
+    backend, page_cache.backend = page_cache.backend, None
+    report('GET /venues', *measure(db.engine, lambda: client.get('/venues').get_data(), args.repeat))
+    page_cache.backend = backend
+    if backend is not None:
+        client.get('/venues').get_data()
+        report('GET /venues, page cache hit',
+               *measure(db.engine, lambda: client.get('/venues').get_data(), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,100 @@
+'''
+Check the replica routing of replicas.py against two SQLite files: the
+primary, and a copy of it standing in for a replica that stopped
+replaying, so a page read from the replica misses the venues written
+after the copy.
+
+    $ python -m benchmarks.check_replicas
+
+Asserts that
+  - a @read_only page of a reader that wrote nothing goes to the replica
+  - a POST pins its browser to the primary for REPLICA_STICKY_SECONDS,
+    then its reads go back to the replica
+  - a replica lagging by more than REPLICA_MAX_LAG, or failing its lag
+    probe, is skipped
+  - with the page cache on, a page read from the replica is not stored,
+    so the writer still gets its write once another browser read it
+'''
+import shutil
+import time
+import argparse
+from benchmarks import use_database
+
+VENUE = {
+    'city': 'San Francisco',
+    'state': 'CA',
+    'address': '1015 Folsom Street',
+    'phone': '123-123-1234',
+    'genres': ['Jazz'],
+    'facebook_link': '',
+    'image_link': '',
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--sticky-seconds', type=float, default=0.5)
+    args = parser.parse_args()
+
+    primary = use_database()
+    from app import (app, page_cache, get_router)
+    from cache import MemoryBackend
+    from models import db
+    # every read has to reach a database, until the page cache check
+    page_cache.backend = None
+
+    writer = app.test_client()
+    reader = app.test_client()
+
+    def create_venue(client, name):
+        response = client.post('/venues/create', data=dict(VENUE, name=name))
+        assert response.status_code in (200, 302), response.status_code
+
+    def sees(client, name):
+        return name.encode() in client.get('/venues').data
+
+    create_venue(writer, 'Before the copy')
+    db.session.remove()
+    replica = primary[len('sqlite:///'):] + '.replica'
+    shutil.copy(primary[len('sqlite:///'):], replica)
+    app.config['SQLALCHEMY_REPLICA_URIS'] = ['sqlite:///' + replica]
+    app.config['REPLICA_STICKY_SECONDS'] = args.sticky_seconds
+    app.config['REPLICA_LAG_CHECK_INTERVAL'] = 0
+    app.extensions.pop('replicas', None)
+    router = get_router(app)
+
+    # the replica has what was there when it was copied, nothing after
+    create_venue(writer, 'After the copy')
+    assert sees(reader, 'Before the copy')
+    assert not sees(reader, 'After the copy'), 'a reader that wrote nothing reads from the replica'
+    assert router.metrics['replica_reads'] >= 1
+    print('read from the replica: ok')
+
+    assert sees(writer, 'After the copy'), 'the writer reads its own write from the primary'
+    assert router.metrics['sticky'] >= 1
+    time.sleep(args.sticky_seconds)
+    assert not sees(writer, 'After the copy'), 'the writer is back on the replica after the sticky window'
+    print('POST pins to the primary for {}s: ok'.format(args.sticky_seconds))
+
+    lagging = router.metrics['lagging']
+    router.replicas[0].probe = lambda connection: app.config['REPLICA_MAX_LAG'] + 1
+    assert sees(reader, 'After the copy'), 'a lagging replica is skipped'
+    router.replicas[0].probe = lambda connection: 1 / 0
+    assert sees(reader, 'After the copy'), 'a replica failing its probe is skipped'
+    assert router.metrics['lagging'] == lagging + 2
+    print('lagging or unreachable replica skipped: ok')
+
+    router.replicas[0].probe = lambda connection: 0.0
+    page_cache.backend = MemoryBackend()
+    time.sleep(args.sticky_seconds)
+    create_venue(writer, 'Cached after the copy')
+    stores = page_cache.metrics['stores']
+    assert not sees(reader, 'Cached after the copy')
+    assert page_cache.metrics['stores'] == stores, 'a page read from the replica is not cached'
+    assert sees(writer, 'Cached after the copy'), 'the writer reads its write with the page cache on'
+    print('page cache keeps read-your-writes: ok')
+    print(router.stats())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,308 @@
+'''
+Load test every Fyyur route and write p50/p95/p99 latency and throughput
+per route as JSON.
+
+In process through the Flask test client, against a throw-away SQLite
+file (or --database) filled with synthetic.generate():
+
+    $ python -m benchmarks.loadtest --rows 100000 --requests 200 --concurrency 8 \\
+        --output loadtest.json
+
+Against a running server, with whatever data it holds:
+
+    $ python -m benchmarks.loadtest --url http://127.0.0.1:5000 --output loadtest.json
+
+Every rule of app.url_map is driven, a rule without an entry in ROUTES
+fails the run so new views get one. Write routes really write: DELETE
+routes remove venues / artists from the highest id down, one per
+request, and run last.
+'''
+import sys
+import json
+import math
+import time
+import random
+import logging
+import argparse
+import threading
+import http.client
+from datetime import (datetime, timedelta)
+from collections import Counter
+from urllib.parse import (urlencode, urlsplit)
+from concurrent.futures import ThreadPoolExecutor
+
+SEARCH_TERMS = ['blue', 'hall', 'the', 'jazz', 'san', 'electric owl', 'zzz']
+
+PERCENTILES = (50, 95, 99)
+
+
+class Context(object):
+    '''
+    Ids and form values the routes pick from, shared by the workers.
+    '''
+    def __init__(self, venue_ids, artist_ids, seed):
+        self.venue_ids = sorted(venue_ids)
+        self.artist_ids = sorted(artist_ids)
+        self.rng = random.Random(seed)
+        self.lock = threading.Lock()
+
+    def venue(self):
+        with self.lock:
+            return self.rng.choice(self.venue_ids)
+
+    def artist(self):
+        with self.lock:
+            return self.rng.choice(self.artist_ids)
+
+    def start_time(self):
+        # a random quarter hour in the coming ten years
+        with self.lock:
+            minutes = 15 * self.rng.randrange(10 * 365 * 24 * 4)
+        return (datetime.now() + timedelta(minutes=minutes)).strftime('%Y-%m-%d %H:%M:00')
+
+    def term(self):
+        with self.lock:
+            return self.rng.choice(SEARCH_TERMS)
+
+    def doomed(self, kind):
+        # the highest id left, never handed out again
+        ids = self.venue_ids if kind == 'venue' else self.artist_ids
+        with self.lock:
+            return ids.pop() if len(ids) > 1 else ids[0]
+
+
+def _venue_form(ctx):
+    return {'name': 'Load Test Venue', 'city': 'San Francisco', 'state': 'CA',
+            'address': '1 Main St', 'phone': '415-555-0100', 'genres': ['Jazz', 'Folk'],
+            'facebook_link': '', 'image_link': ''}
+
+
+def _artist_form(ctx):
+    return {'name': 'Load Test Artist', 'city': 'San Francisco', 'state': 'CA',
+            'phone': '415-555-0100', 'genres': ['Rock n Roll'],
+            'facebook_link': '', 'image_link': ''}
+
+
+class JsonBody(dict):
+    '''
+    A request body sent as JSON instead of a form.
+    '''
+
+
+def _tour(ctx):
+    return JsonBody(shows=[{'venue_id': ctx.venue(), 'artist_id': ctx.artist(),
+                            'start_time': ctx.start_time()} for _ in range(20)])
+
+
+# endpoint -> ctx -> (method, path, form data or JSON body)
+ROUTES = {
+    'index': lambda ctx: ('GET', '/', None),
+    'static': lambda ctx: ('GET', '/static/css/main.css', None),
+    'venues': lambda ctx: ('GET', '/venues', None),
+    'search_venues': lambda ctx: ('POST', '/venues/search', {'search_term': ctx.term()}),
+    'show_venue': lambda ctx: ('GET', '/venues/{}'.format(ctx.venue()), None),
+    'create_venue_form': lambda ctx: ('GET', '/venues/create', None),
+    'create_venue_submission': lambda ctx: ('POST', '/venues/create', _venue_form(ctx)),
+    'edit_venue': lambda ctx: ('GET', '/venues/{}/edit'.format(ctx.venue()), None),
+    'edit_venue_submission': lambda ctx: ('POST', '/venues/{}/edit'.format(ctx.venue()), _venue_form(ctx)),
+    'delete_venue': lambda ctx: ('DELETE', '/venues/{}'.format(ctx.doomed('venue')), None),
+    'artists': lambda ctx: ('GET', '/artists', None),
+    'search_artists': lambda ctx: ('POST', '/artists/search', {'search_term': ctx.term()}),
+    'show_artist': lambda ctx: ('GET', '/artists/{}'.format(ctx.artist()), None),
+    'create_artist_form': lambda ctx: ('GET', '/artists/create', None),
+    'create_artist_submission': lambda ctx: ('POST', '/artists/create', _artist_form(ctx)),
+    'edit_artist': lambda ctx: ('GET', '/artists/{}/edit'.format(ctx.artist()), None),
+    'edit_artist_submission': lambda ctx: ('POST', '/artists/{}/edit'.format(ctx.artist()), _artist_form(ctx)),
+    'delete_artist': lambda ctx: ('DELETE', '/artists/{}'.format(ctx.doomed('artist')), None),
+    'shows': lambda ctx: ('GET', '/shows', None),
+    'create_shows': lambda ctx: ('GET', '/shows/create', None),
+    'create_show_submission': lambda ctx: ('POST', '/shows/create', {
+        'venue_id': ctx.venue(), 'artist_id': ctx.artist(), 'start_time': ctx.start_time()}),
+    'book_shows': lambda ctx: ('POST', '/shows/batch', _tour(ctx)),
+    'api.venues': lambda ctx: ('GET', '/api/venues', None),
+    'api.artists': lambda ctx: ('GET', '/api/artists', None),
+    'api.shows': lambda ctx: ('GET', '/api/shows', None),
+    'cache_metrics': lambda ctx: ('GET', '/cache/metrics', None),
+    'db_metrics': lambda ctx: ('GET', '/db/metrics', None),
+    'instrumentation_metrics': lambda ctx: ('GET', '/metrics', None),
+    'instrumentation_profiles': lambda ctx: ('GET', '/metrics/profiles', None),
+}
+
+
+class ClientTarget(object):
+    '''
+    Requests through the Flask test client, one per worker thread.
+    '''
+    def __init__(self, app):
+        self.app = app
+        self.local = threading.local()
+        self.name = 'test_client'
+
+    def request(self, method, path, data=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = self.app.test_client()
+        if isinstance(data, JsonBody):
+            response = client.open(path, method=method, json=data)
+        else:
+            response = client.open(path, method=method, data=data)
+        return response.status_code, response.get_data()
+
+
+class HttpTarget(object):
+    '''
+    Requests over HTTP, one keep-alive connection per worker thread.
+    '''
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+        self.name = url
+
+    def request(self, method, path, data=None):
+        connection = getattr(self.local, 'connection', None)
+        if connection is None:
+            connection = self.local.connection = http.client.HTTPConnection(self.host, self.port)
+        if isinstance(data, JsonBody):
+            body = json.dumps(data)
+            headers = {'Content-Type': 'application/json'}
+        elif data is not None:
+            body = urlencode(data, doseq=True)
+            headers = {'Content-Type': 'application/x-www-form-urlencoded'}
+        else:
+            body = None
+            headers = {}
+        try:
+            connection.request(method, self.prefix + path, body, headers)
+            response = connection.getresponse()
+            return response.status, response.read()
+        except (http.client.HTTPException, OSError):
+            self.local.connection = None
+            connection.close()
+            raise
+
+
+def discover_ids(target, kind):
+    status, body = target.request('GET', '/api/{}?fields=id&limit=0&format=ndjson'.format(kind))
+    if status != 200:
+        raise SystemExit('GET /api/{} answered {}'.format(kind, status))
+    ids = [json.loads(line)['id'] for line in body.decode().splitlines() if line]
+    if not ids:
+        raise SystemExit('no {} to load test with, generate some first'.format(kind))
+    return ids
+
+
+def percentile(values, p):
+    # nearest rank on sorted values
+    return values[max(0, min(len(values) - 1, int(math.ceil(p / 100.0 * len(values))) - 1))]
+
+
+def run_route(target, ctx, endpoint, requests, concurrency, warmup):
+    # deletes are not repeatable, do not waste rows on warming up
+    for _ in range(0 if endpoint.startswith('delete_') else warmup):
+        target.request(*ROUTES[endpoint](ctx))
+
+    def one(_):
+        request = ROUTES[endpoint](ctx)
+        start = time.perf_counter()
+        try:
+            status, _ = target.request(*request)
+        except Exception:
+            status = None
+        return time.perf_counter() - start, status, request[0]
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        results = list(pool.map(one, range(requests)))
+    wall = time.perf_counter() - started
+
+    latencies = sorted(seconds * 1000 for seconds, _, _ in results)
+    statuses = Counter(str(status) if status else 'error' for _, status, _ in results)
+    stats = {
+        'endpoint': endpoint,
+        'method': results[0][2],
+        'requests': requests,
+        'errors': sum(count for status, count in statuses.items()
+                      if status == 'error' or int(status) >= 500),
+        'statuses': dict(statuses),
+        'mean_ms': round(sum(latencies) / len(latencies), 3),
+        'max_ms': round(latencies[-1], 3),
+        'throughput_rps': round(requests / wall, 1),
+    }
+    for p in PERCENTILES:
+        stats['p{}_ms'.format(p)] = round(percentile(latencies, p), 3)
+    return stats
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--url', help='Load test a running server instead of the test client.')
+    parser.add_argument('--database', help='Test client database, a temporary SQLite file by default.')
+    parser.add_argument('--rows', type=int, default=10000,
+                        help='Synthetic rows generated first (test client only), 0 for none.')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--requests', type=int, default=100, help='Requests per route.')
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per route.')
+    parser.add_argument('--routes', help='Comma separated endpoints, default every route.')
+    parser.add_argument('--output', help='JSON results file, default stdout.')
+    args = parser.parse_args()
+
+    if args.url:
+        target = HttpTarget(args.url)
+        # the same routes, registered without touching a database
+        from models import app
+        app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite://'
+    else:
+        from benchmarks import use_database
+        database = use_database(args.database)
+    from app import app
+    app.logger.setLevel(logging.WARNING)
+
+    endpoints = sorted(set(rule.endpoint for rule in app.url_map.iter_rules()))
+    missing = [endpoint for endpoint in endpoints if endpoint not in ROUTES]
+    if missing:
+        raise SystemExit('no load test case for {}, add them to ROUTES'.format(', '.join(missing)))
+    if args.routes:
+        endpoints = [endpoint.strip() for endpoint in args.routes.split(',')]
+    # deletes last, the other routes still find their ids
+    endpoints.sort(key=lambda endpoint: endpoint.startswith('delete_'))
+
+    generated = None
+    if not args.url:
+        target = ClientTarget(app)
+        if args.rows:
+            with app.app_context():
+                import synthetic
+                generated = synthetic.generate(args.rows, args.seed)
+    ctx = Context(discover_ids(target, 'venues'), discover_ids(target, 'artists'), args.seed)
+
+    results = {
+        'started_at': datetime.utcnow().isoformat() + 'Z',
+        'target': target.name,
+        'database': None if args.url else database,
+        'generated': generated,
+        'seed': args.seed,
+        'requests_per_route': args.requests,
+        'concurrency': args.concurrency,
+        'routes': [],
+    }
+    for endpoint in endpoints:
+        stats = run_route(target, ctx, endpoint, args.requests, args.concurrency, args.warmup)
+        results['routes'].append(stats)
+        print('{:<28} {:>6} {:>9.2f} {:>9.2f} {:>9.2f} ms {:>8.1f} req/s {:>4} errors'.format(
+            endpoint, stats['method'], stats['p50_ms'], stats['p95_ms'], stats['p99_ms'],
+            stats['throughput_rps'], stats['errors']), file=sys.stderr)
+
+    body = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, 'w') as stream:
+            stream.write(body + '\n')
+    else:
+        print(body)
+
+
+if __name__ == '__main__':
+    main()
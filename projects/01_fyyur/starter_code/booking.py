@@ -0,0 +1,189 @@
+from bisect import bisect_left
+from datetime import timedelta
+import dateutil.parser
+from sqlalchemy import (literal, and_, or_)
+from models import (db, Venue, Artist, Show)
+from bulk import insert_returning_ids
+import counters
+
+
+# ----------------------------------------------------------------------------#
+# Show booking.
+#
+# book_shows() books a batch of shows, a whole tour at once, in one
+# transaction:
+#   - the venue and artist ids of every row are checked with one IN query
+#   - a show holds its venue for SHOW_SLOT_MINUTES from its start. The
+#     shows already booked at each venue of the batch around the dates
+#     booked there come back from one query of per venue ranges on
+#     ix_show_venue_id_show_time into a SlotIndex, and each row is checked against it and against the
+#     rows before it in the batch
+#   - the valid rows are inserted together, the others come back with
+#     their errors. With all_or_nothing nothing is inserted
+#     unless every row is valid.
+# On postgres the venue rows are locked for the transaction, two batches
+# booking the same venue run one after the other.
+# ----------------------------------------------------------------------------#
+
+SHOW_SLOT_MINUTES = 180
+MAX_BATCH_SIZE = 1000
+
+
+class SlotIndex(object):
+    '''
+    Booked slots of one length per venue, sorted by start. Two slots
+    overlap when their starts are less than a slot apart, so a new slot
+    only has to be compared with the nearest start on either side,
+    found by bisection.
+    '''
+    def __init__(self, length):
+        self.length = length
+        # venue_id -> ([start, ...], [owner, ...]) in start order
+        self.venues = {}
+
+    def add(self, venue_id, start, owner):
+        starts, owners = self.venues.setdefault(venue_id, ([], []))
+        i = bisect_left(starts, start)
+        starts.insert(i, start)
+        owners.insert(i, owner)
+
+    def conflict(self, venue_id, start):
+        '''
+        (start, owner) of a slot overlapping one starting at `start`,
+        None when the venue is free.
+        '''
+        starts, owners = self.venues.get(venue_id, ((), ()))
+        i = bisect_left(starts, start)
+        for j in (i - 1, i):
+            if 0 <= j < len(starts) and abs(starts[j] - start) < self.length:
+                return starts[j], owners[j]
+        return None
+
+
+def _parse(row):
+    if not isinstance(row, dict):
+        return None, ['a show must be an object']
+    show = {}
+    errors = []
+    for key in ('venue_id', 'artist_id'):
+        try:
+            show[key] = int(row.get(key))
+        except (TypeError, ValueError):
+            errors.append(key + ' must be a number')
+    try:
+        show_time = dateutil.parser.parse(str(row.get('start_time') or ''))
+        # show times are stored as naive local times
+        if show_time.tzinfo is not None:
+            show_time = show_time.astimezone().replace(tzinfo=None)
+        show['show_time'] = show_time
+    except (ValueError, OverflowError):
+        errors.append('start_time must be a date and time, e.g. 2030-05-01T20:00:00')
+    return show, errors
+
+
+def _existing_ids(venue_ids, artist_ids):
+    '''
+    The venue and artist ids that exist, with one query.
+    '''
+    queries = []
+    if venue_ids:
+        queries.append(db.session.query(literal('venue').label('kind'), Venue.id)
+                       .filter(Venue.id.in_(venue_ids)))
+    if artist_ids:
+        queries.append(db.session.query(literal('artist').label('kind'), Artist.id)
+                       .filter(Artist.id.in_(artist_ids)))
+    if not queries:
+        return set(), set()
+    rows = queries[0].union_all(*queries[1:]).all() if len(queries) > 1 else queries[0].all()
+    return (set(entity_id for kind, entity_id in rows if kind == 'venue'),
+            set(entity_id for kind, entity_id in rows if kind == 'artist'))
+
+
+def _windows(times, length):
+    '''
+    The (after, before) ranges a slot starting at one of `times` can
+    overlap, nearby times merged into one range.
+    '''
+    windows = []
+    for start in sorted(times):
+        if windows and start - length < windows[-1][1]:
+            windows[-1][1] = start + length
+        else:
+            windows.append([start - length, start + length])
+    return windows
+
+
+def _booked_slots(shows, length):
+    index = SlotIndex(length)
+    times = {}
+    for show in shows:
+        times.setdefault(show['venue_id'], []).append(show['show_time'])
+    if not times:
+        return index
+    if db.engine.dialect.name == 'postgresql':
+        db.session.query(Venue.id).filter(Venue.id.in_(sorted(times))) \
+            .order_by(Venue.id).with_for_update().all()
+    # each venue only around its own dates, a tour over months does not
+    # read every show of its venues in between
+    ranges = [and_(Show.venue_id == venue_id, Show.show_time > after, Show.show_time < before)
+              for venue_id in sorted(times)
+              for after, before in _windows(times[venue_id], length)]
+    rows = db.session.query(Show.venue_id, Show.show_time, Show.id).filter(or_(*ranges))
+    for venue_id, show_time, show_id in rows:
+        index.add(venue_id, show_time, ('show_id', show_id))
+    return index
+
+
+def book_shows(rows, all_or_nothing=False, slot_minutes=SHOW_SLOT_MINUTES):
+    '''
+    Book the shows of `rows`, dicts with venue_id, artist_id and
+    start_time, and commit. Returns the created / rejected counts and
+    one result per row, in order.
+    '''
+    length = timedelta(minutes=slot_minutes)
+    parsed = [_parse(row) for row in rows]
+    valid = [show for show, errors in parsed if not errors]
+    venue_ids, artist_ids = _existing_ids(set(show['venue_id'] for show in valid),
+                                          set(show['artist_id'] for show in valid))
+    index = _booked_slots([show for show in valid if show['venue_id'] in venue_ids], length)
+
+    results = []
+    accepted = []
+    for i, (show, errors) in enumerate(parsed):
+        result = {'index': i}
+        if not errors:
+            if show['venue_id'] not in venue_ids:
+                errors.append('venue {} not found'.format(show['venue_id']))
+            if show['artist_id'] not in artist_ids:
+                errors.append('artist {} not found'.format(show['artist_id']))
+        if errors:
+            result.update(status='invalid', errors=errors)
+        else:
+            conflict = index.conflict(show['venue_id'], show['show_time'])
+            if conflict is not None:
+                start, (kind, owner) = conflict
+                result.update(status='conflict',
+                              errors=['venue {} is booked from {} for {} minutes'.format(
+                                  show['venue_id'], start.isoformat(), slot_minutes)],
+                              conflicts_with={kind: owner, 'start_time': start.isoformat()})
+            else:
+                index.add(show['venue_id'], show['show_time'], ('index', i))
+                result.update(status='created', venue_id=show['venue_id'],
+                              artist_id=show['artist_id'],
+                              start_time=show['show_time'].isoformat())
+                accepted.append((result, show))
+        results.append(result)
+
+    rejected = len(results) - len(accepted)
+    if rejected and all_or_nothing:
+        for result, show in accepted:
+            result['status'] = 'skipped'
+        accepted = []
+    if accepted:
+        values = [show for result, show in accepted]
+        ids = insert_returning_ids(Show.__table__, values)
+        for (result, show), show_id in zip(accepted, ids):
+            result['id'] = show_id
+        counters.record_shows(values)
+    db.session.commit()
+    return {'created': len(accepted), 'rejected': rejected, 'results': results}
@@ -0,0 +1,408 @@
+import io
+import re
+import csv
+import json
+import time
+from datetime import datetime
+from itertools import islice
+from sqlalchemy import func
+from wtforms.validators import (URL, ValidationError)
+from forms import (US_PHONE_NUM, STATE_CHOICES, GENRE_CHOICES)
+from models import (db, Venue, Artist, Show, Genre, venue_genres, artist_genres)
+from genres import (resolve, GENRE_SEPARATOR)
+import counters
+
+
+# ----------------------------------------------------------------------------#
+# Bulk import / export of venues, artists and shows.
+#
+# Files are CSV (one header line) or NDJSON (one object per line) and are
+# streamed in chunks of CHUNK_SIZE rows: each chunk is validated with the
+# rules of forms.py, inserted with one statement per table and committed,
+# so memory stays flat whatever the file size. Rejected rows are reported
+# with their line number and do not stop the import.
+#
+# Genres are a comma separated string in CSV, a string or a list in NDJSON.
+# Shows point at their venue / artist with venue_id / artist_id or, when
+# the id is empty, with venue_name / artist_name.
+# ----------------------------------------------------------------------------#
+
+CHUNK_SIZE = 1000
+
+# the format of ShowForm.start_time
+SHOW_TIME_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+STATES = set(value for value, _ in STATE_CHOICES)
+GENRES = set(value for value, _ in GENRE_CHOICES)
+
+EXPORT_FIELDS = {
+    'venues': ('id', 'name', 'city', 'state', 'address', 'phone', 'genres',
+               'image_link', 'facebook_link'),
+    'artists': ('id', 'name', 'city', 'state', 'phone', 'genres',
+                'image_link', 'facebook_link'),
+    'shows': ('id', 'venue_id', 'venue_name', 'artist_id', 'artist_name', 'start_time'),
+}
+
+
+def guess_format(path):
+    return 'csv' if path.lower().endswith('.csv') else 'ndjson'
+
+
+# -------------------------------------------------
+# Reading
+# -------------------------------------------------
+def read_rows(stream, fmt):
+    '''
+    Yield (line number, row dict or ValueError) from a CSV / NDJSON stream.
+    '''
+    if fmt == 'csv':
+        reader = csv.DictReader(stream)
+        for row in reader:
+            yield reader.line_num, row
+        return
+    for line_num, line in enumerate(stream, 1):
+        if not line.strip():
+            continue
+        try:
+            row = json.loads(line)
+            if not isinstance(row, dict):
+                raise ValueError('expected a JSON object')
+            yield line_num, row
+        except ValueError as e:
+            yield line_num, ValueError(str(e))
+
+
+def chunks(rows, size):
+    rows = iter(rows)
+    while True:
+        chunk = list(islice(rows, size))
+        if not chunk:
+            return
+        yield chunk
+
+
+# -------------------------------------------------
+# Validation, same rules as VenueForm / ArtistForm
+# -------------------------------------------------
+class _Field(object):
+    '''
+    Just enough of a wtforms field to run a validator on a plain value.
+    '''
+    def __init__(self, data):
+        self.data = data
+
+    def gettext(self, string):
+        return string
+
+
+def _text(row, key, required=True):
+    value = row.get(key)
+    value = '' if value is None else str(value).strip()
+    if required and not value:
+        raise ValueError(key + ' is required')
+    return value or None
+
+
+def _phone(row):
+    phone = _text(row, 'phone')
+    if not re.search(US_PHONE_NUM, phone):
+        raise ValueError('phone number must be in format xxx-xxx-xxxx')
+    return phone
+
+
+def _state(row):
+    state = _text(row, 'state')
+    if state not in STATES:
+        raise ValueError('unknown state ' + state)
+    return state
+
+
+def _genres(row):
+    value = row.get('genres') or []
+    names = value if isinstance(value, list) else str(value).split(',')
+    names = list(dict.fromkeys(name.strip() for name in names if name and name.strip()))
+    if not names:
+        raise ValueError('genres is required')
+    unknown = [name for name in names if name not in GENRES]
+    if unknown:
+        raise ValueError('unknown genres ' + ', '.join(unknown))
+    return names
+
+
+def _url(row, key):
+    # forms.py requires facebook_link to be an URL, imports may leave it out
+    value = _text(row, key, required=False)
+    if value is not None:
+        try:
+            URL()(None, _Field(value))
+        except ValidationError as e:
+            raise ValueError('{}: {}'.format(key, e))
+    return value
+
+
+def validate_venue(row):
+    return {
+      'name': _text(row, 'name'),
+      'city': _text(row, 'city'),
+      'state': _state(row),
+      'address': _text(row, 'address'),
+      'phone': _phone(row),
+      'genres': _genres(row),
+      'image_link': _text(row, 'image_link', required=False),
+      'facebook_link': _url(row, 'facebook_link'),
+    }
+
+
+def validate_artist(row):
+    return {
+      'name': _text(row, 'name'),
+      'city': _text(row, 'city'),
+      'state': _state(row),
+      'phone': _phone(row),
+      'genres': _genres(row),
+      'image_link': _text(row, 'image_link', required=False),
+      'facebook_link': _url(row, 'facebook_link'),
+    }
+
+
+def _reference(row, kind):
+    '''
+    ('id', int) or ('name', str) for the venue / artist of a show row.
+    '''
+    entity_id = _text(row, kind + '_id', required=False)
+    if entity_id is not None:
+        try:
+            return 'id', int(entity_id)
+        except ValueError:
+            raise ValueError(kind + '_id must be a number')
+    name = _text(row, kind + '_name', required=False)
+    if name is None:
+        raise ValueError(kind + '_id or ' + kind + '_name is required')
+    return 'name', name
+
+
+def validate_show(row):
+    start_time = _text(row, 'start_time')
+    try:
+        start_time = datetime.strptime(start_time, SHOW_TIME_FORMAT)
+    except ValueError:
+        raise ValueError('start_time must be in format YYYY-MM-DD HH:MM:SS')
+    return {
+      'venue': _reference(row, 'venue'),
+      'artist': _reference(row, 'artist'),
+      'show_time': start_time,
+    }
+
+
+# -------------------------------------------------
+# Import
+# -------------------------------------------------
+def insert_returning_ids(table, values):
+    '''
+    Insert `values` with one statement, return their ids in order.
+    '''
+    if db.engine.dialect.name == 'postgresql':
+        # one multi-row INSERT, ids come back in VALUES order
+        result = db.session.execute(table.insert().values(values).returning(table.c.id))
+        return [row[0] for row in result]
+    # SQLite, while developing: one executemany. The writer holds the
+    # database lock until commit and each row takes the next rowid, so
+    # the new rows are the len(values) highest ids, in VALUES order
+    db.session.execute(table.insert(), values)
+    rows = db.session.query(table.c.id).order_by(table.c.id.desc()).limit(len(values))
+    return [row_id for row_id, in rows][::-1]
+
+
+def _import_entities(model, validate, links, key, rows, chunk_size, on_error):
+    table = model.__table__
+    # make sure every genre offered by the forms exists
+    resolve(sorted(GENRES))
+    db.session.commit()
+    genre_ids = dict(db.session.query(Genre.name, Genre.id).all())
+    accepted = rejected = 0
+    for chunk in chunks(rows, chunk_size):
+        values = []
+        for line_num, row in chunk:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                values.append(validate(row))
+            except ValueError as e:
+                rejected += 1
+                on_error(line_num, str(e))
+        if not values:
+            continue
+        names = [value.pop('genres') for value in values]
+        for value, row_names in zip(values, names):
+            value['genres_text'] = GENRE_SEPARATOR.join(row_names)
+        ids = insert_returning_ids(table, [
+          dict((prop.columns[0].name, value[prop.key])
+               for prop in model.__mapper__.column_attrs
+               if prop.key in value)
+          for value in values])
+        db.session.execute(links.insert(), [{key: entity_id, 'genre_id': genre_ids[name]}
+                                            for entity_id, row_names in zip(ids, names)
+                                            for name in row_names])
+        db.session.commit()
+        accepted += len(values)
+    return accepted, rejected
+
+
+def _resolve(model, references):
+    '''
+    Map ('id', x) / ('name', x) references to ids with one IN query per
+    kind. Names shared by several rows are left out as ambiguous.
+    '''
+    resolved = {}
+    ids = set(value for kind, value in references if kind == 'id')
+    names = set(value for kind, value in references if kind == 'name')
+    if ids:
+        for (entity_id,) in db.session.query(model.id).filter(model.id.in_(ids)):
+            resolved[('id', entity_id)] = entity_id
+    if names:
+        rows = db.session.query(model.name, func.min(model.id), func.count(model.id)) \
+            .filter(model.name.in_(names)) \
+            .group_by(model.name)
+        for name, entity_id, count in rows:
+            resolved[('name', name)] = entity_id if count == 1 else None
+    return resolved
+
+
+def copy_rows(table, columns, rows):
+    '''
+    COPY `rows`, tuples in `columns` order, into `table` (postgres only).
+    '''
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    for row in rows:
+        writer.writerow([value.strftime(SHOW_TIME_FORMAT) if isinstance(value, datetime) else value
+                         for value in row])
+    buffer.seek(0)
+    cursor = db.session.connection().connection.cursor()
+    cursor.copy_expert('COPY "{}" ({}) FROM STDIN WITH CSV'.format(table.name, ', '.join(columns)),
+                       buffer)
+
+
+def _import_shows(rows, chunk_size, on_error):
+    accepted = rejected = 0
+    for chunk in chunks(rows, chunk_size):
+        candidates = []
+        for line_num, row in chunk:
+            try:
+                if isinstance(row, Exception):
+                    raise row
+                candidates.append((line_num, validate_show(row)))
+            except ValueError as e:
+                rejected += 1
+                on_error(line_num, str(e))
+
+        venues = _resolve(Venue, [show['venue'] for _, show in candidates])
+        artists = _resolve(Artist, [show['artist'] for _, show in candidates])
+        values = []
+        for line_num, show in candidates:
+            venue_id = venues.get(show['venue'])
+            artist_id = artists.get(show['artist'])
+            if venue_id is None or artist_id is None:
+                rejected += 1
+                missing = 'venue' if venue_id is None else 'artist'
+                on_error(line_num, '{} {} not found or ambiguous'.format(
+                    missing, show[missing][1]))
+                continue
+            values.append({'venue_id': venue_id, 'artist_id': artist_id,
+                           'show_time': show['show_time']})
+        if not values:
+            continue
+        if db.engine.dialect.name == 'postgresql':
+            copy_rows(Show.__table__, ('venue_id', 'artist_id', 'show_time'),
+                      ((value['venue_id'], value['artist_id'], value['show_time']) for value in values))
+        else:
+            db.session.execute(Show.__table__.insert(), values)
+        counters.record_shows(values)
+        db.session.commit()
+        accepted += len(values)
+    return accepted, rejected
+
+
+def import_rows(kind, stream, fmt, chunk_size=CHUNK_SIZE, on_error=None):
+    '''
+    Import venues, artists or shows from `stream`. Returns a report with
+    the accepted / rejected counts, the time taken and the throughput.
+    '''
+    on_error = on_error or (lambda line_num, message: None)
+    rows = read_rows(stream, fmt)
+    started = time.perf_counter()
+    try:
+        if kind == 'venues':
+            accepted, rejected = _import_entities(Venue, validate_venue, venue_genres,
+                                                  'venue_id', rows, chunk_size, on_error)
+        elif kind == 'artists':
+            accepted, rejected = _import_entities(Artist, validate_artist, artist_genres,
+                                                  'artist_id', rows, chunk_size, on_error)
+        else:
+            accepted, rejected = _import_shows(rows, chunk_size, on_error)
+    except Exception:
+        db.session.rollback()
+        raise
+    finally:
+        db.session.close()
+    seconds = time.perf_counter() - started
+    return {
+      'kind': kind,
+      'accepted': accepted,
+      'rejected': rejected,
+      'seconds': seconds,
+      'rows_per_second': (accepted + rejected) / seconds if seconds else 0.0,
+    }
+
+
+# -------------------------------------------------
+# Export
+# -------------------------------------------------
+def _export_query(kind):
+    if kind == 'venues':
+        return db.session.query(Venue.id, Venue.name, Venue.city, Venue.state, Venue.address,
+                                Venue.phone, Venue.genres_text.label('genres'),
+                                Venue.image_link, Venue.facebook_link) \
+            .order_by(Venue.id)
+    if kind == 'artists':
+        return db.session.query(Artist.id, Artist.name, Artist.city, Artist.state,
+                                Artist.phone, Artist.genres_text.label('genres'),
+                                Artist.image_link, Artist.facebook_link) \
+            .order_by(Artist.id)
+    return db.session.query(Show.id,
+                            Venue.id.label('venue_id'),
+                            Venue.name.label('venue_name'),
+                            Artist.id.label('artist_id'),
+                            Artist.name.label('artist_name'),
+                            Show.show_time.label('start_time')) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.show_time.isnot(None)) \
+        .order_by(Show.id)
+
+
+def export_rows(kind, stream, fmt, chunk_size=CHUNK_SIZE):
+    '''
+    Write every venue, artist or show to `stream` through a server side
+    cursor, in a format import_rows() reads back. Returns the row count.
+    '''
+    fields = EXPORT_FIELDS[kind]
+    query = _export_query(kind).execution_options(stream_results=True).yield_per(chunk_size)
+    writer = None
+    if fmt == 'csv':
+        writer = csv.DictWriter(stream, fieldnames=fields)
+        writer.writeheader()
+    count = 0
+    try:
+        for row in query:
+            record = dict(zip(fields, row))
+            if kind == 'shows':
+                record['start_time'] = record['start_time'].strftime(SHOW_TIME_FORMAT)
+            if writer is not None:
+                writer.writerow(record)
+            else:
+                stream.write(json.dumps(record) + '\n')
+            count += 1
+    finally:
+        db.session.close()
+    return count
@@ -0,0 +1,285 @@
+import time
+import pickle
+import threading
+from collections import OrderedDict
+from functools import wraps
+from flask import (request, session, make_response)
+from replicas import read_from_replica
+
+
+# ----------------------------------------------------------------------------#
+# Page cache.
+#
+# Rendered GET pages are stored under their path plus the current version
+# of every tag the page depends on (e.g. 'venues', 'venue:3'). Writes call
+# invalidate() with the tags they touch, which bumps those versions: every
+# page built from the old data stops matching and ages out of the backend.
+# A page rendered from a read replica is never stored: the replica may not
+# have the write that bumped its tags yet, and the stale page would then
+# be served under the new versions, even to the writer.
+#
+# Backends:
+#   memory - in-process LRU with a TTL, one cache per worker: a write only
+#            invalidates the pages of the worker that handled it
+#   redis  - one cache for every worker talking to the same redis server,
+#            a write invalidates the pages of all of them.
+#            CACHE_REDIS_URL 'local://' swaps the server for LocalRedis,
+#            an in-process stand-in that runs the redis code path but is
+#            no more shared than the memory backend
+#   null   - caching disabled
+# ----------------------------------------------------------------------------#
+
+class MemoryBackend(object):
+    '''
+    Thread safe LRU of (expires at, value, tags), tag versions are kept
+    apart so an eviction can never bring an old version back.
+
+    A tag only keeps its own version while a live page depends on it.
+    Past 4 * max_entries versions, those of the other tags are dropped
+    and `floor`, the version every tag without one reads as, moves above
+    them all: a page built from a dropped version can never match again.
+    '''
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self.max_versions = 4 * max_entries
+        self.entries = OrderedDict()
+        self.versions = {}
+        self.floor = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[key]
+                return None
+            self.entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key, value, ttl, tags=()):
+        with self.lock:
+            self.entries[key] = (time.monotonic() + ttl, value, tuple(tags))
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.max_entries:
+                self.entries.popitem(last=False)
+
+    def versions_of(self, tags):
+        with self.lock:
+            return [self.versions.get(tag, self.floor) for tag in tags]
+
+    def bump(self, tags):
+        with self.lock:
+            for tag in tags:
+                self.versions[tag] = self.versions.get(tag, self.floor) + 1
+            if len(self.versions) > self.max_versions:
+                self._prune()
+
+    def _prune(self):
+        now = time.monotonic()
+        live = set()
+        for key, (expires, value, tags) in list(self.entries.items()):
+            if expires < now:
+                del self.entries[key]
+            else:
+                live.update(tags)
+        floor = max([self.floor] + list(self.versions.values())) + 1
+        # live tags still reading as the old floor keep it
+        self.versions = dict((tag, self.versions.get(tag, self.floor)) for tag in live)
+        self.floor = floor
+
+    def clear(self):
+        with self.lock:
+            self.floor = max([self.floor] + list(self.versions.values())) + 1
+            self.entries.clear()
+            self.versions.clear()
+
+
+class RedisBackend(object):
+    '''
+    Pages under SETEX, tag versions under INCR. Pages always carry a TTL
+    so run redis with a volatile-* maxmemory policy: only pages get
+    evicted, never versions.
+    '''
+    def __init__(self, client, prefix='fyyur:'):
+        self.client = client
+        self.prefix = prefix
+
+    def get(self, key):
+        value = self.client.get(self.prefix + 'page:' + key)
+        return None if value is None else pickle.loads(value)
+
+    def set(self, key, value, ttl, tags=()):
+        self.client.setex(self.prefix + 'page:' + key, ttl, pickle.dumps(value))
+
+    def versions_of(self, tags):
+        if not tags:
+            return []
+        versions = self.client.mget([self.prefix + 'tag:' + tag for tag in tags])
+        return [int(version or 0) for version in versions]
+
+    def bump(self, tags):
+        for tag in tags:
+            self.client.incr(self.prefix + 'tag:' + tag)
+
+    def clear(self):
+        for key in self.client.keys(self.prefix + '*'):
+            self.client.delete(key)
+
+
+class LocalRedis(object):
+    '''
+    In-process stand-in for the few redis commands RedisBackend uses,
+    handy for running the redis code path without a server. Every worker
+    gets its own, invalidations do not reach the other workers.
+    '''
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def _live(self, key):
+        expires = self.expires.get(key)
+        if expires is not None and expires < time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return self.data.get(key)
+
+    def get(self, key):
+        with self.lock:
+            return self._live(key)
+
+    def mget(self, keys):
+        with self.lock:
+            return [self._live(key) for key in keys]
+
+    def setex(self, key, ttl, value):
+        with self.lock:
+            self.data[key] = value
+            self.expires[key] = time.monotonic() + ttl
+
+    def incr(self, key):
+        with self.lock:
+            value = int(self._live(key) or 0) + 1
+            self.data[key] = str(value).encode()
+            return value
+
+    def keys(self, pattern):
+        prefix = pattern.rstrip('*')
+        with self.lock:
+            return [key for key in list(self.data) if key.startswith(prefix)]
+
+    def delete(self, key):
+        with self.lock:
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+
+
+class PageCache(object):
+    def __init__(self, backend, ttl=60):
+        self.backend = backend
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.metrics = {'hits': 0, 'misses': 0, 'stores': 0, 'invalidations': 0, 'endpoints': {}}
+
+    @classmethod
+    def from_config(cls, config):
+        name = config.get('CACHE_BACKEND', 'memory')
+        if name == 'null':
+            backend = None
+        elif name == 'memory':
+            backend = MemoryBackend(config.get('CACHE_MAX_ENTRIES', 1000))
+        elif name == 'redis':
+            url = config.get('CACHE_REDIS_URL', 'local://')
+            if url == 'local://':
+                client = LocalRedis()
+            else:
+                import redis
+                client = redis.Redis.from_url(url)
+            backend = RedisBackend(client)
+        else:
+            raise ValueError('Unknown CACHE_BACKEND ' + name)
+        return cls(backend, config.get('CACHE_TTL', 60))
+
+    def _count(self, endpoint, outcome):
+        with self.lock:
+            self.metrics[outcome] += 1
+            counts = self.metrics['endpoints'].setdefault(endpoint, {'hits': 0, 'misses': 0})
+            counts[outcome] += 1
+
+    def cached(self, tags):
+        '''
+        Cache a GET view. `tags` is called with the view arguments and
+        returns the tags the page depends on.
+        '''
+        def decorator(view):
+            @wraps(view)
+            def wrapper(*args, **kwargs):
+                # flashed messages are rendered into the page, never share those
+                if self.backend is None or request.method != 'GET' or session.get('_flashes'):
+                    return view(*args, **kwargs)
+                page_tags = tags(**kwargs)
+                versions = self.backend.versions_of(page_tags)
+                key = request.full_path + '|' + ','.join(
+                    '{}={}'.format(tag, version) for tag, version in zip(page_tags, versions))
+                entry = self.backend.get(key)
+                if entry is not None:
+                    self._count(request.endpoint, 'hits')
+                    body, status, mimetype = entry
+                    response = make_response(body, status)
+                    response.mimetype = mimetype
+                    return response
+
+                self._count(request.endpoint, 'misses')
+                response = make_response(view(*args, **kwargs))
+                if response.status_code != 200 or response.direct_passthrough:
+                    return response
+                if response.is_streamed:
+                    # stored once the last chunk went out, see streaming.py
+                    response.response = self._tee(response.response, key, page_tags,
+                                                  response.mimetype)
+                elif not read_from_replica():
+                    self._store(key, page_tags, response.get_data(), response.mimetype)
+                return response
+            return wrapper
+        return decorator
+
+    def _store(self, key, tags, body, mimetype):
+        self.backend.set(key, (body, 200, mimetype), self.ttl, tags)
+        with self.lock:
+            self.metrics['stores'] += 1
+
+    def _tee(self, chunks, key, tags, mimetype):
+        body = []
+        replica = False
+        try:
+            for chunk in chunks:
+                body.append(chunk if isinstance(chunk, bytes) else chunk.encode('utf-8'))
+                # the streamed view's context is only there between its
+                # chunks, the replica is picked by its first query
+                replica = replica or read_from_replica()
+                yield chunk
+            if not replica:
+                self._store(key, tags, b''.join(body), mimetype)
+        finally:
+            if hasattr(chunks, 'close'):
+                chunks.close()
+
+    def clear(self):
+        if self.backend is not None:
+            self.backend.clear()
+
+    def invalidate(self, *tags):
+        if self.backend is None or not tags:
+            return
+        self.backend.bump(tags)
+        with self.lock:
+            self.metrics['invalidations'] += len(tags)
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics, endpoints=dict(self.metrics['endpoints']))
+        lookups = stats['hits'] + stats['misses']
+        stats['hit_ratio'] = float(stats['hits']) / lookups if lookups else 0.0
+        return stats
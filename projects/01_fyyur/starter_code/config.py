@@ -1,4 +1,5 @@
 import os
+import json
 SECRET_KEY = os.urandom(32)
 # Grabs the folder where the script runs.
 basedir = os.path.abspath(os.path.dirname(__file__))
@@ -21,4 +22,91 @@ PORT = 5432
 HOST = 'localhost'
 
 SQLALCHEMY_DATABASE_URI = f'{DIALECT}://{DB_USER}:{DB_PASSWORD}@{HOST}:{PORT}/{DBNAME}'
-SQLALCHEMY_TRACK_MODIFICATIONS = False
\ No newline at end of file
+SQLALCHEMY_TRACK_MODIFICATIONS = False
+
+# ---------------------------------------
+# Page cache, see cache.py
+# ---------------------------------------
+CACHE_BACKEND = os.environ.get('FYYUR_CACHE_BACKEND', 'memory')
+CACHE_REDIS_URL = os.environ.get('FYYUR_CACHE_REDIS_URL', 'redis://localhost:6379/0')
+CACHE_TTL = int(os.environ.get('FYYUR_CACHE_TTL', 60))
+CACHE_MAX_ENTRIES = int(os.environ.get('FYYUR_CACHE_MAX_ENTRIES', 1000))
+
+# ---------------------------------------
+# Upcoming / past show counters, see
+# counters.py. Off when cron runs
+# `flask roll-over-counters` instead
+# ---------------------------------------
+ROLLOVER_IN_REQUESTS = os.environ.get('FYYUR_ROLLOVER_IN_REQUESTS', '1') == '1'
+
+# ---------------------------------------
+# Venue / artist deletes, see archive.py
+# 'delete' drops the shows with the venue or artist,
+# 'archive' moves them to ShowArchive first
+# ---------------------------------------
+DELETE_MODE = os.environ.get('FYYUR_DELETE_MODE', 'delete')
+ARCHIVE_BATCH_SIZE = int(os.environ.get('FYYUR_ARCHIVE_BATCH_SIZE', 1000))
+
+# ---------------------------------------
+# Connection pool, see pool.py. The size
+# options are ignored on sqlite
+# ---------------------------------------
+SQLALCHEMY_ENGINE_OPTIONS = {
+    'pool_size': int(os.environ.get('FYYUR_DB_POOL_SIZE', 5)),
+    'max_overflow': int(os.environ.get('FYYUR_DB_MAX_OVERFLOW', 10)),
+    'pool_timeout': int(os.environ.get('FYYUR_DB_POOL_TIMEOUT', 30)),
+    'pool_recycle': int(os.environ.get('FYYUR_DB_POOL_RECYCLE', 1800)),
+    'pool_pre_ping': os.environ.get('FYYUR_DB_POOL_PRE_PING', '1') == '1',
+}
+# a connection held longer than this is listed by /db/metrics
+DB_POOL_LEAK_SECONDS = int(os.environ.get('FYYUR_DB_POOL_LEAK_SECONDS', 30))
+
+# ---------------------------------------
+# Venue / artist pages run their entity,
+# upcoming and past shows queries at the
+# same time, see queries.py. Off by
+# default: each page takes up to three
+# more pool connections, run
+# benchmarks/bench_detail.py first
+# ---------------------------------------
+DETAIL_CONCURRENT_QUERIES = os.environ.get('FYYUR_DETAIL_CONCURRENT_QUERIES', '0') == '1'
+
+# ---------------------------------------
+# The venues, artists and shows pages are
+# sent while they render, see streaming.py
+# ---------------------------------------
+STREAM_TEMPLATES = os.environ.get('FYYUR_STREAM_TEMPLATES', '1') == '1'
+
+# ---------------------------------------
+# Minutes a show holds its venue, see
+# booking.py
+# ---------------------------------------
+SHOW_SLOT_MINUTES = int(os.environ.get('FYYUR_SHOW_SLOT_MINUTES', 180))
+
+# ---------------------------------------
+# Read replicas, see replicas.py
+# comma separated database URIs
+# ---------------------------------------
+SQLALCHEMY_REPLICA_URIS = [uri for uri in os.environ.get('FYYUR_DB_REPLICA_URIS', '').split(',') if uri]
+REPLICA_MAX_LAG = float(os.environ.get('FYYUR_REPLICA_MAX_LAG', 5))
+REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('FYYUR_REPLICA_LAG_CHECK_INTERVAL', 2))
+# reads stay on the primary at least this long after a write
+REPLICA_STICKY_SECONDS = float(os.environ.get('FYYUR_REPLICA_STICKY_SECONDS', 2))
+
+# ---------------------------------------
+# /metrics and /metrics/profiles, see
+# instrumentation.py. Off by default,
+# profiles show file and function names
+# ---------------------------------------
+INSTRUMENTATION_EXPOSE_METRICS = os.environ.get('FYYUR_EXPOSE_METRICS', '0') == '1'
+
+# ---------------------------------------
+# Logging, see applog.py. JSON lines,
+# written by a background thread
+# ---------------------------------------
+LOG_FILE = os.environ.get('FYYUR_LOG_FILE', 'error.log')
+LOG_LEVEL = os.environ.get('FYYUR_LOG_LEVEL', 'INFO')
+LOG_MAX_BYTES = int(os.environ.get('FYYUR_LOG_MAX_BYTES', 10 * 1024 * 1024))
+LOG_BACKUP_COUNT = int(os.environ.get('FYYUR_LOG_BACKUP_COUNT', 5))
+# share of the records below WARNING kept per endpoint, e.g. '{"venues": 0.1}'
+LOG_SAMPLE_RATES = json.loads(os.environ.get('FYYUR_LOG_SAMPLE_RATES', '{}'))
@@ -0,0 +1,202 @@
+import time
+from datetime import datetime
+from sqlalchemy import (func, case, and_, bindparam)
+from models import (db, Venue, Artist, Show, ShowCounter)
+
+
+# ----------------------------------------------------------------------------#
+# Upcoming / past show counters.
+#
+# Venue and Artist carry upcoming_shows_count and past_shows_count columns.
+# A show counts as upcoming while its show_time is at or after the
+# watermark kept in ShowCounter.rolled_at and as past once it falls
+# before it. Writes adjust the counters in the same transaction and
+# roll_over() moves the shows that started since the last roll over
+# from upcoming to past, so reading a count never touches Show. Both
+# hold the ShowCounter row locked (FOR UPDATE on postgres) while they
+# work, so they run one after the other.
+# roll_over() runs from `flask roll-over-counters`, e.g. every minute
+# from cron, and also from incoming requests unless
+# ROLLOVER_IN_REQUESTS is off.
+# ----------------------------------------------------------------------------#
+
+# seconds between two roll overs triggered by incoming requests
+ROLLOVER_INTERVAL = 60
+
+_last_rollover = [0.0]
+
+
+def _watermark():
+    '''
+    The watermark, with its row locked until the transaction ends: the
+    write hooks and roll_over() run one after the other, so a show
+    committed while a roll over runs is counted on the right side of it.
+    '''
+    return db.session.query(ShowCounter.rolled_at) \
+        .filter(ShowCounter.id == 1) \
+        .with_for_update() \
+        .scalar()
+
+
+def _bump(model, deltas):
+    '''
+    Add the given {'id', 'upcoming', 'past'} deltas to the counters of
+    `model` with one executemany UPDATE.
+    '''
+    deltas = [d for d in deltas if d['upcoming'] or d['past']]
+    if not deltas:
+        return
+    table = model.__table__
+    statement = table.update() \
+        .where(table.c.id == bindparam('_id')) \
+        .values(upcoming_shows_count=table.c.upcoming_shows_count + bindparam('_upcoming'),
+                past_shows_count=table.c.past_shows_count + bindparam('_past'))
+    db.session.execute(statement, [{
+      '_id': d['id'],
+      '_upcoming': d['upcoming'],
+      '_past': d['past'],
+    } for d in deltas])
+
+
+def _split_counts(rolled_at):
+    upcoming = func.sum(case([(Show.show_time >= rolled_at, 1)], else_=0))
+    past = func.sum(case([(Show.show_time < rolled_at, 1)], else_=0))
+    return upcoming, past
+
+
+# -------------------------------------------------
+# Write hooks, called before the caller commits
+# -------------------------------------------------
+def record_show(venue_id, artist_id, show_time):
+    '''
+    Count a newly added show for its venue and artist.
+    '''
+    rolled_at = _watermark()
+    # counters not built yet, rebuild() will pick the show up
+    if rolled_at is None or show_time is None:
+        return
+    if show_time >= rolled_at:
+        delta = {'upcoming': 1, 'past': 0}
+    else:
+        delta = {'upcoming': 0, 'past': 1}
+    _bump(Venue, [dict(delta, id=venue_id)])
+    _bump(Artist, [dict(delta, id=artist_id)])
+
+
+def record_shows(shows):
+    '''
+    Count a batch of new shows, given as dicts with venue_id, artist_id
+    and show_time, with one UPDATE per table.
+    '''
+    rolled_at = _watermark()
+    if rolled_at is None:
+        return
+    for model, key in ((Venue, 'venue_id'), (Artist, 'artist_id')):
+        deltas = {}
+        for show in shows:
+            if show['show_time'] is None:
+                continue
+            delta = deltas.setdefault(show[key], {'id': show[key], 'upcoming': 0, 'past': 0})
+            delta['upcoming' if show['show_time'] >= rolled_at else 'past'] += 1
+        _bump(model, list(deltas.values()))
+
+
+def forget_shows(*criteria):
+    '''
+    Take the shows matching `criteria` off the counters of their venues
+    and artists, before the shows are deleted or archived.
+    '''
+    rolled_at = _watermark()
+    if rolled_at is None:
+        return
+    upcoming, past = _split_counts(rolled_at)
+    for model, key in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        rows = db.session.query(key, upcoming, past) \
+            .filter(*criteria) \
+            .group_by(key) \
+            .all()
+        _bump(model, [{
+          'id': entity_id,
+          'upcoming': -(num_upcoming or 0),
+          'past': -(num_past or 0),
+        } for entity_id, num_upcoming, num_past in rows])
+
+
+# -------------------------------------------------
+# Maintenance
+# -------------------------------------------------
+def roll_over(now=None):
+    '''
+    Move the shows that started since the last roll over from the
+    upcoming to the past counters. Safe to run from several workers:
+    only the one that advances the watermark applies the change.
+
+    Returns the (venue ids, artist ids) whose counters moved, None when
+    there was no watermark yet and every counter was rebuilt.
+    '''
+    now = now or datetime.now()
+    rolled_at = _watermark()
+    if rolled_at is None:
+        rebuild(now)
+        return None
+    if now <= rolled_at:
+        db.session.rollback()
+        return [], []
+    claimed = db.session.query(ShowCounter) \
+        .filter(ShowCounter.id == 1, ShowCounter.rolled_at == rolled_at) \
+        .update({'rolled_at': now}, synchronize_session=False)
+    if not claimed:
+        db.session.rollback()
+        return [], []
+
+    window = and_(Show.show_time >= rolled_at, Show.show_time < now)
+    moved = []
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        rows = db.session.query(column, func.count(Show.id)) \
+            .filter(window) \
+            .group_by(column) \
+            .all()
+        _bump(model, [{'id': entity_id, 'upcoming': -count, 'past': count}
+                      for entity_id, count in rows])
+        moved.append([entity_id for entity_id, count in rows])
+    db.session.commit()
+    return tuple(moved)
+
+
+def roll_over_if_due():
+    '''
+    Roll over at most once every ROLLOVER_INTERVAL seconds per process,
+    returns what roll_over() did or ([], []) when it was not due.
+    '''
+    if time.monotonic() - _last_rollover[0] < ROLLOVER_INTERVAL:
+        return [], []
+    _last_rollover[0] = time.monotonic()
+    return roll_over()
+
+
+def rebuild(now=None):
+    '''
+    Recompute every counter from the Show table and reset the watermark.
+    '''
+    now = now or datetime.now()
+    upcoming, past = _split_counts(now)
+    for model, column in ((Venue, Show.venue_id), (Artist, Show.artist_id)):
+        db.session.query(model).update({'upcoming_shows_count': 0, 'past_shows_count': 0},
+                                       synchronize_session=False)
+        rows = db.session.query(column, upcoming, past) \
+            .filter(Show.show_time.isnot(None)) \
+            .group_by(column) \
+            .all()
+        _bump(model, [{
+          'id': entity_id,
+          'upcoming': num_upcoming or 0,
+          'past': num_past or 0,
+        } for entity_id, num_upcoming, num_past in rows])
+
+    state = db.session.query(ShowCounter).get(1)
+    if state is None:
+        db.session.add(ShowCounter(id=1, rolled_at=now))
+    else:
+        state.rolled_at = now
+    db.session.commit()
+    return now
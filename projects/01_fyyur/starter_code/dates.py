@@ -0,0 +1,57 @@
+from datetime import datetime
+from functools import lru_cache
+import dateutil.parser
+from babel import Locale
+from babel.dates import (parse_pattern, LC_TIME)
+
+
+# ----------------------------------------------------------------------------#
+# Date formatting for the templates.
+#
+# format_datetime() backs the Jinja `datetime` filter. It takes datetime
+# objects as they come out of the queries (strings still work), compiles
+# every Babel pattern and locale once, and remembers the last
+# DATETIME_CACHE_SIZE results: a page of shows repeats a handful of
+# dates, so most rows are a dictionary lookup.
+# ----------------------------------------------------------------------------#
+
+DATETIME_CACHE_SIZE = 4096
+
+FORMATS = {
+    'full': "EEEE MMMM, d, y 'at' h:mma",
+    'medium': "EE MM, dd, y h:mma",
+}
+
+
+@lru_cache(maxsize=None)
+def _pattern(format):
+    return parse_pattern(FORMATS.get(format, format))
+
+
+@lru_cache(maxsize=None)
+def _locale(name):
+    return Locale.parse(name)
+
+
+@lru_cache(maxsize=DATETIME_CACHE_SIZE)
+def _format(value, format, locale):
+    if not isinstance(value, datetime):
+        value = dateutil.parser.parse(value)
+    return _pattern(format).apply(value, _locale(locale))
+
+
+def format_datetime(value, format='medium', locale=None):
+    '''
+    Format a datetime, or a string dateutil can parse, with one of
+    FORMATS or a Babel pattern.
+    '''
+    if value is None:
+        return ''
+    return _format(value, format, locale or LC_TIME or 'en_US')
+
+
+def cache_info():
+    return {
+        'results': _format.cache_info()._asdict(),
+        'patterns': _pattern.cache_info()._asdict(),
+    }
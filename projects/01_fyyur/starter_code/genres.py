@@ -0,0 +1,60 @@
+from models import (db, Genre)
+
+
+# ----------------------------------------------------------------------------#
+# Genres.
+#
+# Genre rows are linked to venues and artists through venue_genres and
+# artist_genres. The genres_text column of each venue / artist repeats
+# the names joined by GENRE_SEPARATOR so detail pages and the search
+# index can read them without a join, set_genres() keeps both in step.
+# ----------------------------------------------------------------------------#
+
+GENRE_SEPARATOR = ', '
+
+
+def resolve(names):
+    '''
+    Genre rows for `names` in the given order, creating the missing ones.
+    '''
+    names = [name.strip() for name in names if name and name.strip()]
+    names = list(dict.fromkeys(names))
+    if not names:
+        return []
+    existing = {genre.name: genre for genre in
+                db.session.query(Genre).filter(Genre.name.in_(names)).all()}
+    genres = []
+    for name in names:
+        genre = existing.get(name)
+        if genre is None:
+            genre = Genre(name=name)
+            db.session.add(genre)
+        genres.append(genre)
+    return genres
+
+
+def set_genres(entity, names):
+    '''
+    Replace the genres of a venue or artist.
+    '''
+    entity.genres = resolve(names)
+    entity.genres_text = GENRE_SEPARATOR.join(genre.name for genre in entity.genres)
+
+
+def split_genres(genres_text):
+    if not genres_text:
+        return []
+    return genres_text.split(GENRE_SEPARATOR)
+
+
+def genre_filter(query, model, association, name):
+    '''
+    Narrow a query on `model` to the rows having genre `name`. Walks
+    Genre.name's unique index and the association's (genre_id, ...)
+    index, so the cost follows the matching rows only.
+    '''
+    key = [column for column in association.c if column.name != 'genre_id'][0]
+    return query \
+        .join(association, key == model.id) \
+        .join(Genre, Genre.id == association.c.genre_id) \
+        .filter(Genre.name == name)
@@ -0,0 +1,278 @@
+import io
+import time
+import random
+import pstats
+import cProfile
+import threading
+from collections import (defaultdict, deque)
+from flask import (g, request, Response, has_request_context)
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+
+# ----------------------------------------------------------------------------#
+# Request instrumentation.
+#
+#   instrumentation = Instrumentation(app)
+#
+# Records per endpoint: wall time, SQL statements and their time,
+# template render time and JSON serialization time. A request running
+# the same SQL statement N_PLUS_ONE_THRESHOLD times or more is flagged
+# as an N+1 pattern and logged with the statement.
+#
+#   GET /metrics            Prometheus text format
+#   GET /metrics/profiles   last cProfile samples
+#
+# The two routes show endpoints, SQL, file paths and function names, they
+# are only registered when INSTRUMENTATION_EXPOSE_METRICS is on. Keep them
+# off where the app is reachable from outside, or scrape them from behind
+# the proxy.
+#
+# A request is profiled when INSTRUMENTATION_PROFILING is on and it
+# carries ?_profile=1, or at random with INSTRUMENTATION_PROFILE_RATE.
+#
+# The Fyyur, trivia and coffee shop backends deploy on their own and each
+# ships a copy of this file. test_flaskr.py in the trivia backend fails
+# when the three copies differ.
+# ----------------------------------------------------------------------------#
+
+N_PLUS_ONE_THRESHOLD = 5
+
+# upper bounds of the request duration histogram, in seconds
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+PROFILE_LINES = 40
+
+_engine_listeners = []
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _current():
+    # the measurements of the request running on this thread, if any
+    if has_request_context():
+        return g.get('_instrumentation')
+    return None
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._instrumentation_start = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    current = _current()
+    if current is not None and context is not None:
+        current['sql_count'] += 1
+        current['sql_time'] += time.perf_counter() - context._instrumentation_start
+        current['statements'][statement] += 1
+
+
+def _listen_to_engines():
+    # once per process, shared by every instrumented app
+    if not _engine_listeners:
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _engine_listeners.append(True)
+
+
+def _timed(name, fn):
+    def wrapper(*args, **kwargs):
+        current = _current()
+        if current is None:
+            return fn(*args, **kwargs)
+        start = time.perf_counter()
+        try:
+            return fn(*args, **kwargs)
+        finally:
+            current[name] += time.perf_counter() - start
+    return wrapper
+
+
+def _timed_generator(name, fn):
+    # a streamed template renders while its response is sent, count the
+    # time spent producing each piece until the generator is exhausted
+    def wrapper(*args, **kwargs):
+        iterator = fn(*args, **kwargs)
+        while True:
+            current = _current()
+            start = time.perf_counter()
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                if current is not None:
+                    current[name] += time.perf_counter() - start
+            yield item
+    return wrapper
+
+
+class Instrumentation(object):
+    def __init__(self, app=None):
+        self.lock = threading.Lock()
+        self.endpoints = defaultdict(lambda: {
+            'requests': 0,
+            'errors': 0,
+            'wall_time': 0.0,
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'render_time': 0.0,
+            'serialize_time': 0.0,
+            'n_plus_one': 0,
+            'buckets': [0] * len(DURATION_BUCKETS),
+        })
+        # (endpoint, statement) -> most repeats seen in one request
+        self.n_plus_one = {}
+        self.profiles = deque(maxlen=20)
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault('INSTRUMENTATION_METRICS_PATH', '/metrics')
+        app.config.setdefault('INSTRUMENTATION_EXPOSE_METRICS', False)
+        app.config.setdefault('INSTRUMENTATION_PROFILING', False)
+        app.config.setdefault('INSTRUMENTATION_PROFILE_RATE', 0.0)
+        app.config.setdefault('INSTRUMENTATION_N_PLUS_ONE', N_PLUS_ONE_THRESHOLD)
+        self.app = app
+        _listen_to_engines()
+
+        # time every template render, streamed ones included, and JSON
+        # body of this app
+        template_class = app.jinja_env.template_class
+        app.jinja_env.template_class = type('TimedTemplate', (template_class,), {
+            'render': _timed('render_time', template_class.render),
+            'generate': _timed_generator('render_time', template_class.generate),
+        })
+        encoder = app.json_encoder
+        app.json_encoder = type('TimedJSONEncoder', (encoder,), {
+            'encode': _timed('serialize_time', encoder.encode),
+        })
+
+        app.before_request(self._start)
+        app.after_request(self._status)
+        app.teardown_request(self._finish)
+        if app.config['INSTRUMENTATION_EXPOSE_METRICS']:
+            path = app.config['INSTRUMENTATION_METRICS_PATH']
+            app.add_url_rule(path, 'instrumentation_metrics', self.metrics)
+            app.add_url_rule(path + '/profiles', 'instrumentation_profiles', self.profiles_view)
+        app.extensions['instrumentation'] = self
+
+    def _start(self):
+        if request.endpoint and request.endpoint.startswith('instrumentation_'):
+            return
+        current = g._instrumentation = {
+            'start': time.perf_counter(),
+            'status': 500,
+            'sql_count': 0,
+            'sql_time': 0.0,
+            'render_time': 0.0,
+            'serialize_time': 0.0,
+            'statements': defaultdict(int),
+            'profiler': None,
+        }
+        config = self.app.config
+        if (config['INSTRUMENTATION_PROFILING'] and request.args.get('_profile')) or \
+                random.random() < config['INSTRUMENTATION_PROFILE_RATE']:
+            current['profiler'] = cProfile.Profile()
+            current['profiler'].enable()
+
+    def _status(self, response):
+        current = _current()
+        if current is not None:
+            current['status'] = response.status_code
+        return response
+
+    def _finish(self, exc):
+        current = g.pop('_instrumentation', None)
+        if current is None:
+            return
+        wall_time = time.perf_counter() - current['start']
+        endpoint = request.endpoint or 'unmatched'
+        threshold = self.app.config['INSTRUMENTATION_N_PLUS_ONE']
+        repeated = [(statement, times) for statement, times in current['statements'].items()
+                    if times >= threshold]
+
+        with self.lock:
+            stats = self.endpoints[endpoint]
+            stats['requests'] += 1
+            stats['errors'] += 1 if exc is not None or current['status'] >= 500 else 0
+            stats['wall_time'] += wall_time
+            stats['sql_count'] += current['sql_count']
+            stats['sql_time'] += current['sql_time']
+            stats['render_time'] += current['render_time']
+            stats['serialize_time'] += current['serialize_time']
+            for i, bound in enumerate(DURATION_BUCKETS):
+                if wall_time <= bound:
+                    stats['buckets'][i] += 1
+            if repeated:
+                stats['n_plus_one'] += 1
+            for statement, times in repeated:
+                key = (endpoint, statement)
+                self.n_plus_one[key] = max(self.n_plus_one.get(key, 0), times)
+
+        for statement, times in repeated:
+            self.app.logger.warning('N+1 in %s: %d x %s', endpoint, times, ' '.join(statement.split()))
+
+        profiler = current['profiler']
+        if profiler is not None:
+            profiler.disable()
+            out = io.StringIO()
+            pstats.Stats(profiler, stream=out).sort_stats('cumulative').print_stats(PROFILE_LINES)
+            with self.lock:
+                self.profiles.append({
+                    'endpoint': endpoint,
+                    'path': request.full_path,
+                    'wall_time': wall_time,
+                    'stats': out.getvalue(),
+                })
+
+    def metrics(self):
+        lines = []
+
+        def family(name, kind, help_text):
+            lines.append('# HELP {} {}'.format(name, help_text))
+            lines.append('# TYPE {} {}'.format(name, kind))
+
+        with self.lock:
+            endpoints = dict((endpoint, dict(stats, buckets=list(stats['buckets'])))
+                             for endpoint, stats in self.endpoints.items())
+            n_plus_one = dict(self.n_plus_one)
+
+        family('flask_request_duration_seconds', 'histogram', 'Wall time of a request.')
+        for endpoint, stats in sorted(endpoints.items()):
+            label = 'endpoint="{}"'.format(_escape(endpoint))
+            for bound, count in zip(DURATION_BUCKETS, stats['buckets']):
+                lines.append('flask_request_duration_seconds_bucket{{{},le="{}"}} {}'.format(label, bound, count))
+            lines.append('flask_request_duration_seconds_bucket{{{},le="+Inf"}} {}'.format(label, stats['requests']))
+            lines.append('flask_request_duration_seconds_sum{{{}}} {}'.format(label, stats['wall_time']))
+            lines.append('flask_request_duration_seconds_count{{{}}} {}'.format(label, stats['requests']))
+
+        for name, key, kind, help_text in [
+            ('flask_request_errors_total', 'errors', 'counter', 'Requests answered with a 5xx or an exception.'),
+            ('flask_sql_statements_total', 'sql_count', 'counter', 'SQL statements executed.'),
+            ('flask_sql_duration_seconds_total', 'sql_time', 'counter', 'Time spent executing SQL.'),
+            ('flask_template_render_seconds_total', 'render_time', 'counter', 'Time spent rendering templates.'),
+            ('flask_serialization_seconds_total', 'serialize_time', 'counter', 'Time spent encoding JSON.'),
+            ('flask_n_plus_one_requests_total', 'n_plus_one', 'counter', 'Requests repeating a statement N_PLUS_ONE_THRESHOLD times or more.'),
+        ]:
+            family(name, kind, help_text)
+            for endpoint, stats in sorted(endpoints.items()):
+                lines.append('{}{{endpoint="{}"}} {}'.format(name, _escape(endpoint), stats[key]))
+
+        family('flask_n_plus_one_statement_repeats', 'gauge', 'Most executions of one statement in a single request.')
+        for (endpoint, statement), times in sorted(n_plus_one.items()):
+            lines.append('flask_n_plus_one_statement_repeats{{endpoint="{}",statement="{}"}} {}'.format(
+                _escape(endpoint), _escape(' '.join(statement.split())[:200]), times))
+
+        return Response('\n'.join(lines) + '\n', mimetype='text/plain; version=0.0.4')
+
+    def profiles_view(self):
+        endpoint = request.args.get('endpoint')
+        with self.lock:
+            profiles = [p for p in self.profiles if endpoint is None or p['endpoint'] == endpoint]
+        body = '\n'.join('== {} {} {:.1f} ms\n{}'.format(
+            p['endpoint'], p['path'], p['wall_time'] * 1000, p['stats']) for p in reversed(profiles))
+        return Response(body or 'no profiles yet\n', mimetype='text/plain')
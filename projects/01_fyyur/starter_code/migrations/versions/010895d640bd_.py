@@ -0,0 +1,36 @@
+"""add trigram search indexes to Venue and Artist
+
+Revision ID: 010895d640bd
+Revises: 28fd88fd516b
+Create Date: 2026-10-18 10:02:17.304581
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '010895d640bd'
+down_revision = '28fd88fd516b'
+branch_labels = None
+depends_on = None
+
+# same expression as search.search_document()
+SEARCH_DOCUMENT = "lower(coalesce(name, '') || ' ' || coalesce(city, '') || ' ' || " \
+                  "coalesce(state, '') || ' ' || coalesce(genres, ''))"
+
+
+def upgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for table in ('Venue', 'Artist'):
+        op.execute('CREATE INDEX ix_{0}_search_trgm ON "{1}" USING gin (({2}) gin_trgm_ops)'
+                   .format(table.lower(), table, SEARCH_DOCUMENT))
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'postgresql':
+        return
+    for table in ('Venue', 'Artist'):
+        op.drop_index('ix_{}_search_trgm'.format(table.lower()), table_name=table)
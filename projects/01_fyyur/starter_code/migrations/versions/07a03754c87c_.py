@@ -0,0 +1,118 @@
+"""normalize venue and artist genres
+
+Revision ID: 07a03754c87c
+Revises: 46567d4dc7ca
+Create Date: 2026-10-18 11:36:09.877412
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '07a03754c87c'
+down_revision = '46567d4dc7ca'
+branch_labels = None
+depends_on = None
+
+# the choices offered by forms.py, used to put multi-word genres back
+# together from the old space joined strings
+KNOWN_GENRES = ['Alternative', 'Blues', 'Classical', 'Country', 'Electronic', 'Folk',
+                'Funk', 'Hip-Hop', 'Heavy Metal', 'Instrumental', 'Jazz',
+                'Musical Theatre', 'Pop', 'Punk', 'R&B', 'Reggae', 'Rock n Roll',
+                'Soul', 'Other']
+
+GENRE_SEPARATOR = ', '
+
+
+def parse_genres(text):
+    '''
+    Split an old 'Rock n Roll Jazz ' value into ['Rock n Roll', 'Jazz'],
+    greedily matching the longest known genre at every word.
+    '''
+    known = [name.split(' ') for name in KNOWN_GENRES]
+    words = (text or '').split()
+    names = []
+    i = 0
+    while i < len(words):
+        match = max((k for k in known if words[i:i + len(k)] == k), key=len, default=[words[i]])
+        name = ' '.join(match)
+        if name not in names:
+            names.append(name)
+        i += len(match)
+    return names
+
+
+def upgrade():
+    genre = op.create_table('Genre',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=120), nullable=False),
+    sa.PrimaryKeyConstraint('id'),
+    sa.UniqueConstraint('name')
+    )
+    op.create_table('venue_genres',
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.ForeignKeyConstraint(['venue_id'], ['Venue.id'], ),
+    sa.PrimaryKeyConstraint('venue_id', 'genre_id')
+    )
+    op.create_index('ix_venue_genres_genre_id_venue_id', 'venue_genres', ['genre_id', 'venue_id'], unique=False)
+    op.create_table('artist_genres',
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('genre_id', sa.Integer(), nullable=False),
+    sa.ForeignKeyConstraint(['artist_id'], ['Artist.id'], ),
+    sa.ForeignKeyConstraint(['genre_id'], ['Genre.id'], ),
+    sa.PrimaryKeyConstraint('artist_id', 'genre_id')
+    )
+    op.create_index('ix_artist_genres_genre_id_artist_id', 'artist_genres', ['genre_id', 'artist_id'], unique=False)
+    for table in ('Venue', 'Artist'):
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('genres', type_=sa.String(length=500),
+                                  existing_type=sa.String(length=120), existing_nullable=True)
+
+    # backfill the genre rows and links from the old strings
+    bind = op.get_bind()
+    parsed = {}
+    for table in ('Venue', 'Artist'):
+        entity = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        parsed[table] = [(row.id, parse_genres(row.genres))
+                         for row in bind.execute(sa.select([entity.c.id, entity.c.genres]))]
+
+    names = list(KNOWN_GENRES)
+    for rows in parsed.values():
+        for _, row_names in rows:
+            names.extend(name for name in row_names if name not in names)
+    op.bulk_insert(genre, [{'name': name} for name in names])
+    genre_ids = dict((row.name, row.id) for row in bind.execute(sa.select([genre.c.id, genre.c.name])))
+
+    for table, key, link_table in (('Venue', 'venue_id', 'venue_genres'),
+                                   ('Artist', 'artist_id', 'artist_genres')):
+        links = sa.table(link_table, sa.column(key, sa.Integer), sa.column('genre_id', sa.Integer))
+        entity = sa.table(table, sa.column('id', sa.Integer), sa.column('genres', sa.String))
+        rows = parsed[table]
+        if not rows:
+            continue
+        link_rows = [{key: entity_id, 'genre_id': genre_ids[name]}
+                     for entity_id, row_names in rows for name in row_names]
+        if link_rows:
+            op.bulk_insert(links, link_rows)
+        bind.execute(entity.update()
+                     .where(entity.c.id == sa.bindparam('_id'))
+                     .values(genres=sa.bindparam('_genres')),
+                     [{'_id': entity_id, '_genres': GENRE_SEPARATOR.join(row_names)}
+                      for entity_id, row_names in rows])
+
+
+def downgrade():
+    for table in ('Venue', 'Artist'):
+        entity = sa.table(table, sa.column('genres', sa.String))
+        op.execute(entity.update().values(genres=sa.func.replace(entity.c.genres, GENRE_SEPARATOR, ' ')))
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.alter_column('genres', type_=sa.String(length=120),
+                                  existing_type=sa.String(length=500), existing_nullable=True)
+    op.drop_index('ix_artist_genres_genre_id_artist_id', table_name='artist_genres')
+    op.drop_table('artist_genres')
+    op.drop_index('ix_venue_genres_genre_id_venue_id', table_name='venue_genres')
+    op.drop_table('venue_genres')
+    op.drop_table('Genre')
@@ -0,0 +1,60 @@
+"""add show counters to Venue and Artist
+
+Revision ID: 28fd88fd516b
+Revises: 3dad26c5e5cd
+Create Date: 2026-10-18 09:12:41.518220
+
+"""
+from datetime import datetime
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '28fd88fd516b'
+down_revision = '3dad26c5e5cd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    for table in ('Venue', 'Artist'):
+        op.add_column(table, sa.Column('upcoming_shows_count', sa.Integer(), server_default='0', nullable=False))
+        op.add_column(table, sa.Column('past_shows_count', sa.Integer(), server_default='0', nullable=False))
+    op.create_table('ShowCounter',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('rolled_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+    # backfill the counters from the existing shows
+    now = datetime.now()
+    show = sa.table('Show',
+                    sa.column('venue_id', sa.Integer),
+                    sa.column('artist_id', sa.Integer),
+                    sa.column('show_time', sa.DateTime))
+    for table, foreign_key in (('Venue', show.c.venue_id), ('Artist', show.c.artist_id)):
+        entity = sa.table(table,
+                          sa.column('id', sa.Integer),
+                          sa.column('upcoming_shows_count', sa.Integer),
+                          sa.column('past_shows_count', sa.Integer))
+
+        def count(condition):
+            return sa.select([sa.func.count()]) \
+                .where(sa.and_(foreign_key == entity.c.id, condition)) \
+                .as_scalar()
+
+        op.execute(entity.update().values(
+            upcoming_shows_count=count(show.c.show_time >= now),
+            past_shows_count=count(show.c.show_time < now)))
+    op.bulk_insert(sa.table('ShowCounter',
+                            sa.column('id', sa.Integer),
+                            sa.column('rolled_at', sa.DateTime)),
+                   [{'id': 1, 'rolled_at': now}])
+
+
+def downgrade():
+    op.drop_table('ShowCounter')
+    for table in ('Artist', 'Venue'):
+        op.drop_column(table, 'past_shows_count')
+        op.drop_column(table, 'upcoming_shows_count')
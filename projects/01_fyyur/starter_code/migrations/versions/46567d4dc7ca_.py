@@ -0,0 +1,24 @@
+"""index Show on (show_time, id) for keyset pagination
+
+Revision ID: 46567d4dc7ca
+Revises: 010895d640bd
+Create Date: 2026-10-18 10:48:55.120714
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '46567d4dc7ca'
+down_revision = '010895d640bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_show_time_id', 'Show', ['show_time', 'id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_show_time_id', table_name='Show')
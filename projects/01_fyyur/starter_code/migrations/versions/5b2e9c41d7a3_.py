@@ -0,0 +1,26 @@
+"""index Show on (venue_id, show_time) and (artist_id, show_time)
+
+Revision ID: 5b2e9c41d7a3
+Revises: f53176a57243
+Create Date: 2026-10-18 16:21:40.518093
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5b2e9c41d7a3'
+down_revision = 'f53176a57243'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_index('ix_show_venue_id_show_time', 'Show', ['venue_id', 'show_time'], unique=False)
+    op.create_index('ix_show_artist_id_show_time', 'Show', ['artist_id', 'show_time'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_show_artist_id_show_time', table_name='Show')
+    op.drop_index('ix_show_venue_id_show_time', table_name='Show')
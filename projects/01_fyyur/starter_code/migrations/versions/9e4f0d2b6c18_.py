@@ -0,0 +1,109 @@
+"""optionally range partition Show by month (postgres)
+
+Revision ID: 9e4f0d2b6c18
+Revises: 5b2e9c41d7a3
+Create Date: 2026-10-18 16:48:12.774310
+
+"""
+import os
+from datetime import date
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e4f0d2b6c18'
+down_revision = '5b2e9c41d7a3'
+branch_labels = None
+depends_on = None
+
+# Show is only partitioned when upgrading with FYYUR_PARTITION_SHOWS=1 on
+# postgres (11 or later), see partitions.py. Every other database keeps
+# the plain table and this revision does nothing.
+PARTITION_ENV = 'FYYUR_PARTITION_SHOWS'
+
+# months created past the current one, later ones with
+# "flask create-show-partitions"
+MONTHS_AHEAD = 12
+
+INDEXES = [
+    ('ix_show_show_time_id', 'show_time, id'),
+    ('ix_show_venue_id_show_time', 'venue_id, show_time'),
+    ('ix_show_artist_id_show_time', 'artist_id, show_time'),
+]
+
+
+def _is_partitioned(bind):
+    return bind.execute(sa.text(
+        "SELECT relkind FROM pg_class WHERE oid = to_regclass('\"Show\"')")).scalar() == 'p'
+
+
+def _add_months(day, months):
+    months += day.year * 12 + day.month - 1
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def _rebuild(partitioned):
+    '''
+    Recreate Show as a partitioned or a plain table and copy the shows
+    over, keeping the ids, their sequence, the foreign keys and indexes.
+    '''
+    bind = op.get_bind()
+    first = bind.execute(sa.text('SELECT min(show_time) FROM "Show"')).scalar()
+
+    op.execute('ALTER TABLE "Show" RENAME TO "Show_old"')
+    for name, columns in INDEXES:
+        op.execute('DROP INDEX IF EXISTS {}'.format(name))
+    op.execute('ALTER TABLE "Show_old" DROP CONSTRAINT IF EXISTS "Show_pkey"')
+    op.execute('ALTER TABLE "Show_old" DROP CONSTRAINT IF EXISTS "Show_id_show_time_key"')
+
+    op.execute('''
+        CREATE TABLE "Show" (
+            id integer NOT NULL DEFAULT nextval('"Show_id_seq"'::regclass),
+            artist_id integer NOT NULL,
+            venue_id integer NOT NULL,
+            show_time timestamp without time zone
+        ){}'''.format(' PARTITION BY RANGE (show_time)' if partitioned else ''))
+    if partitioned:
+        this_month = date.today().replace(day=1)
+        month = min(first.date().replace(day=1), this_month) if first else this_month
+        while month <= _add_months(this_month, MONTHS_AHEAD):
+            op.execute('''CREATE TABLE "Show_{0:%Y%m}" PARTITION OF "Show"
+                          FOR VALUES FROM ('{0:%Y-%m-%d}') TO ('{1:%Y-%m-%d}')'''
+                       .format(month, _add_months(month, 1)))
+            month = _add_months(month, 1)
+        # shows without a time, or in a month not created yet
+        op.execute('CREATE TABLE "Show_default" PARTITION OF "Show" DEFAULT')
+
+    op.execute('INSERT INTO "Show" (id, artist_id, venue_id, show_time) '
+               'SELECT id, artist_id, venue_id, show_time FROM "Show_old"')
+    op.execute('ALTER SEQUENCE "Show_id_seq" OWNED BY "Show".id')
+    op.execute('DROP TABLE "Show_old"')
+
+    # constraints of a partitioned table have to hold the partition key,
+    # and show_time being nullable rules out a (id, show_time) primary key
+    if partitioned:
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_id_show_time_key" UNIQUE (id, show_time)')
+    else:
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_pkey" PRIMARY KEY (id)')
+    for column, referred in (('venue_id', 'Venue'), ('artist_id', 'Artist')):
+        op.execute('ALTER TABLE "Show" ADD CONSTRAINT "Show_{0}_fkey" FOREIGN KEY ({0}) '
+                   'REFERENCES "{1}" (id) ON DELETE CASCADE'.format(column, referred))
+    for name, columns in INDEXES:
+        op.execute('CREATE INDEX {} ON "Show" ({})'.format(name, columns))
+
+
+def upgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql' or os.environ.get(PARTITION_ENV) != '1':
+        return
+    if not _is_partitioned(bind):
+        _rebuild(partitioned=True)
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.dialect.name != 'postgresql':
+        return
+    if _is_partitioned(bind):
+        _rebuild(partitioned=False)
@@ -0,0 +1,57 @@
+"""cascade venue / artist deletes, add ShowArchive
+
+Revision ID: f53176a57243
+Revises: 07a03754c87c
+Create Date: 2026-10-18 14:02:51.318305
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f53176a57243'
+down_revision = '07a03754c87c'
+branch_labels = None
+depends_on = None
+
+# (table, column, referred table), constraint names are postgres' defaults
+FOREIGN_KEYS = [
+    ('Show', 'venue_id', 'Venue'),
+    ('Show', 'artist_id', 'Artist'),
+    ('venue_artists', 'venue_id', 'Venue'),
+    ('venue_artists', 'artist_id', 'Artist'),
+    ('venue_genres', 'venue_id', 'Venue'),
+    ('artist_genres', 'artist_id', 'Artist'),
+]
+
+
+def _replace_foreign_keys(ondelete):
+    for table, column, referred in FOREIGN_KEYS:
+        name = '{}_{}_fkey'.format(table, column)
+        with op.batch_alter_table(table) as batch_op:
+            batch_op.drop_constraint(name, type_='foreignkey')
+            batch_op.create_foreign_key(name, referred, [column], ['id'], ondelete=ondelete)
+
+
+def upgrade():
+    _replace_foreign_keys('CASCADE')
+    op.create_table('ShowArchive',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('artist_id', sa.Integer(), nullable=False),
+    sa.Column('artist_name', sa.String(), nullable=True),
+    sa.Column('venue_id', sa.Integer(), nullable=False),
+    sa.Column('venue_name', sa.String(), nullable=True),
+    sa.Column('show_time', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index(op.f('ix_ShowArchive_artist_id'), 'ShowArchive', ['artist_id'], unique=False)
+    op.create_index(op.f('ix_ShowArchive_venue_id'), 'ShowArchive', ['venue_id'], unique=False)
+
+
+def downgrade():
+    op.drop_index(op.f('ix_ShowArchive_venue_id'), table_name='ShowArchive')
+    op.drop_index(op.f('ix_ShowArchive_artist_id'), table_name='ShowArchive')
+    op.drop_table('ShowArchive')
+    _replace_foreign_keys(None)
@@ -1,7 +1,10 @@
-from flask_sqlalchemy import SQLAlchemy
 from flask_migrate import Migrate
 from flask import Flask
 from flask_moment import Moment
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+import pool
+import replicas
 
 # ----------------------------------------------------------------------------#
 # Models.
@@ -9,16 +12,52 @@ from flask_moment import Moment
 app = Flask(__name__)
 moment = Moment(app)
 app.config.from_object('config')
-db = SQLAlchemy(app)
+db = pool.PooledSQLAlchemy(app)
+pool.init_app(app, db)
+replicas.init_app(app)
 migrate = Migrate(app, db)
 
 
+@event.listens_for(Engine, 'connect')
+def enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    # sqlite ignores ON DELETE CASCADE unless asked per connection
+    if type(dbapi_connection).__module__ == 'sqlite3':
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA foreign_keys=ON')
+        cursor.close()
+
+
 # -------------------------------------------------
 # @DONE implement relation between Venue and Artist
 # ------------------------------------------------
 venue_artists = db.Table('venue_artists',
-                db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id')),
-                db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id')))
+                db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE')),
+                db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE')))
+
+
+# -------------------------------------------------
+# Genres of venues and artists, one row per pair.
+# The (genre_id, ...) indexes serve browse by genre
+# -------------------------------------------------
+venue_genres = db.Table('venue_genres',
+                db.Column('venue_id', db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), primary_key=True),
+                db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+                db.Index('ix_venue_genres_genre_id_venue_id', 'genre_id', 'venue_id'))
+
+artist_genres = db.Table('artist_genres',
+                db.Column('artist_id', db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), primary_key=True),
+                db.Column('genre_id', db.Integer, db.ForeignKey('Genre.id'), primary_key=True),
+                db.Index('ix_artist_genres_genre_id_artist_id', 'genre_id', 'artist_id'))
+
+
+# -----------------
+# GENRE MODEL
+# -----------------
+class Genre(db.Model):
+    __tablename__ = 'Genre'
+
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(120), nullable=False, unique=True)
 
 
 # -----------------
@@ -39,8 +78,17 @@ class Venue(db.Model):
     # --------------------------------------------
     # @DONE implement add columns artist model
     # -------------------------------------------
-    genres = db.Column(db.String(120))
-    venue_shows = db.relationship('Show', backref='venue_shows', lazy=True)
+    # genre names joined by ', ', a read copy of `genres` kept by
+    # genres.set_genres() for the detail page and the search index
+    genres_text = db.Column('genres', db.String(500))
+    genres = db.relationship('Genre', secondary=venue_genres, order_by='Genre.name')
+    venue_shows = db.relationship('Show', backref='venue_shows', lazy=True, passive_deletes=True)
+
+    # ---------------------------------------------------
+    # show counters, maintained by counters.py
+    # ---------------------------------------------------
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 
 # ----------------------
@@ -54,20 +102,63 @@ class Artist(db.Model):
     city = db.Column(db.String(120))
     state = db.Column(db.String(120))
     phone = db.Column(db.String(120))
-    genres = db.Column(db.String(120))
+    # genre names joined by ', ', see Venue.genres_text
+    genres_text = db.Column('genres', db.String(500))
+    genres = db.relationship('Genre', secondary=artist_genres, order_by='Genre.name')
     image_link = db.Column(db.String(500))
     facebook_link = db.Column(db.String(120))    
     # --------------------------------------------
     # @DONE implement add columns artist model
     # -------------------------------------------
-    artist_shows = db.relationship('Show', backref='artist_shows', lazy=True)
+    artist_shows = db.relationship('Show', backref='artist_shows', lazy=True, passive_deletes=True)
+
+    # ---------------------------------------------------
+    # show counters, maintained by counters.py
+    # ---------------------------------------------------
+    upcoming_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    past_shows_count = db.Column(db.Integer, nullable=False, default=0, server_default='0')
 
 # ----------------------------
 # @DONE implement Show Model
 # ----------------------------
 class Show(db.Model):
     __tablename__ = "Show"
+    __table_args__ = (
+        # keyset pagination of the /shows page
+        db.Index('ix_show_show_time_id', 'show_time', 'id'),
+        # past / upcoming shows of one venue or artist
+        db.Index('ix_show_venue_id_show_time', 'venue_id', 'show_time'),
+        db.Index('ix_show_artist_id_show_time', 'artist_id', 'show_time'),
+    )
+    id = db.Column(db.Integer, primary_key=True)
+    # deleting a venue or an artist deletes its shows in the database
+    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id', ondelete='CASCADE'), nullable=False)
+    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id', ondelete='CASCADE'), nullable=False)
+    show_time = db.Column(db.DateTime, nullable=True)
+
+
+# ------------------------------------------------------
+# Shows of deleted venues / artists in archive mode,
+# see archive.py. Names are copied as the rows they
+# pointed to are gone
+# ------------------------------------------------------
+class ShowArchive(db.Model):
+    __tablename__ = "ShowArchive"
+    # the id the show had in Show
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    artist_id = db.Column(db.Integer, nullable=False, index=True)
+    artist_name = db.Column(db.String)
+    venue_id = db.Column(db.Integer, nullable=False, index=True)
+    venue_name = db.Column(db.String)
+    show_time = db.Column(db.DateTime, nullable=True)
+    archived_at = db.Column(db.DateTime, nullable=False)
+
+
+# ------------------------------------------------------
+# Single row holding the time show counters are rolled
+# over to: shows before it are past, the rest upcoming
+# ------------------------------------------------------
+class ShowCounter(db.Model):
+    __tablename__ = "ShowCounter"
     id = db.Column(db.Integer, primary_key=True)
-    artist_id = db.Column(db.Integer, db.ForeignKey('Artist.id'), nullable=False)
-    venue_id = db.Column(db.Integer, db.ForeignKey('Venue.id'), nullable=False)
-    show_time = db.Column(db.DateTime, nullable=True)
\ No newline at end of file
+    rolled_at = db.Column(db.DateTime, nullable=False)
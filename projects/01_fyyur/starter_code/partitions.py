@@ -0,0 +1,76 @@
+from datetime import date
+from sqlalchemy import text
+
+
+# ----------------------------------------------------------------------------#
+# Monthly Show partitions (postgres).
+#
+# Upgrading with FYYUR_PARTITION_SHOWS=1 range partitions Show on
+# show_time (migration 9e4f0d2b6c18): one Show_YYYYMM table per month
+# and Show_default for shows without a time or in a month that has no
+# partition yet. Queries filtering on show_time, like the past/upcoming
+# split of the detail pages and the /shows date range, only scan the
+# months they need.
+#
+# Months have to exist before their shows arrive, run
+#
+#   $ flask create-show-partitions --months 12
+#
+# from cron. Shows already sitting in Show_default for a new month are
+# moved into it.
+# ----------------------------------------------------------------------------#
+
+PARTITION_MONTHS_AHEAD = 12
+
+IS_PARTITIONED = text("SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('\"Show\"')")
+
+
+def add_months(day, months):
+    months += day.year * 12 + day.month - 1
+    return date(months // 12, months % 12 + 1, 1)
+
+
+def partition_name(month):
+    return 'Show_{:%Y%m}'.format(month)
+
+
+def is_partitioned(connection):
+    if connection.dialect.name != 'postgresql':
+        return False
+    return bool(connection.execute(IS_PARTITIONED).scalar())
+
+
+def create_partitions(connection, months=PARTITION_MONTHS_AHEAD, start=None):
+    '''
+    Create the partitions of the month of `start` (today) and the
+    `months` after it that do not exist yet, return their names.
+    '''
+    if not is_partitioned(connection):
+        return []
+    month = (start or date.today()).replace(day=1)
+    created = []
+    with connection.begin():
+        for _ in range(months + 1):
+            name = partition_name(month)
+            end = add_months(month, 1)
+            if connection.execute(text('SELECT to_regclass(:name)'), name='"{}"'.format(name)).scalar() is None:
+                _create_partition(connection, name, month, end)
+                created.append(name)
+            month = end
+    return created
+
+
+def _create_partition(connection, name, start, end):
+    bounds = {'start': start, 'end': end}
+    in_month = 'show_time >= :start AND show_time < :end'
+    stranded = connection.execute(text(
+        'SELECT 1 FROM "Show_default" WHERE {} LIMIT 1'.format(in_month)), **bounds).scalar()
+    if stranded:
+        # the default partition may not keep rows of an attached month
+        connection.execute('ALTER TABLE "Show" DETACH PARTITION "Show_default"')
+    connection.execute('''CREATE TABLE "{}" PARTITION OF "Show"
+                          FOR VALUES FROM ('{:%Y-%m-%d}') TO ('{:%Y-%m-%d}')'''.format(name, start, end))
+    if stranded:
+        connection.execute(text('INSERT INTO "Show" SELECT * FROM "Show_default" WHERE ' + in_month), **bounds)
+        connection.execute(text('DELETE FROM "Show_default" WHERE ' + in_month), **bounds)
+        connection.execute('ALTER TABLE "Show" ATTACH PARTITION "Show_default" DEFAULT')
@@ -0,0 +1,179 @@
+import time
+import threading
+from collections import defaultdict
+from flask import (request, has_request_context)
+from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.exc import TimeoutError
+from sqlalchemy.orm import sessionmaker
+from sqlalchemy.pool import QueuePool
+from replicas import RoutingSession
+
+
+# ----------------------------------------------------------------------------#
+# Connection pool.
+#
+# Pool sizing comes from SQLALCHEMY_ENGINE_OPTIONS (see config.py, set
+# through FYYUR_DB_* variables). Every request ends with the session
+# removed, which returns its connection to the pool whatever the view
+# did, and any connection the request still holds after that is counted
+# as a leak. /db/metrics reports checkout waits, connections in use and
+# leaks: size workers so that
+#   workers * (pool_size + max_overflow) < postgres max_connections
+# ----------------------------------------------------------------------------#
+
+# options sqlite's NullPool / SingletonThreadPool do not take
+QUEUE_POOL_OPTIONS = ('pool_size', 'max_overflow', 'pool_timeout')
+
+
+class PoolTelemetry(object):
+    def __init__(self, leak_seconds=30):
+        self.leak_seconds = leak_seconds
+        self.lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self.lock:
+            # id(connection record) -> [checked out at, thread, endpoint,
+            #                           checked out by a request, counted as leak]
+            self.checked_out = {}
+            self.peak_checked_out = 0
+            self.connects = 0
+            self.checkouts = 0
+            self.waits = 0
+            self.wait_total = 0.0
+            self.wait_max = 0.0
+            self.timeouts = 0
+            self.leaks = 0
+            self.leaks_by_endpoint = defaultdict(int)
+
+    def attach(self, engine):
+        event.listen(engine, 'connect', self._connect)
+        event.listen(engine, 'checkout', self._checkout)
+        event.listen(engine, 'checkin', self._checkin)
+
+    def _connect(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.connects += 1
+
+    def _checkout(self, dbapi_connection, connection_record, connection_proxy):
+        in_request = has_request_context()
+        endpoint = request.endpoint if in_request else None
+        with self.lock:
+            self.checkouts += 1
+            self.checked_out[id(connection_record)] = [
+                time.monotonic(), threading.get_ident(), endpoint, in_request, False]
+            self.peak_checked_out = max(self.peak_checked_out, len(self.checked_out))
+
+    def _checkin(self, dbapi_connection, connection_record):
+        with self.lock:
+            self.checked_out.pop(id(connection_record), None)
+
+    def record_wait(self, seconds):
+        with self.lock:
+            self.waits += 1
+            self.wait_total += seconds
+            self.wait_max = max(self.wait_max, seconds)
+
+    def record_timeout(self):
+        with self.lock:
+            self.timeouts += 1
+
+    def request_finished(self):
+        '''
+        Count the connections a request of this thread checked out and
+        still holds once the request session is gone, each one once.
+        '''
+        thread = threading.get_ident()
+        with self.lock:
+            for entry in self.checked_out.values():
+                if entry[1] == thread and entry[3] and not entry[4]:
+                    entry[4] = True
+                    self.leaks += 1
+                    self.leaks_by_endpoint[entry[2]] += 1
+
+    def stats(self, engine):
+        pool = engine.pool
+        now = time.monotonic()
+        with self.lock:
+            held = sorted(((now - entry[0], entry[2]) for entry in self.checked_out.values()),
+                          reverse=True)
+            stats = {
+                'pool': type(pool).__name__,
+                'in_use': len(self.checked_out),
+                'peak_in_use': self.peak_checked_out,
+                'connects': self.connects,
+                'checkouts': self.checkouts,
+                'checkout_wait': {
+                    'count': self.waits,
+                    'avg_ms': self.wait_total / self.waits * 1000 if self.waits else 0.0,
+                    'max_ms': self.wait_max * 1000,
+                    'total_ms': self.wait_total * 1000,
+                },
+                'timeouts': self.timeouts,
+                'leaks': {
+                    'count': self.leaks,
+                    'endpoints': dict((str(endpoint), count) for endpoint, count
+                                      in self.leaks_by_endpoint.items()),
+                },
+                'held_over_{}s'.format(self.leak_seconds): [
+                    {'endpoint': endpoint, 'seconds': round(seconds, 3)}
+                    for seconds, endpoint in held if seconds > self.leak_seconds],
+            }
+        if isinstance(pool, QueuePool):
+            stats.update({
+                'size': pool.size(),
+                'max_overflow': pool._max_overflow,
+                'max_connections': pool.size() + max(pool._max_overflow, 0),
+                'idle': pool.checkedin(),
+                'overflow': pool.overflow(),
+            })
+        return stats
+
+
+telemetry = PoolTelemetry()
+
+
+class TimedQueuePool(QueuePool):
+    '''
+    QueuePool reporting how long each checkout waited for a connection,
+    opening a new one included.
+    '''
+    def _do_get(self):
+        start = time.perf_counter()
+        try:
+            return super(TimedQueuePool, self)._do_get()
+        except TimeoutError:
+            telemetry.record_timeout()
+            raise
+        finally:
+            telemetry.record_wait(time.perf_counter() - start)
+
+
+class PooledSQLAlchemy(SQLAlchemy):
+    def create_engine(self, sa_url, engine_opts):
+        options = dict(engine_opts)
+        if sa_url.drivername.startswith('sqlite'):
+            for key in QUEUE_POOL_OPTIONS:
+                options.pop(key, None)
+        else:
+            options.setdefault('poolclass', TimedQueuePool)
+        engine = super(PooledSQLAlchemy, self).create_engine(sa_url, options)
+        telemetry.attach(engine)
+        return engine
+
+    def create_session(self, options):
+        # read-only views may be routed to a replica, see replicas.py
+        return sessionmaker(class_=RoutingSession, db=self, **options)
+
+
+def init_app(app, db):
+    telemetry.leak_seconds = app.config.get('DB_POOL_LEAK_SECONDS', 30)
+
+    # teardown functions run last registered first, so this runs before
+    # Flask-SQLAlchemy's own and can check for leftovers afterwards
+    @app.teardown_appcontext
+    def release_connection(response_or_exc):
+        db.session.remove()
+        telemetry.request_finished()
+        return response_or_exc
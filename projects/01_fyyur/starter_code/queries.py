@@ -0,0 +1,334 @@
+import threading
+from datetime import datetime
+from itertools import groupby
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import (func, tuple_, true, union_all)
+from sqlalchemy.pool import QueuePool
+from models import (db, Venue, Artist, Show, venue_genres)
+from genres import (genre_filter, split_genres)
+
+SHOWS_PER_PAGE = 30
+
+# past shows listed on a venue / artist page, the count covers them all
+DETAIL_PAST_SHOWS_LIMIT = 20
+
+VENUE_DETAIL_FIELDS = ('id', 'name', 'genres_text', 'address', 'city', 'state', 'phone',
+                       'facebook_link', 'image_link',
+                       'upcoming_shows_count', 'past_shows_count')
+ARTIST_DETAIL_FIELDS = ('id', 'name', 'genres_text', 'city', 'state', 'phone',
+                        'facebook_link', 'image_link',
+                        'upcoming_shows_count', 'past_shows_count')
+
+CURSOR_TIME_FORMAT = '%Y%m%d%H%M%S%f'
+
+# rows fetched from a server side cursor at a time by the iter_* loaders
+STREAM_CHUNK_ROWS = 500
+
+# threads running the statements of concurrent detail pages, each holds
+# a pool connection while its statement runs. Never more than the
+# pool_size of the engine, its overflow is left to the request sessions
+DETAIL_QUERY_WORKERS = 8
+
+
+# ----------------------------------------------------------------------------#
+# Read queries shared by the controllers.
+# ----------------------------------------------------------------------------#
+
+# -------------------------------------------------
+# Venues grouped by area
+# -------------------------------------------------
+def venue_areas(genre=None):
+    '''
+    Build the city/state -> venues tree for the /venues page, limited
+    to the venues of `genre` when given.
+    '''
+    return [dict(area, venues=list(area['venues'])) for area in iter_venue_areas(genre)]
+
+
+def iter_venue_areas(genre=None):
+    '''
+    The city/state -> venues tree of venue_areas() as it comes off a
+    server side cursor: areas are yielded one at a time and their venues
+    are an iterator too, valid until the next area is taken.
+
+    Every venue comes back from one query ordered by area, with its
+    upcoming show count read from the counter column, so the tree is
+    built in a single pass instead of one query per area. The query runs
+    when this is called, the rows are fetched while iterating.
+    '''
+    query = db.session.query(Venue.city,
+                             Venue.state,
+                             Venue.id,
+                             Venue.name,
+                             Venue.upcoming_shows_count.label('num_upcoming_shows'))
+    if genre:
+        query = genre_filter(query, Venue, venue_genres, genre)
+    rows = iter(query.order_by(Venue.state, Venue.city, Venue.name, Venue.id)
+                .execution_options(stream_results=True)
+                .yield_per(STREAM_CHUNK_ROWS))
+    return _areas(rows)
+
+
+def _areas(rows):
+    for (city, state), venues in groupby(rows, key=lambda row: (row.city, row.state)):
+        yield {
+          'city': city,
+          'state': state,
+          'venues': ({
+            'id': venue.id,
+            'name': venue.name,
+            'num_upcoming_shows': venue.num_upcoming_shows,
+          } for venue in venues)
+        }
+
+
+# -------------------------------------------------
+# Shows listing, keyset paginated on (show_time, id)
+# -------------------------------------------------
+def encode_cursor(show_time, show_id):
+    return '{}_{}'.format(show_time.strftime(CURSOR_TIME_FORMAT), show_id)
+
+
+def decode_cursor(cursor):
+    '''
+    Split a cursor back into (show_time, show_id), ValueError when malformed.
+    '''
+    show_time, show_id = cursor.split('_')
+    return datetime.strptime(show_time, CURSOR_TIME_FORMAT), int(show_id)
+
+
+class ShowPage(object):
+    '''
+    The shows of one /shows page, fetched while they are iterated.
+    next_cursor is set once the iteration got past the page.
+    '''
+    def __init__(self, rows, limit):
+        self.rows = rows
+        self.limit = limit
+        self.next_cursor = None
+
+    def __iter__(self):
+        last = None
+        for count, row in enumerate(self.rows):
+            if count == self.limit:
+                self.next_cursor = encode_cursor(last.show_time, last.id)
+                break
+            last = row
+            yield row
+
+
+def show_page(after=None, start=None, end=None, venue_id=None, artist_id=None,
+              limit=SHOWS_PER_PAGE):
+    '''
+    Return (shows, cursor of the next page or None) for the /shows page.
+    '''
+    page = iter_show_page(after, start, end, venue_id, artist_id, limit)
+    rows = list(page)
+    return rows, page.next_cursor
+
+
+def iter_show_page(after=None, start=None, end=None, venue_id=None, artist_id=None,
+                   limit=SHOWS_PER_PAGE):
+    '''
+    The /shows page as a ShowPage over a server side cursor.
+
+    Pages seek past the (show_time, id) of the last show of the previous
+    page along ix_show_show_time_id, so deep pages cost the same as the
+    first one.
+    '''
+    query = db.session.query(Show.id,
+                             Show.show_time,
+                             Venue.id.label('venue_id'),
+                             Venue.name.label('venue_name'),
+                             Artist.id.label('artist_id'),
+                             Artist.name.label('artist_name'),
+                             Artist.image_link.label('artist_image_link')) \
+        .join(Venue, Venue.id == Show.venue_id) \
+        .join(Artist, Artist.id == Show.artist_id) \
+        .filter(Show.show_time.isnot(None))
+    if start is not None:
+        query = query.filter(Show.show_time >= start)
+    if end is not None:
+        query = query.filter(Show.show_time < end)
+    if venue_id is not None:
+        query = query.filter(Show.venue_id == venue_id)
+    if artist_id is not None:
+        query = query.filter(Show.artist_id == artist_id)
+    if after:
+        query = query.filter(tuple_(Show.show_time, Show.id) > tuple_(*decode_cursor(after)))
+
+    # one extra row tells whether there is a next page
+    rows = iter(query.order_by(Show.show_time, Show.id)
+                .limit(limit + 1)
+                .execution_options(stream_results=True)
+                .yield_per(STREAM_CHUNK_ROWS))
+    return ShowPage(rows, limit)
+
+
+# -------------------------------------------------
+# Venue / Artist detail pages
+# -------------------------------------------------
+def venue_detail(venue_id, now=None, past_limit=None, concurrent=False):
+    '''
+    The venue with its past and upcoming shows, None when missing.
+    '''
+    load = _concurrent_detail if concurrent else _detail
+    return load(Venue, VENUE_DETAIL_FIELDS, Show.venue_id,
+                Artist, Show.artist_id, 'artist',
+                venue_id, now, past_limit)
+
+
+def artist_detail(artist_id, now=None, past_limit=None, concurrent=False):
+    '''
+    The artist with its past and upcoming shows, None when missing.
+    '''
+    load = _concurrent_detail if concurrent else _detail
+    return load(Artist, ARTIST_DETAIL_FIELDS, Show.artist_id,
+                Venue, Show.venue_id, 'venue',
+                artist_id, now, past_limit)
+
+
+def _detail(model, fields, show_key, other, other_key, prefix, entity_id, now, past_limit):
+    '''
+    Load an entity and its shows with one query: the entity columns are
+    outer joined to its shows (with the other side's name and image), so
+    an entity without shows still comes back as a single row.
+
+    Shows are split around one `now`: before it is past, from it on is
+    upcoming. The shows are a UNION ALL of the upcoming shows and, with
+    `past_limit`, the most recent past shows (ORDER BY show_time DESC
+    LIMIT): each half is a range scan of the (venue_id|artist_id,
+    show_time) index of Show, the older shows are never read.
+    '''
+    now = now or datetime.now()
+    shows = db.session.query(Show.show_time,
+                             other.id.label('other_id'),
+                             other.name.label('other_name'),
+                             other.image_link.label('other_image_link')) \
+        .join(other, other.id == other_key) \
+        .filter(show_key == entity_id)
+    upcoming = shows.filter(Show.show_time >= now).statement
+    past = shows.filter(Show.show_time < now)
+    if past_limit is not None:
+        past = past.order_by(Show.show_time.desc()).limit(past_limit)
+    # a LIMIT inside a compound select needs its own subquery on SQLite
+    past = past.subquery().select()
+    shows = union_all(upcoming, past).alias('shows')
+
+    rows = db.session.query(*[getattr(model, field) for field in fields],
+                            shows.c.show_time,
+                            shows.c.other_id,
+                            shows.c.other_name,
+                            shows.c.other_image_link) \
+        .outerjoin(shows, true()) \
+        .filter(model.id == entity_id) \
+        .order_by(shows.c.show_time) \
+        .all()
+    if not rows:
+        return None
+
+    detail = {field: getattr(rows[0], field) for field in fields}
+    detail['genres'] = split_genres(detail.pop('genres_text'))
+    past_shows = []
+    upcoming_shows = []
+    for row in rows:
+        if row.show_time is None:
+            continue
+        if row.show_time < now:
+            past_shows.append(_show(row, prefix))
+        else:
+            upcoming_shows.append(_show(row, prefix))
+    # most recent past show first
+    past_shows.reverse()
+    detail['past_shows'] = past_shows
+    detail['upcoming_shows'] = upcoming_shows
+    return detail
+
+
+def _show(row, prefix):
+    return {
+      prefix + '_id': row.other_id,
+      prefix + '_name': row.other_name,
+      prefix + '_image_link': row.other_image_link,
+      'start_time': row.show_time
+    }
+
+
+_executor = []
+_executor_lock = threading.Lock()
+
+
+def _detail_executor(bind):
+    if not _executor:
+        with _executor_lock:
+            if not _executor:
+                workers = DETAIL_QUERY_WORKERS
+                if isinstance(bind.pool, QueuePool):
+                    workers = max(1, min(workers, bind.pool.size()))
+                _executor.append(ThreadPoolExecutor(workers, thread_name_prefix='detail-query'))
+    return _executor[0]
+
+
+def _fetch(bind, statement):
+    with bind.connect() as connection:
+        return connection.execute(statement).fetchall()
+
+
+def _concurrent_detail(model, fields, show_key, other, other_key, prefix, entity_id, now, past_limit):
+    '''
+    Load an entity and its shows with three statements running at the
+    same time on their own connections: the entity, its upcoming shows
+    and its past shows, most recent first. Each one is an index range
+    scan ((venue_id|artist_id, show_time) on Show), so the page waits
+    about as long as the slowest of them instead of their sum.
+
+    The statements of every page share one executor of at most
+    DETAIL_QUERY_WORKERS threads and never more than the engine's
+    pool_size, so concurrent pages queue for a thread there instead of
+    draining the pool. Statements go to the bind the session would use,
+    a replica for @read_only views. An in-memory SQLite database exists once per
+    connection, there they run one after the other on the session.
+    '''
+    now = now or datetime.now()
+    entity = db.session.query(*[getattr(model, field).label(field) for field in fields]) \
+        .filter(model.id == entity_id)
+    shows = db.session.query(Show.show_time,
+                             other.id.label('other_id'),
+                             other.name.label('other_name'),
+                             other.image_link.label('other_image_link')) \
+        .join(other, other.id == other_key) \
+        .filter(show_key == entity_id)
+    upcoming = shows.filter(Show.show_time >= now).order_by(Show.show_time)
+    past = shows.filter(Show.show_time < now).order_by(Show.show_time.desc())
+    if past_limit is not None:
+        past = past.limit(past_limit)
+    statements = [query.statement for query in (entity, upcoming, past)]
+
+    bind = db.session.get_bind()
+    if bind.dialect.name == 'sqlite' and bind.url.database in (None, '', ':memory:'):
+        results = [db.session.execute(statement).fetchall() for statement in statements]
+    else:
+        futures = [_detail_executor(bind).submit(_fetch, bind, statement) for statement in statements]
+        results = [future.result() for future in futures]
+    entity_rows, upcoming_rows, past_rows = results
+    if not entity_rows:
+        return None
+
+    detail = dict(entity_rows[0].items())
+    detail['genres'] = split_genres(detail.pop('genres_text'))
+    detail['past_shows'] = [_show(row, prefix) for row in past_rows]
+    detail['upcoming_shows'] = [_show(row, prefix) for row in upcoming_rows]
+    return detail
+
+
+# -------------------------------------------------
+# Who played where, for cache invalidation
+# -------------------------------------------------
+def venue_artist_ids(venue_id):
+    return [artist_id for (artist_id,) in
+            db.session.query(Show.artist_id).filter(Show.venue_id == venue_id).distinct()]
+
+
+def artist_venue_ids(artist_id):
+    return [venue_id for (venue_id,) in
+            db.session.query(Show.venue_id).filter(Show.artist_id == artist_id).distinct()]
@@ -0,0 +1,195 @@
+import time
+import threading
+from functools import wraps
+from itertools import count
+from flask import (g, session, current_app, has_app_context, has_request_context)
+from flask_sqlalchemy import SignallingSession
+from sqlalchemy import (event, text)
+from sqlalchemy.engine import Engine
+from sqlalchemy.engine.url import make_url
+
+
+# ----------------------------------------------------------------------------#
+# Read replicas.
+#
+# Views decorated with @read_only run their queries on one of the
+# SQLALCHEMY_REPLICA_URIS engines, everything else stays on the primary.
+# A replica is only used when it is known to be caught up:
+#   - its lag is probed at most every REPLICA_LAG_CHECK_INTERVAL seconds,
+#     a replica behind by more than REPLICA_MAX_LAG or failing the probe
+#     is skipped until the next probe
+#   - a browser that wrote something keeps the time of that write in its
+#     session and reads from the primary until both a replica's lag and
+#     REPLICA_STICKY_SECONDS have elapsed since (read-your-writes)
+# With no replica available the view reads from the primary.
+# ----------------------------------------------------------------------------#
+
+# caught up when nothing is left to replay, else time since the last replay
+POSTGRES_LAG = text(
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0) END")
+
+
+def postgres_lag(connection):
+    return float(connection.execute(POSTGRES_LAG).scalar() or 0)
+
+
+def no_lag(connection):
+    return 0.0
+
+
+class Replica(object):
+    def __init__(self, engine, probe=None):
+        self.engine = engine
+        # callable(connection) -> seconds behind the primary
+        self.probe = probe or (postgres_lag if engine.dialect.name == 'postgresql' else no_lag)
+        self.lag = None
+        self.checked_at = None
+        self.error = None
+        self.reads = 0
+        self.lock = threading.Lock()
+
+    def current_lag(self, interval):
+        '''
+        The last measured lag, probed again when older than `interval`.
+        None while the replica cannot be reached.
+        '''
+        with self.lock:
+            now = time.monotonic()
+            if self.checked_at is None or now - self.checked_at >= interval:
+                self.checked_at = now
+                try:
+                    with self.engine.connect() as connection:
+                        self.lag = self.probe(connection)
+                    self.error = None
+                except Exception as e:
+                    self.lag = None
+                    # the message may carry hosts and credentials, it
+                    # goes to the log, the stats only get its type
+                    self.error = type(e).__name__
+                    if has_app_context():
+                        current_app.logger.warning('replica %r unreachable: %s', self.engine.url, e)
+            return self.lag
+
+
+class ReplicaRouter(object):
+    def __init__(self, replicas=(), max_lag=5.0, check_interval=2.0, sticky_seconds=2.0):
+        self.replicas = list(replicas)
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.sticky_seconds = sticky_seconds
+        self.turn = count()
+        self.lock = threading.Lock()
+        self.metrics = {'replica_reads': 0, 'primary_reads': 0, 'lagging': 0, 'sticky': 0}
+
+    def _count(self, outcome):
+        with self.lock:
+            self.metrics[outcome] += 1
+
+    def pick(self, last_write_at=None):
+        '''
+        A replica engine fresh enough for a reader whose last write was
+        at `last_write_at` (time.time()), or None for the primary.
+        '''
+        if not self.replicas:
+            return None
+        since_write = None if last_write_at is None else time.time() - last_write_at
+        start = next(self.turn)
+        sticky = False
+        for i in range(len(self.replicas)):
+            replica = self.replicas[(start + i) % len(self.replicas)]
+            lag = replica.current_lag(self.check_interval)
+            if lag is None or lag > self.max_lag:
+                continue
+            if since_write is not None and since_write <= max(lag, self.sticky_seconds):
+                sticky = True
+                continue
+            replica.reads += 1
+            self._count('replica_reads')
+            return replica.engine
+        self._count('sticky' if sticky else 'lagging')
+        self._count('primary_reads')
+        return None
+
+    def stats(self):
+        with self.lock:
+            stats = dict(self.metrics)
+        stats['replicas'] = [{
+            'url': repr(replica.engine.url),
+            'lag': replica.lag,
+            'error': replica.error,
+            'reads': replica.reads,
+        } for replica in self.replicas]
+        return stats
+
+
+class RoutingSession(SignallingSession):
+    '''
+    Sends the queries of @read_only views to a replica picked once per
+    request, writes and every other view use the primary.
+    '''
+    def get_bind(self, mapper=None, clause=None):
+        if not self._flushing and has_app_context() and g.get('read_only'):
+            if 'replica_engine' not in g:
+                last_write_at = session.get('last_write_at') if has_request_context() else None
+                g.replica_engine = get_router(self.app).pick(last_write_at)
+            if g.replica_engine is not None:
+                return g.replica_engine
+        return super(RoutingSession, self).get_bind(mapper, clause)
+
+
+def read_from_replica():
+    '''
+    Whether the current request read from a replica, which may not have
+    replayed writes made on the primary yet.
+    '''
+    return has_app_context() and g.get('replica_engine') is not None
+
+
+def read_only(view):
+    '''
+    Mark a view as only reading, allowing its queries on a replica.
+    '''
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        g.read_only = True
+        return view(*args, **kwargs)
+    return wrapper
+
+
+_router_lock = threading.Lock()
+
+
+def get_router(app):
+    '''
+    The app's ReplicaRouter, its engines are created on first use.
+    '''
+    router = app.extensions.get('replicas')
+    if router is None:
+        with _router_lock:
+            router = app.extensions.get('replicas')
+            if router is None:
+                db = app.extensions['sqlalchemy'].db
+                options = dict(app.config.get('SQLALCHEMY_ENGINE_OPTIONS', {}))
+                router = ReplicaRouter(
+                    [Replica(db.create_engine(make_url(uri), options))
+                     for uri in app.config.get('SQLALCHEMY_REPLICA_URIS', [])],
+                    max_lag=app.config.get('REPLICA_MAX_LAG', 5.0),
+                    check_interval=app.config.get('REPLICA_LAG_CHECK_INTERVAL', 2.0),
+                    sticky_seconds=app.config.get('REPLICA_STICKY_SECONDS', 2.0))
+                app.extensions['replicas'] = router
+    return router
+
+
+def init_app(app):
+    # replicas never see writes, so any write statement ran on the primary
+    @event.listens_for(Engine, 'after_cursor_execute')
+    def remember_write(conn, cursor, statement, parameters, context, executemany):
+        if has_request_context() and (context.isinsert or context.isupdate or context.isdelete):
+            g.wrote = True
+
+    @app.after_request
+    def stick_to_primary(response):
+        if g.get('wrote'):
+            session['last_write_at'] = time.time()
+        return response
@@ -0,0 +1,163 @@
+import time
+from collections import defaultdict
+from sqlalchemy import (func, case)
+from models import db
+
+
+# ----------------------------------------------------------------------------#
+# Venue / Artist search.
+#
+# A search matches the term anywhere in the name, city, state or genres
+# of a row and ranks exact name matches first, then name prefixes, then
+# names containing the term and finally matches on the other fields.
+#
+# On postgres the match runs against a trigram GIN index built over the
+# same expression as search_document() (see the migration adding it),
+# the total comes back with each row through count(*) OVER () so one
+# statement answers both the count and the page.
+# Other databases (SQLite while developing) use an in-process trigram
+# inverted index, only the ids of the requested page go to the database.
+# That fallback is for development with a single worker: every worker
+# holds a copy of the index and invalidate() only drops its own, so with
+# several workers a write made through another one shows up in searches
+# after at most INDEX_TTL seconds. Run more than one worker on postgres.
+# ----------------------------------------------------------------------------#
+
+RESULTS_PER_PAGE = 20
+
+# seconds an in-process index is trusted, the longest a write made by
+# another worker stays out of its results
+INDEX_TTL = 300
+
+SEARCH_FIELDS = ('name', 'city', 'state', 'genres_text')
+
+
+def search_document(model):
+    '''
+    The lowered, space joined search fields of `model`. Must stay in
+    sync with the expression of the trigram indexes.
+    '''
+    document = None
+    for field in SEARCH_FIELDS:
+        column = func.coalesce(getattr(model, field), '')
+        document = column if document is None else document + ' ' + column
+    return func.lower(document)
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _rank(name, term):
+    if name == term:
+        return 0
+    if name.startswith(term):
+        return 1
+    if term in name:
+        return 2
+    return 3
+
+
+# -------------------------------------------------
+# In-process inverted index
+# -------------------------------------------------
+class InvertedIndex(object):
+    '''
+    Trigram -> ids postings over the search fields of one model.
+    '''
+    def __init__(self, rows):
+        self.built_at = time.monotonic()
+        self.documents = {}
+        self.names = {}
+        self.postings = defaultdict(list)
+        for row in rows:
+            document = ' '.join((getattr(row, field) or '') for field in SEARCH_FIELDS).lower()
+            self.documents[row.id] = document
+            self.names[row.id] = (row.name or '').lower()
+            for trigram in _trigrams(document):
+                self.postings[trigram].append(row.id)
+
+    def match(self, term):
+        '''
+        Ids of the documents containing `term`, best ranked first.
+        '''
+        trigrams = _trigrams(term)
+        if trigrams:
+            postings = sorted((self.postings.get(t, ()) for t in trigrams), key=len)
+            candidates = set(postings[0])
+            for ids in postings[1:]:
+                candidates.intersection_update(ids)
+        else:
+            candidates = self.documents.keys()
+        matches = [i for i in candidates if term in self.documents[i]]
+        matches.sort(key=lambda i: (_rank(self.names[i], term), self.names[i], i))
+        return matches
+
+
+_indexes = {}
+
+
+def _index_for(model):
+    index = _indexes.get(model)
+    if index is None or time.monotonic() - index.built_at > INDEX_TTL:
+        columns = [model.id] + [getattr(model, field) for field in SEARCH_FIELDS]
+        index = _indexes[model] = InvertedIndex(db.session.query(*columns).all())
+    return index
+
+
+def invalidate(model):
+    '''
+    Forget the in-process index of `model` after one of its rows changed,
+    in this worker only.
+    '''
+    _indexes.pop(model, None)
+
+
+# -------------------------------------------------
+# Search
+# -------------------------------------------------
+def search(model, term, page=1, per_page=RESULTS_PER_PAGE):
+    '''
+    Return (total matches, model rows of the requested page).
+    '''
+    term = (term or '').strip().lower()
+    page = max(page, 1)
+    offset = (page - 1) * per_page
+    if db.engine.dialect.name == 'postgresql':
+        return _search_postgres(model, term, offset, per_page)
+
+    matches = _index_for(model).match(term)
+    page_ids = matches[offset:offset + per_page]
+    if not page_ids:
+        return len(matches), []
+    rows = {row.id: row for row in db.session.query(model).filter(model.id.in_(page_ids)).all()}
+    return len(matches), [rows[i] for i in page_ids if i in rows]
+
+
+def _search_postgres(model, term, offset, limit):
+    pattern = '%' + _escape_like(term) + '%'
+    name = func.lower(model.name)
+    rank = case([(name == term, 0),
+                 (name.like(_escape_like(term) + '%', escape='\\'), 1),
+                 (name.like(pattern, escape='\\'), 2)],
+                else_=3)
+    total = func.count().over().label('total')
+    rows = db.session.query(model, total) \
+        .filter(search_document(model).like(pattern, escape='\\')) \
+        .order_by(rank, func.similarity(name, term).desc(), name, model.id) \
+        .offset(offset) \
+        .limit(limit) \
+        .all()
+    if rows:
+        return rows[0].total, [row[0] for row in rows]
+    if offset:
+        # past the last page, count on its own
+        count = db.session.query(func.count(model.id)) \
+            .filter(search_document(model).like(pattern, escape='\\')) \
+            .scalar()
+        return count, []
+    return 0, []
@@ -0,0 +1,53 @@
+from flask import (current_app, Response, render_template, stream_with_context,
+                   get_flashed_messages)
+from models import db
+
+
+# ----------------------------------------------------------------------------#
+# Streamed pages.
+#
+#   return render_page('pages/venues.html', areas=iter_venue_areas())
+#
+# With STREAM_TEMPLATES on, the page goes out while Jinja generates it,
+# STREAM_BUFFER_SIZE template fragments at a time: the browser gets the
+# head and starts painting right away. Lazy iterators in the context,
+# like the iter_* loaders of queries.py, are consumed as their part of
+# the page is written, so rows come off the server side cursor a chunk
+# at a time and memory stays flat however long the listing. The session,
+# and the connection behind the cursor, is closed after the last byte.
+# Otherwise the page is rendered in one piece and the session closed.
+#
+# A streamed page has answered 200 before its rows are read, an error
+# half way is logged and cuts the response short, the page cache then
+# does not store it.
+# ----------------------------------------------------------------------------#
+
+STREAM_BUFFER_SIZE = 64
+
+
+def render_page(template_name, **context):
+    if not current_app.config.get('STREAM_TEMPLATES'):
+        try:
+            return render_template(template_name, **context)
+        finally:
+            db.session.close()
+
+    app = current_app._get_current_object()
+    # the session cookie is written before the first byte, take the
+    # flashed messages out of it now
+    get_flashed_messages()
+    app.update_template_context(context)
+    stream = app.jinja_env.get_or_select_template(template_name).stream(context)
+    stream.enable_buffering(STREAM_BUFFER_SIZE)
+
+    def generate():
+        try:
+            for chunk in stream:
+                yield chunk
+        except Exception:
+            app.logger.exception('streaming %s failed', template_name)
+            raise
+        finally:
+            db.session.close()
+
+    return Response(stream_with_context(generate()))
@@ -0,0 +1,203 @@
+import time
+import random
+from datetime import (datetime, timedelta)
+from sqlalchemy import (func, text)
+from models import (db, Venue, Artist, Show, Genre, venue_artists, venue_genres, artist_genres)
+from genres import (resolve, GENRE_SEPARATOR)
+from bulk import (copy_rows, GENRES)
+import counters
+
+
+# ----------------------------------------------------------------------------#
+# Synthetic data.
+#
+#   $ flask generate-data --rows 1000000 --seed 42
+#
+# Adds `rows` rows to Venue, Artist, venue_artists and Show, split by
+# SHARES, plus one to three genres per venue and artist. The same rows,
+# seed and anchor always give the same data: every value comes from one
+# random.Random(seed). Show times spread from HISTORY_DAYS before the
+# anchor (today by default) to FUTURE_DAYS after it, and a few venues
+# and artists get most of the shows, like on the real site.
+#
+# Rows go in GENERATE_CHUNK_SIZE at a time, with COPY on postgres, and
+# the show counters are rebuilt once at the end.
+# ----------------------------------------------------------------------------#
+
+GENERATE_CHUNK_SIZE = 10000
+
+# share of the rows of each table, shows last as they point at the others
+SHARES = (
+    ('venues', 0.01),
+    ('artists', 0.04),
+    ('venue_artists', 0.15),
+    ('shows', 0.80),
+)
+
+HISTORY_DAYS = 3 * 365
+FUTURE_DAYS = 365
+
+CITIES = [
+    ('San Francisco', 'CA'), ('Los Angeles', 'CA'), ('San Diego', 'CA'),
+    ('New York', 'NY'), ('Brooklyn', 'NY'), ('Chicago', 'IL'),
+    ('Austin', 'TX'), ('Houston', 'TX'), ('Seattle', 'WA'),
+    ('Portland', 'OR'), ('Denver', 'CO'), ('Nashville', 'TN'),
+    ('New Orleans', 'LA'), ('Atlanta', 'GA'), ('Miami', 'FL'),
+    ('Boston', 'MA'), ('Philadelphia', 'PA'), ('Detroit', 'MI'),
+    ('Minneapolis', 'MN'), ('Washington', 'DC'),
+]
+
+ADJECTIVES = ['Blue', 'Golden', 'Electric', 'Velvet', 'Midnight', 'Rusty', 'Silver',
+              'Crimson', 'Wild', 'Hollow', 'Neon', 'Lucky', 'Broken', 'Quiet', 'Rolling']
+NOUNS = ['Room', 'Hall', 'Owl', 'Tavern', 'Lounge', 'Garden', 'Foxes', 'Machines',
+         'Harbor', 'Echo', 'Riders', 'Lanterns', 'Wolves', 'Club', 'Theatre']
+STREETS = ['Main St', 'Market St', 'Broadway', 'Mission St', 'Elm St', 'Sunset Blvd',
+           'Park Ave', 'Oak St', 'Lake St', 'Pine St']
+
+
+def plan(rows):
+    '''
+    The number of rows of each table for `rows` rows in total, at least
+    one venue and one artist.
+    '''
+    counts = dict((table, int(rows * share)) for table, share in SHARES)
+    counts['venues'] = max(counts['venues'], 1)
+    counts['artists'] = max(counts['artists'], 1)
+    counts['shows'] += rows - sum(counts.values())
+    counts['shows'] = max(counts['shows'], 0)
+    return counts
+
+
+def _next_id(model):
+    return (db.session.query(func.max(model.id)).scalar() or 0) + 1
+
+
+def _popular(rng, first, count):
+    # skewed towards the first ids, the square puts ~3% of the picks on
+    # the first of 1000
+    return first + int(count * rng.random() ** 2)
+
+
+def _phone(rng):
+    return '{:03d}-{:03d}-{:04d}'.format(rng.randint(200, 999), rng.randint(200, 999),
+                                         rng.randint(0, 9999))
+
+
+def _name(rng, i):
+    return 'The {} {} {}'.format(rng.choice(ADJECTIVES), rng.choice(NOUNS), i)
+
+
+def _entities(rng, kind, first, count, genre_names):
+    for entity_id in range(first, first + count):
+        city, state = rng.choice(CITIES)
+        names = sorted(rng.sample(genre_names, rng.randint(1, 3)))
+        entity = {
+            'id': entity_id,
+            'name': _name(rng, entity_id),
+            'city': city,
+            'state': state,
+            'phone': _phone(rng),
+            'genres': GENRE_SEPARATOR.join(names),
+            'image_link': 'https://picsum.photos/seed/{}-{}/300/300'.format(kind, entity_id),
+            'facebook_link': 'https://www.facebook.com/{}{}'.format(kind, entity_id),
+        }
+        if kind == 'venue':
+            entity['address'] = '{} {}'.format(rng.randint(1, 9999), rng.choice(STREETS))
+        yield entity, names
+
+
+def _insert(table, rows):
+    if not rows:
+        return
+    if db.engine.dialect.name == 'postgresql':
+        columns = list(rows[0])
+        copy_rows(table, columns, (tuple(row[column] for column in columns) for row in rows))
+    else:
+        db.session.execute(table.insert(), rows)
+
+
+def _insert_entities(model, links, key, entities, chunk_size, genre_ids):
+    chunk = []
+    for entity in entities:
+        chunk.append(entity)
+        if len(chunk) == chunk_size:
+            _flush_entities(model, links, key, chunk, genre_ids)
+            chunk = []
+    _flush_entities(model, links, key, chunk, genre_ids)
+
+
+def _flush_entities(model, links, key, chunk, genre_ids):
+    _insert(model.__table__, [entity for entity, _ in chunk])
+    _insert(links, [{key: entity['id'], 'genre_id': genre_ids[name]}
+                    for entity, names in chunk for name in names])
+    db.session.commit()
+
+
+def _insert_chunked(table, rows, chunk_size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == chunk_size:
+            _insert(table, chunk)
+            db.session.commit()
+            chunk = []
+    _insert(table, chunk)
+    db.session.commit()
+
+
+def _reset_sequences(*models):
+    # the ids were given explicitly, move the serial sequences past them
+    if db.engine.dialect.name != 'postgresql':
+        return
+    for model in models:
+        db.session.execute(text(
+            "SELECT setval(pg_get_serial_sequence('\"{0}\"', 'id'), "
+            "(SELECT max(id) FROM \"{0}\"))".format(model.__tablename__)))
+    db.session.commit()
+
+
+def generate(rows, seed=42, anchor=None, chunk_size=GENERATE_CHUNK_SIZE):
+    '''
+    Add `rows` synthetic rows and return the count of each table with
+    the time taken.
+    '''
+    started = time.monotonic()
+    rng = random.Random(seed)
+    anchor = anchor or datetime.now().replace(hour=0, minute=0, second=0, microsecond=0)
+    counts = plan(rows)
+
+    genre_names = sorted(GENRES)
+    resolve(genre_names)
+    db.session.commit()
+    genre_ids = dict(db.session.query(Genre.name, Genre.id).all())
+
+    first_venue = _next_id(Venue)
+    first_artist = _next_id(Artist)
+    _insert_entities(Venue, venue_genres, 'venue_id',
+                     _entities(rng, 'venue', first_venue, counts['venues'], genre_names),
+                     chunk_size, genre_ids)
+    _insert_entities(Artist, artist_genres, 'artist_id',
+                     _entities(rng, 'artist', first_artist, counts['artists'], genre_names),
+                     chunk_size, genre_ids)
+    _reset_sequences(Venue, Artist)
+
+    _insert_chunked(venue_artists, ({
+        'venue_id': _popular(rng, first_venue, counts['venues']),
+        'artist_id': _popular(rng, first_artist, counts['artists']),
+    } for _ in range(counts['venue_artists'])), chunk_size)
+
+    # whole quarter hours, like shows are booked
+    span = (HISTORY_DAYS + FUTURE_DAYS) * 24 * 4
+    start = anchor - timedelta(days=HISTORY_DAYS)
+    _insert_chunked(Show.__table__, ({
+        'venue_id': _popular(rng, first_venue, counts['venues']),
+        'artist_id': _popular(rng, first_artist, counts['artists']),
+        'show_time': start + timedelta(minutes=15 * rng.randrange(span)),
+    } for _ in range(counts['shows'])), chunk_size)
+
+    counters.rebuild()
+    db.session.commit()
+
+    seconds = time.monotonic() - started
+    return dict(counts, rows=sum(counts.values()), seconds=seconds,
+                rows_per_second=sum(counts.values()) / seconds if seconds else 0)
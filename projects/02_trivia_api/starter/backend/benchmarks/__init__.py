@@ -0,0 +1,67 @@
+'''
+Helpers shared by the trivia benchmark scripts.
+
+Run a benchmark from the backend directory, e.g.
+
+    $ python -m benchmarks.bench_questions --sizes 10000,100000,1000000
+
+By default every benchmark runs against a throw-away SQLite file, pass
+--database to point it at a real postgres database instead.
+'''
+import os
+import time
+import random
+import tempfile
+
+CATEGORIES = ['Science', 'Art', 'Geography', 'History', 'Entertainment', 'Sports']
+
+CHUNK_SIZE = 50000
+
+
+def create_app(uri=None, **config):
+    '''
+    The trivia app on `uri` (a temporary SQLite file when empty), with
+    the schema created. Must run before anything imports models.
+    '''
+    if not uri:
+        handle, path = tempfile.mkstemp(prefix='trivia-bench-', suffix='.db')
+        os.close(handle)
+        uri = 'sqlite:///' + path
+    os.environ['TRIVIA_DATABASE_URL'] = uri
+    from flaskr import create_app
+    return create_app(config)
+
+
+def add_questions(db, Question, Category, count, seed=42):
+    '''
+    Grow the question bank by `count` questions spread over CATEGORIES.
+    '''
+    rng = random.Random(seed)
+    if not db.session.query(Category).count():
+        db.session.execute(Category.__table__.insert(), [{'type': name} for name in CATEGORIES])
+    category_ids = [category_id for category_id, in db.session.query(Category.id)]
+    for start in range(0, count, CHUNK_SIZE):
+        db.session.execute(Question.__table__.insert(), [{
+            'question': 'Question {} about {}?'.format(i, rng.choice(CATEGORIES).lower()),
+            'answer': 'Answer {}'.format(i),
+            'category': str(rng.choice(category_ids)),
+            'difficulty': rng.randint(1, 5),
+        } for i in range(start, min(start + CHUNK_SIZE, count))])
+    db.session.commit()
+
+
+def measure(fn, repeat=5):
+    '''
+    Call `fn` `repeat` times and return the best time in seconds.
+    '''
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best
+
+
+def report(label, seconds):
+    print('{:<36} {:>10.2f} ms'.format(label, seconds * 1000))
@@ -0,0 +1,80 @@
+'''
+Benchmark GET /questions as the question bank grows: the pages loaded
+with LIMIT/OFFSET and keyset against loading every question and slicing
+it, as the view used to, and the whole request.
+
+    $ python -m benchmarks.bench_questions --sizes 10000,100000,1000000
+'''
+import json
+import argparse
+from benchmarks import (create_app, add_questions, measure, report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='Comma separated question bank sizes.')
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--legacy-max', type=int, default=100000,
+                        help='Largest bank the load-everything page is timed on.')
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    app = create_app(args.database, QUESTIONS_PER_PAGE=args.per_page)
+    from models import (db, Question, Category)
+    from pagination import (paginate, count_rows)
+    client = app.test_client()
+
+    def legacy_page(page):
+        def run():
+            questions = [question.format() for question in db.session.query(Question).all()]
+            start = (page - 1) * args.per_page
+            page_questions = questions[start:start + args.per_page]
+            total = len(questions)
+            db.session.remove()
+        return run
+
+    def page_query(**kwargs):
+        def run():
+            paginate(db.session.query(Question), Question.id, args.per_page, **kwargs)
+            db.session.remove()
+        return run
+
+    def count():
+        count_rows(db.session, Question)
+        db.session.remove()
+
+    def get(url):
+        def run():
+            response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            json.loads(response.data)
+        return run
+
+    with app.app_context():
+        size = 0
+        for target in [int(size) for size in args.sizes.split(',')]:
+            add_questions(db, Question, Category, target - size, seed=target)
+            size = target
+            last = (size + args.per_page - 1) // args.per_page
+            first_id = db.session.query(Question.id).order_by(Question.id).first()[0]
+
+            print('\n{} questions'.format(size))
+            cases = [
+                ('page 1', page_query(page=1)),
+                ('page {} (middle)'.format(last // 2), page_query(page=last // 2)),
+                ('page {} (last)'.format(last), page_query(page=last)),
+                ('keyset, last page', page_query(after=first_id + size - args.per_page - 1)),
+                ('exact count', count),
+                ('GET /questions?page=1', get('/questions?page=1')),
+                ('GET /questions?page={}'.format(last), get('/questions?page={}'.format(last))),
+            ]
+            if size <= args.legacy_max:
+                cases.insert(0, ('load all + slice (before)', legacy_page(1)))
+            for label, fn in cases:
+                report(label, measure(fn, args.repeat))
+
+
+if __name__ == '__main__':
+    main()
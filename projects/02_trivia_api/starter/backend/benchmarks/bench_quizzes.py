@@ -0,0 +1,125 @@
+'''
+Benchmark quiz rounds with many concurrent quizzes: a round drawn from
+a server side deck against the query the view used to run, every
+previous question sent back in a NOT IN, first() or ORDER BY random()
+for a random pick. The whole POST /quizzes request is timed too.
+
+    $ python -m benchmarks.bench_quizzes --questions 100000 --quizzes 200 --rounds 20
+'''
+import json
+import math
+import time
+import argparse
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from sqlalchemy import func
+from benchmarks import (create_app, add_questions)
+
+
+def percentile(values, p):
+    return values[max(0, min(len(values) - 1, int(math.ceil(p / 100.0 * len(values))) - 1))]
+
+
+def run(play, quizzes, rounds, concurrency):
+    '''
+    Play `quizzes` quizzes of `rounds` rounds on `concurrency` threads,
+    return (rounds per second, p50 ms, p95 ms).
+    '''
+    latencies = []
+    lock = threading.Lock()
+
+    def one(quiz):
+        timings = play(quiz, rounds)
+        with lock:
+            latencies.extend(timings)
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        list(pool.map(one, range(quizzes)))
+    wall = time.perf_counter() - started
+    latencies.sort()
+    return len(latencies) / wall, percentile(latencies, 50) * 1000, percentile(latencies, 95) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--questions', type=int, default=100000)
+    parser.add_argument('--quizzes', type=int, default=200)
+    parser.add_argument('--rounds', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--category', type=int, default=0, help='0 for every category.')
+    parser.add_argument('--store', default='memory', help="QUIZ_STORE, 'memory' or 'redis'.")
+    parser.add_argument('--redis-url', default='local://', help="QUIZ_REDIS_URL, 'local://' for the in-process stand-in.")
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    app = create_app(args.database, QUIZ_STORE=args.store, QUIZ_REDIS_URL=args.redis_url)
+    from models import (db, Question, Category)
+    from quiz import (QuestionPools, QuizEngine)
+    import quiz_sessions
+    quizzes = QuizEngine(QuestionPools(db.session, ttl=3600), quiz_sessions.from_config(app.config))
+    with app.app_context():
+        add_questions(db, Question, Category, args.questions)
+        db.session.remove()
+
+    def token_quiz(quiz, rounds):
+        client = app.test_client()
+        body = {'quiz_category': {'id': args.category}}
+        timings = []
+        for _ in range(rounds):
+            start = time.perf_counter()
+            response = client.post('/quizzes', json=body)
+            timings.append(time.perf_counter() - start)
+            data = json.loads(response.data)
+            assert data['question'], data
+            body['quiz_token'] = data['quiz_token']
+        return timings
+
+    def deck_quiz(quiz, rounds):
+        # the view without the HTTP round trip, like the queries below
+        timings = []
+        with app.app_context():
+            token = quizzes.start(args.category)
+            for _ in range(rounds):
+                start = time.perf_counter()
+                question = db.session.query(Question).get(quizzes.draw(token))
+                json.dumps(question.format())
+                timings.append(time.perf_counter() - start)
+                db.session.remove()
+        return timings
+
+    def legacy_quiz(order_by):
+        def play(quiz, rounds):
+            timings = []
+            previous = []
+            with app.app_context():
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    query = db.session.query(Question).filter(~Question.id.in_(previous))
+                    if args.category:
+                        query = query.filter(Question.category == str(args.category))
+                    if order_by is not None:
+                        query = query.order_by(order_by)
+                    question = query.first()
+                    json.dumps(question.format())
+                    timings.append(time.perf_counter() - start)
+                    previous.append(question.id)
+                    db.session.remove()
+            return timings
+        return play
+
+    print('{} questions, {} quizzes of {} rounds, {} threads, {} store'.format(
+        args.questions, args.quizzes, args.rounds, args.concurrency, args.store))
+    cases = [
+        ('NOT IN, first() (before)', legacy_quiz(None)),
+        ('NOT IN, ORDER BY random()', legacy_quiz(func.random())),
+        ('token deck, draw + get', deck_quiz),
+        ('POST /quizzes with a token', token_quiz),
+    ]
+    for label, play in cases:
+        throughput, p50, p95 = run(play, args.quizzes, args.rounds, args.concurrency)
+        print('{:<30} {:>9.1f} rounds/s {:>8.2f} ms p50 {:>8.2f} ms p95'.format(label, throughput, p50, p95))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,59 @@
+'''
+Benchmark POST /questions/search as the question bank grows: the ranked,
+capped, paginated search of search.py against the unindexed ILIKE over
+the questions the view used to run, returning every match.
+
+    $ python -m benchmarks.bench_search --sizes 10000,100000,1000000
+
+On SQLite the search runs on the FTS5 table, against postgres
+(--database) on the indexes of migrations/001_question_search.up.sql
+once applied.
+'''
+import json
+import argparse
+from benchmarks import (create_app, add_questions, measure, report)
+
+# a rare word, a word in a sixth of the questions, a word in the
+# answers only and a term matching nothing
+TERMS = ['4242', 'history', 'answer 777', 'zzzz']
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', default='10000,100000,1000000',
+                        help='Comma separated question bank sizes.')
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--database')
+    args = parser.parse_args()
+
+    app = create_app(args.database)
+    from models import (db, Question, Category)
+    client = app.test_client()
+
+    def legacy(term):
+        def run():
+            questions = db.session.query(Question).filter(Question.question.ilike('%' + term + '%')).all()
+            json.dumps([question.format() for question in questions])
+            db.session.remove()
+        return run
+
+    def post(term):
+        def run():
+            response = client.post('/questions/search', json={'searchTerm': term})
+            assert response.status_code in (200, 404), (term, response.status_code)
+            json.loads(response.data)
+        return run
+
+    with app.app_context():
+        size = 0
+        for target in [int(size) for size in args.sizes.split(',')]:
+            add_questions(db, Question, Category, target - size, seed=target)
+            size = target
+            print('\n{} questions'.format(size))
+            for term in TERMS:
+                report('ILIKE {!r} (before)'.format(term), measure(legacy(term), args.repeat))
+                report('POST /questions/search {!r}'.format(term), measure(post(term), args.repeat))
+
+
+if __name__ == '__main__':
+    main()
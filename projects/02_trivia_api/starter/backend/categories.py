@@ -0,0 +1,88 @@
+import time
+import weakref
+import threading
+from sqlalchemy import event
+from models import Category
+
+
+# ----------------------------------------------------------------------------#
+# Category map.
+#
+#   categories = CategoryMap(db.session, ttl=300)
+#   categories.all()                  {1: 'Science', 2: 'Art', ...}
+#   categories.resolve(['1', '5'])    {1: 'Science', 5: 'Entertainment'}
+#
+# Every category is read with one query and kept in memory, requests
+# resolve the categories of their questions without touching the
+# database. A category written through the ORM in this process drops the
+# map at once, a change made elsewhere shows within `ttl` seconds, or as
+# soon as a question names a category the map does not know.
+# ----------------------------------------------------------------------------#
+
+_maps = weakref.WeakSet()
+
+
+class CategoryMap(object):
+    def __init__(self, session, ttl):
+        self.session = session
+        self.ttl = ttl
+        self.types = None
+        self.expires = 0
+        # ids still unknown after a reload, not worth another one
+        self.missing = set()
+        self.generation = 0
+        self.lock = threading.Lock()
+        _maps.add(self)
+
+    def _load(self):
+        with self.lock:
+            generation = self.generation
+        types = dict(self.session.query(Category.id, Category.type).all())
+        with self.lock:
+            if generation == self.generation:
+                self.types = types
+                self.expires = time.monotonic() + self.ttl
+                self.missing = set()
+        return types
+
+    def all(self):
+        with self.lock:
+            if self.types is not None and time.monotonic() < self.expires:
+                return self.types
+        return self._load()
+
+    def resolve(self, ids):
+        '''
+        {id: type} of the categories in `ids`, given as in
+        Question.category. Unknown ids are left out.
+        '''
+        wanted = set()
+        for category_id in ids:
+            try:
+                wanted.add(int(category_id))
+            except (TypeError, ValueError):
+                pass
+        types = self.all()
+        unknown = wanted.difference(types)
+        with self.lock:
+            reload = bool(unknown) and not unknown <= self.missing
+        if reload:
+            types = self._load()
+            with self.lock:
+                self.missing |= unknown.difference(types)
+        return dict((category_id, types[category_id]) for category_id in wanted if category_id in types)
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.types = None
+            self.missing = set()
+
+
+def _invalidate_maps(mapper, connection, target):
+    for category_map in list(_maps):
+        category_map.invalidate()
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Category, _event, _invalidate_maps)
@@ -1,18 +1,56 @@
 import os
 from flask import Flask, request, abort, jsonify
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import and_
 from flask_cors import CORS
 import random
 from models import setup_db, Question, Category, db
-QUESTIONS_PER_PAGE = 10
+from instrumentation import Instrumentation
+from pagination import paginate, count_rows, CountCache
+from categories import CategoryMap
+from quiz import QuestionPools, QuizEngine
+import quiz_sessions
+import search
 
 
 def create_app(test_config=None):
     # create and configure the app
     app = Flask(__name__)
+    app.config.from_mapping(
+        QUESTIONS_PER_PAGE=int(os.environ.get('TRIVIA_QUESTIONS_PER_PAGE', 10)),
+        # seconds the total of GET /questions is reused, writes reset it
+        QUESTION_COUNT_TTL=float(os.environ.get('TRIVIA_QUESTION_COUNT_TTL', 30)),
+        # postgres only: past this many questions the total is the planner estimate
+        QUESTION_COUNT_ESTIMATE_ABOVE=int(os.environ.get('TRIVIA_QUESTION_COUNT_ESTIMATE_ABOVE', 1000000)),
+        # seconds the category map is kept, see categories.py
+        CATEGORY_MAP_TTL=float(os.environ.get('TRIVIA_CATEGORY_MAP_TTL', 300)),
+        # quiz decks, see quiz.py
+        QUIZ_DECK_SIZE=int(os.environ.get('TRIVIA_QUIZ_DECK_SIZE', 50)),
+        QUIZ_POOL_TTL=float(os.environ.get('TRIVIA_QUIZ_POOL_TTL', 60)),
+        # quiz sessions, see quiz_sessions.py: 'memory' or 'redis'
+        QUIZ_STORE=os.environ.get('TRIVIA_QUIZ_STORE', 'memory'),
+        QUIZ_REDIS_URL=os.environ.get('TRIVIA_QUIZ_REDIS_URL', 'redis://localhost:6379/0'),
+        QUIZ_SESSION_TTL=int(os.environ.get('TRIVIA_QUIZ_SESSION_TTL', 3600)),
+        QUIZ_MAX_SESSIONS=int(os.environ.get('TRIVIA_QUIZ_MAX_SESSIONS', 10000)),
+        # question search, see search.py
+        SEARCH_PER_PAGE=int(os.environ.get('TRIVIA_SEARCH_PER_PAGE', 10)),
+        SEARCH_MAX_RESULTS=int(os.environ.get('TRIVIA_SEARCH_MAX_RESULTS', 1000)),
+        # /metrics and /metrics/profiles, see instrumentation.py
+        INSTRUMENTATION_EXPOSE_METRICS=os.environ.get('TRIVIA_EXPOSE_METRICS', '0') == '1',
+    )
+    if test_config is not None:
+        app.config.update(test_config)
     setup_db(app)
+    search.install(db.engine)
     CORS(app)
+    Instrumentation(app)
+
+    question_count = CountCache(
+        lambda: count_rows(db.session, Question, app.config['QUESTION_COUNT_ESTIMATE_ABOVE']),
+        app.config['QUESTION_COUNT_TTL'])
+    category_map = CategoryMap(db.session, app.config['CATEGORY_MAP_TTL'])
+    quizzes = QuizEngine(QuestionPools(db.session, app.config['QUIZ_POOL_TTL']),
+                         quiz_sessions.from_config(app.config),
+                         deck_size=app.config['QUIZ_DECK_SIZE'])
 
     @app.after_request
     def after_request(response):
@@ -26,13 +64,8 @@ def create_app(test_config=None):
     @app.route('/categories')
     def getCategories():
         if request.method == 'GET':
-            categories = {}
-            query = db.session.query(Category).all()
-            for category in query:
-                categories[category.id] = category.type
-
             return jsonify({
-              "categories": categories
+              "categories": category_map.all()
             }), 200
         else:
             abort(405)
@@ -43,28 +76,24 @@ def create_app(test_config=None):
     @app.route('/questions')
     def getQuestions():
         try:
-            categories = {}
-            # Pagination
-            page_num = request.args.get('page', 1, type=int)
-            start = (page_num - 1) * QUESTIONS_PER_PAGE
-            end = start + QUESTIONS_PER_PAGE
-
-            # Questions
-            questions = db.session.query(Question).all()
+            # Pagination, only the rows of the page are loaded:
+            # ?page=N, or ?after=<id of the last question seen>
+            per_page = app.config['QUESTIONS_PER_PAGE']
+            questions = paginate(db.session.query(Question), Question.id, per_page,
+                                 page=request.args.get('page', 1, type=int),
+                                 after=request.args.get('after', type=int))
             questions = [question.format() for question in questions]
 
-            # Categories relates to returned questions
-            category_ids = db.session.query(Question).distinct(Question.category).all()
-            for category in category_ids:
-                category_data = db.session.query(Category).get(category.category)
-                categories[category_data.id] = category_data.type
+            # Every category, from the in-memory map
+            categories = category_map.all()
 
-            if not questions[start:end]:
+            if not questions:
                 abort(404)
             else:
                 return jsonify({
-                  'questions': questions[start:end],
-                  'total_questions': len(questions),
+                  'questions': questions,
+                  'total_questions': question_count.get(),
+                  'questions_per_page': per_page,
                   'categories': categories,
                 })
         except Exception:
@@ -80,6 +109,7 @@ def create_app(test_config=None):
             abort(404)
         else:
             question.delete()
+            question_count.invalidate()
             return jsonify({
                     "succes": True,
                     'message': 'Order Deleted Successfully'
@@ -101,6 +131,7 @@ def create_app(test_config=None):
                                 category=category,
                                 difficulty=difficulty)
             question.insert()
+            question_count.invalidate()
             return jsonify(
                          {"success": True,
                           'message': 'Question added Successfully'
@@ -113,22 +144,26 @@ def create_app(test_config=None):
     # ---------------------------------------------
     @app.route('/questions/search', methods=['POST'])
     def search_questions():
-        categories = {}
         request_data = request.get_json()
         search_term = request_data.get('searchTerm')
-        questions = db.session.query(Question).filter(Question.question.ilike('%' + search_term + '%')).all()
+        page = request_data.get('page', 1)
+        if not isinstance(search_term, str) or not search_term.strip() or not isinstance(page, int):
+            abort(422)
+        # ranked matches in the questions and answers, one page of them
+        total, questions = search.search(db.session, search_term, page=page,
+                                         per_page=app.config['SEARCH_PER_PAGE'],
+                                         max_results=app.config['SEARCH_MAX_RESULTS'])
 
         if not questions:
             abort(404)
         # Categories relates to returned questions
-        for category in questions:
-            category_data = db.session.query(Category).get(category.category)
-            if category_data.type not in categories:
-                categories[category_data.id] = category_data.type
+        categories = category_map.resolve(question.category for question in questions)
 
         return jsonify({
                       'questions': [question.format() for question in questions],
-                      'totalQuestions': len(questions),
+                      'totalQuestions': total,
+                      'page': page,
+                      'questions_per_page': app.config['SEARCH_PER_PAGE'],
                       'categories': categories
                       })
 
@@ -153,21 +188,33 @@ def create_app(test_config=None):
     def letus_play():
         request_data = request.get_json()
         quiz_category = request_data.get('quiz_category')
-        previous_questions = request_data.get('previous_questions')
-        if quiz_category and previous_questions is not None:
-            if quiz_category['id'] == 0:
-                question = db.session.query(Question).filter(~Question.id.in_(previous_questions)).first()
-            else:
-                question = db.session.query(Question).filter(and_(Question.category == quiz_category['id'], ~Question.id.in_(previous_questions))).first()
+        previous_questions = request_data.get('previous_questions') or []
+        # the first round starts a quiz, the next ones only send its token
+        quiz_token = request_data.get('quiz_token')
+        if quiz_category and isinstance(previous_questions, list):
+            try:
+                category_id = int(quiz_category['id'])
+                previous_questions = [int(question_id) for question_id in previous_questions]
+            except (KeyError, TypeError, ValueError):
+                abort(422)
+            if quiz_token is None:
+                quiz_token = quizzes.start(category_id, previous_questions)
 
-            if question is None:
-                question = False
-            else:
-                question = question.format()
+            question = None
+            while question is None:
+                try:
+                    question_id = quizzes.draw(quiz_token)
+                except KeyError:
+                    abort(404)
+                if question_id is None:
+                    break
+                # None when deleted since the deck was dealt
+                question = db.session.query(Question).get(question_id)
 
             return jsonify({
                           'success': True,
-                          'question': question
+                          'question': question.format() if question is not None else False,
+                          'quiz_token': quiz_token
                   }), 200
         else:
             abort(422)
@@ -0,0 +1,12 @@
+-- Undo 001_question_search.up.sql.
+--
+--   psql trivia < migrations/001_question_search.down.sql
+
+BEGIN;
+
+DROP INDEX IF EXISTS ix_questions_answer_trgm;
+DROP INDEX IF EXISTS ix_questions_question_trgm;
+DROP INDEX IF EXISTS ix_questions_search_vector;
+ALTER TABLE questions DROP COLUMN IF EXISTS search_vector;
+
+COMMIT;
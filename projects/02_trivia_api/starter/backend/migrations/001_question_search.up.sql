@@ -0,0 +1,20 @@
+-- Full text and substring search over questions and answers, see search.py.
+-- Needs PostgreSQL 12 or later for the generated column.
+--
+--   psql trivia < migrations/001_question_search.up.sql
+
+BEGIN;
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+ALTER TABLE questions ADD COLUMN search_vector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(question, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(answer, '')), 'B')
+    ) STORED;
+
+CREATE INDEX ix_questions_search_vector ON questions USING gin (search_vector);
+CREATE INDEX ix_questions_question_trgm ON questions USING gin (question gin_trgm_ops);
+CREATE INDEX ix_questions_answer_trgm ON questions USING gin (answer gin_trgm_ops);
+
+COMMIT;
@@ -1,12 +1,12 @@
 import os
-from sqlalchemy import Column, String, Integer, create_engine
+from sqlalchemy import Column, String, Integer, Index, create_engine, inspect
 from flask_sqlalchemy import SQLAlchemy
 import json
 
 database_name = "trivia"
 database_user = "postgres"
 database_password = "password"
-database_path = "postgres://{}:{}@{}/{}".format(database_user, database_password, 'localhost:5432', database_name)
+database_path = os.environ.get('TRIVIA_DATABASE_URL', "postgres://{}:{}@{}/{}".format(database_user, database_password, 'localhost:5432', database_name))
 
 db = SQLAlchemy()
 
@@ -17,10 +17,20 @@ def setup_db(app, database_path=database_path):
     db.app = app
     db.init_app(app)
     db.create_all()
+    # create_all() skips the indexes of tables that already exist
+    for table in db.metadata.sorted_tables:
+        existing = set(index['name'] for index in inspect(db.engine).get_indexes(table.name))
+        for index in table.indexes:
+            if index.name not in existing:
+                index.create(db.engine)
 
 
 class Question(db.Model):
     __tablename__ = 'questions'
+    __table_args__ = (
+        # the question ids of a category, for quizzes
+        Index('ix_questions_category_id', 'category', 'id'),
+    )
 
     id = Column(Integer, primary_key=True)
     question = Column(String)
@@ -0,0 +1,70 @@
+import time
+import threading
+from sqlalchemy import (func, text)
+
+
+# ----------------------------------------------------------------------------#
+# Pagination.
+#
+# paginate() loads only the rows of one page, ordered by a unique indexed
+# column: page N with LIMIT/OFFSET, or the rows after a given key
+# (keyset), which costs the same however deep the page.
+#
+# Totals come from a CountCache, counted once per `ttl` seconds or after
+# a write invalidated it. count_rows() counts exactly, or on postgres
+# takes the planner estimate once a table is past `estimate_above` rows.
+# ----------------------------------------------------------------------------#
+
+def paginate(query, key, per_page, page=1, after=None):
+    '''
+    One page of `query` ordered by `key`: the `per_page` rows following
+    `after` when given, else page `page` counting from 1.
+    '''
+    query = query.order_by(key)
+    if after is not None:
+        query = query.filter(key > after)
+    else:
+        query = query.offset((page - 1) * per_page)
+    return query.limit(per_page).all()
+
+
+def count_rows(session, model, estimate_above=None):
+    if estimate_above is not None and session.get_bind().dialect.name == 'postgresql':
+        # reltuples is kept by VACUUM / ANALYZE, -1 when never analyzed
+        estimate = session.execute(text('SELECT reltuples FROM pg_class WHERE oid = CAST(:table AS regclass)'),
+                                   {'table': model.__tablename__}).scalar()
+        if estimate is not None and estimate >= estimate_above:
+            return int(estimate)
+    return session.query(func.count(model.id)).scalar()
+
+
+class CountCache(object):
+    '''
+    The result of `count` kept for `ttl` seconds, or until invalidate().
+    '''
+    def __init__(self, count, ttl):
+        self.count = count
+        self.ttl = ttl
+        self.value = None
+        self.expires = 0
+        # bumped by invalidate(), a count started before is not kept
+        self.generation = 0
+        self.lock = threading.Lock()
+
+    def get(self):
+        now = time.monotonic()
+        with self.lock:
+            if self.value is not None and now < self.expires:
+                return self.value
+            generation = self.generation
+        value = self.count()
+        with self.lock:
+            if generation == self.generation:
+                self.value = value
+                self.expires = now + self.ttl
+        return value
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.value = None
@@ -0,0 +1,174 @@
+import sys
+import time
+import struct
+import random
+import secrets
+import weakref
+import threading
+from array import array
+from sqlalchemy import event
+from models import Question
+
+
+# ----------------------------------------------------------------------------#
+# Quizzes.
+#
+#   token = quizzes.start(category_id, previous_ids)
+#   question_id = quizzes.draw(token)       None once the quiz is over
+#
+# The ids of the questions of a category (0 for every category) are read
+# with one query along ix_questions_category_id into a QuestionPools
+# entry, kept until a question is written through the ORM in this
+# process or for `ttl` seconds.
+#
+# A quiz, kept by token in quiz_sessions.py, has a deck: up to
+# QUIZ_DECK_SIZE ids of its pool, sampled without replacement in random
+# order, one popped per round. Dealing costs O(deck) whatever the size
+# of the pool, a round O(1), and every question not drawn yet is equally
+# likely in every round. A deck that runs out on a larger pool is dealt
+# again from the ids not drawn yet.
+# ----------------------------------------------------------------------------#
+
+QUIZ_DECK_SIZE = 50
+
+_pools = weakref.WeakSet()
+
+
+class QuestionPools(object):
+    '''
+    category id -> array of its question ids, in id order.
+    '''
+    def __init__(self, session, ttl):
+        self.session = session
+        self.ttl = ttl
+        # category id -> (expires at, ids)
+        self.pools = {}
+        self.generation = 0
+        self.lock = threading.Lock()
+        _pools.add(self)
+
+    def get(self, category_id):
+        with self.lock:
+            entry = self.pools.get(category_id)
+            if entry is not None and time.monotonic() < entry[0]:
+                return entry[1]
+            generation = self.generation
+        query = self.session.query(Question.id)
+        if category_id:
+            query = query.filter(Question.category == str(category_id))
+        ids = array('i', (question_id for question_id, in query.order_by(Question.id)))
+        with self.lock:
+            if generation == self.generation:
+                self.pools[category_id] = (time.monotonic() + self.ttl, ids)
+        return ids
+
+    def invalidate(self):
+        with self.lock:
+            self.generation += 1
+            self.pools = {}
+
+
+class Quiz(object):
+    '''
+    A quiz: its category, the deck of question ids still to draw, popped
+    from the end, and the ids already drawn. The ids are 4 byte arrays,
+    dumps() packs them little endian after a small header.
+    '''
+    __slots__ = ('category_id', 'deck', 'drawn')
+
+    HEADER = struct.Struct('<iI')
+
+    def __init__(self, category_id, drawn=(), deck=()):
+        self.category_id = category_id
+        self.deck = array('i', deck)
+        self.drawn = array('i', drawn)
+
+    def dumps(self):
+        deck, drawn = self.deck, self.drawn
+        if sys.byteorder == 'big':
+            deck, drawn = array('i', deck), array('i', drawn)
+            deck.byteswap()
+            drawn.byteswap()
+        return self.HEADER.pack(self.category_id, len(deck)) + deck.tobytes() + drawn.tobytes()
+
+    @classmethod
+    def loads(cls, data):
+        category_id, deck_length = cls.HEADER.unpack_from(data)
+        ids = array('i')
+        ids.frombytes(data[cls.HEADER.size:])
+        if sys.byteorder == 'big':
+            ids.byteswap()
+        return cls(category_id, drawn=ids[deck_length:], deck=ids[:deck_length])
+
+
+class QuizEngine(object):
+    '''
+    Deals and draws the decks of the quizzes kept in `sessions`, see
+    quiz_sessions.py.
+    '''
+    def __init__(self, pools, sessions, deck_size=QUIZ_DECK_SIZE):
+        self.pools = pools
+        self.sessions = sessions
+        self.deck_size = deck_size
+        self.random = random.Random()
+        self.lock = threading.Lock()
+
+    def deal(self, pool, drawn):
+        '''
+        Up to deck_size ids of `pool` not in `drawn`, in random order.
+        '''
+        drawn = set(drawn)
+        if len(pool) <= 2 * (len(drawn) + self.deck_size):
+            left = [question_id for question_id in pool if question_id not in drawn]
+            self.random.shuffle(left)
+            return array('i', left[:self.deck_size])
+        # at least half of the pool is left to pick from, picks at
+        # random positions are rejected less than half of the time
+        deck = array('i')
+        picked = set()
+        while len(deck) < self.deck_size:
+            question_id = pool[self.random.randrange(len(pool))]
+            if question_id not in drawn and question_id not in picked:
+                picked.add(question_id)
+                deck.append(question_id)
+        return deck
+
+    def start(self, category_id, previous=()):
+        '''
+        Start a quiz of `category_id` skipping the `previous` question
+        ids, return its token.
+        '''
+        token = secrets.token_urlsafe(16)
+        self.sessions.put(token, Quiz(category_id, previous))
+        return token
+
+    def draw(self, token):
+        '''
+        The id of the next question of the quiz, None when every question
+        was drawn. KeyError for an unknown or expired token.
+        '''
+        quiz = self.sessions.get(token)
+        if quiz is None:
+            raise KeyError(token)
+        # the pool may have to be read, outside of the lock
+        pool = None if quiz.deck else self.pools.get(quiz.category_id)
+        with self.lock:
+            if not quiz.deck:
+                if pool is None:
+                    pool = self.pools.get(quiz.category_id)
+                quiz.deck = self.deal(pool, quiz.drawn)
+            question_id = quiz.deck.pop() if quiz.deck else None
+            if question_id is not None:
+                quiz.drawn.append(question_id)
+        # written back every round, for the TTL and for external stores
+        self.sessions.put(token, quiz)
+        return question_id
+
+
+def _invalidate_pools(mapper, connection, target):
+    for pools in list(_pools):
+        pools.invalidate()
+
+
+for _event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Question, _event, _invalidate_pools)
@@ -0,0 +1,115 @@
+import time
+import threading
+from collections import OrderedDict
+from quiz import Quiz
+
+
+# ----------------------------------------------------------------------------#
+# Quiz sessions.
+#
+# The quizzes of quiz.py by token, each forgotten `ttl` seconds after its
+# last round.
+#
+# Backends:
+#   memory - in-process LRU, at most `max_sessions` quizzes per worker
+#   redis  - shared by all workers, a quiz is a few bytes per question
+#            (Quiz.dumps()) under SETEX. Run redis with a maxmemory
+#            policy for the LRU. QUIZ_REDIS_URL 'local://' swaps the
+#            redis server for LocalRedis, an in-process stand-in
+#
+# Two rounds of one quiz sent at the same time to different workers can
+# draw the same question, a client plays one round after the other.
+# ----------------------------------------------------------------------------#
+
+class MemorySessions(object):
+    '''
+    Thread safe LRU of token -> (expires at, Quiz), the Quiz objects
+    themselves are kept.
+    '''
+    def __init__(self, ttl, max_sessions=10000):
+        self.ttl = ttl
+        self.max_sessions = max_sessions
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, token):
+        with self.lock:
+            entry = self.entries.get(token)
+            if entry is None:
+                return None
+            if entry[0] < time.monotonic():
+                del self.entries[token]
+                return None
+            return entry[1]
+
+    def put(self, token, quiz):
+        now = time.monotonic()
+        with self.lock:
+            self.entries[token] = (now + self.ttl, quiz)
+            self.entries.move_to_end(token)
+            while self.entries:
+                oldest = next(iter(self.entries.values()))
+                if len(self.entries) <= self.max_sessions and oldest[0] >= now:
+                    break
+                self.entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self.entries)
+
+
+class RedisSessions(object):
+    '''
+    Quizzes serialized under SETEX, read back and written again each
+    round.
+    '''
+    def __init__(self, client, ttl, prefix='trivia:quiz:'):
+        self.client = client
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, token):
+        data = self.client.get(self.prefix + token)
+        return None if data is None else Quiz.loads(data)
+
+    def put(self, token, quiz):
+        self.client.setex(self.prefix + token, int(self.ttl), quiz.dumps())
+
+
+class LocalRedis(object):
+    '''
+    In-process stand-in for the redis commands RedisSessions uses, handy
+    for running the redis code path without a server.
+    '''
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            expires = self.expires.get(key)
+            if expires is not None and expires < time.monotonic():
+                self.data.pop(key, None)
+                self.expires.pop(key, None)
+            return self.data.get(key)
+
+    def setex(self, key, ttl, value):
+        with self.lock:
+            self.data[key] = value
+            self.expires[key] = time.monotonic() + ttl
+
+
+def from_config(config):
+    name = config.get('QUIZ_STORE', 'memory')
+    ttl = config.get('QUIZ_SESSION_TTL', 3600)
+    if name == 'memory':
+        return MemorySessions(ttl, config.get('QUIZ_MAX_SESSIONS', 10000))
+    if name == 'redis':
+        url = config.get('QUIZ_REDIS_URL', 'local://')
+        if url == 'local://':
+            client = LocalRedis()
+        else:
+            import redis
+            client = redis.Redis.from_url(url)
+        return RedisSessions(client, ttl)
+    raise ValueError('Unknown QUIZ_STORE ' + name)
@@ -0,0 +1,135 @@
+import re
+from sqlalchemy import (inspect, text)
+from models import Question
+
+
+# ----------------------------------------------------------------------------#
+# Question search.
+#
+# A search matches the words of the term in the question or the answer,
+# ranks matches in the question above matches in the answer, and returns
+# one page of SEARCH_PER_PAGE questions. At most SEARCH_MAX_RESULTS
+# matches are considered, a term matching more of the bank is ranked
+# among the first SEARCH_MAX_RESULTS found, so no search reads more than
+# that many rows whatever the size of the bank.
+#
+# On postgres the words match the search_vector generated column (the
+# question weighted A, the answer B) through its GIN index, ranked by
+# ts_rank_cd, and the term also matches as a substring through trigram
+# GIN indexes, see migrations/001_question_search.up.sql. A database
+# without the migration falls back to ILIKE.
+# On SQLite, while developing, install() keeps a questions_fts FTS5
+# table in sync with triggers, every word matches as a prefix and
+# matches are ranked by bm25.
+# ----------------------------------------------------------------------------#
+
+SEARCH_PER_PAGE = 10
+SEARCH_MAX_RESULTS = 1000
+SEARCH_MAX_TERM_LENGTH = 200
+
+# bm25 weights of the question and answer columns
+FTS_RANK = 'bm25(2.0, 1.0)'
+
+_FTS_SCHEMA = (
+    "CREATE VIRTUAL TABLE questions_fts USING fts5("
+    "question, answer, content='questions', content_rowid='id')",
+    "CREATE TRIGGER questions_fts_insert AFTER INSERT ON questions BEGIN "
+    "INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END",
+    "CREATE TRIGGER questions_fts_delete AFTER DELETE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "END",
+    "CREATE TRIGGER questions_fts_update AFTER UPDATE ON questions BEGIN "
+    "INSERT INTO questions_fts(questions_fts, rowid, question, answer) "
+    "VALUES ('delete', old.id, old.question, old.answer); "
+    "INSERT INTO questions_fts(rowid, question, answer) VALUES (new.id, new.question, new.answer); "
+    "END",
+    "INSERT INTO questions_fts(questions_fts, rank) VALUES ('rank', '" + FTS_RANK + "')",
+    "INSERT INTO questions_fts(questions_fts) VALUES ('rebuild')",
+)
+
+# engine url -> True when the search_vector column exists
+_migrated = {}
+
+
+def install(engine):
+    '''
+    Create the FTS5 table of SQLite databases, indexing the questions
+    already there. Postgres is set up by its migration.
+    '''
+    if engine.dialect.name != 'sqlite' or 'questions_fts' in inspect(engine).get_table_names():
+        return
+    with engine.begin() as connection:
+        for statement in _FTS_SCHEMA:
+            connection.execute(text(statement))
+
+
+def _escape_like(term):
+    return term.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+def _fts_query(term):
+    # every word as a quoted prefix, FTS5 operators in the term are words
+    return ' '.join('"{}"*'.format(word) for word in re.findall(r'\w+', term))
+
+
+def _page(session, matches, params):
+    '''
+    The (question ids of the page, capped total) of a `matches` select
+    returning (id, rank), lower ranks first.
+    '''
+    capped = '(' + matches + ' LIMIT :max_results) AS capped'
+    ids = [question_id for question_id, in session.execute(text(
+        'SELECT id FROM ' + capped + ' ORDER BY rank, id LIMIT :limit OFFSET :offset'), params)]
+    if ids and params['offset'] == 0 and len(ids) < params['limit']:
+        return ids, len(ids)
+    total = session.execute(text('SELECT count(*) FROM ' + capped), params).scalar()
+    return ids, total
+
+
+def _postgres_matches(session):
+    url = str(session.get_bind().url)
+    if url not in _migrated:
+        columns = inspect(session.get_bind()).get_columns(Question.__tablename__)
+        _migrated[url] = any(column['name'] == 'search_vector' for column in columns)
+    if not _migrated[url]:
+        return ("SELECT id, 0 AS rank FROM questions "
+                "WHERE question ILIKE :like OR answer ILIKE :like")
+    return ("SELECT id, -ts_rank_cd(search_vector, websearch_to_tsquery('english', :term)) AS rank "
+            "FROM questions "
+            "WHERE search_vector @@ websearch_to_tsquery('english', :term) "
+            "OR question ILIKE :like OR answer ILIKE :like")
+
+
+def search(session, term, page=1, per_page=SEARCH_PER_PAGE, max_results=SEARCH_MAX_RESULTS):
+    '''
+    Return (total matches up to max_results, questions of the page).
+    '''
+    term = term.strip()[:SEARCH_MAX_TERM_LENGTH]
+    params = {
+        'term': term,
+        'like': '%' + _escape_like(term) + '%',
+        'max_results': max_results,
+        'limit': per_page,
+        'offset': (max(page, 1) - 1) * per_page,
+    }
+    dialect = session.get_bind().dialect.name
+    if dialect == 'postgresql':
+        matches = _postgres_matches(session)
+    elif dialect == 'sqlite':
+        params['query'] = _fts_query(term)
+        if not params['query']:
+            return 0, []
+        matches = 'SELECT rowid AS id, rank FROM questions_fts WHERE questions_fts MATCH :query'
+    else:
+        matches = ("SELECT id, 0 AS rank FROM questions "
+                   "WHERE lower(question) LIKE lower(:like) ESCAPE '\\' "
+                   "OR lower(answer) LIKE lower(:like) ESCAPE '\\'")
+
+    ids, total = _page(session, matches, params)
+    if not ids:
+        return total, []
+    questions = dict((question.id, question) for question in
+                     session.query(Question).filter(Question.id.in_(ids)))
+    return total, [questions[question_id] for question_id in ids if question_id in questions]
@@ -46,6 +46,21 @@ class TriviaTestCase(unittest.TestCase):
         data = json.loads(res.data)
         self.assertTrue(data['categories'])
 
+    def test_categories_follow_changes(self):
+        self.client().get('/categories')
+        with self.app.app_context():
+            category = Category('Test Category')
+            db.session.add(category)
+            db.session.commit()
+            category_id = category.id
+        res = self.client().get('/categories')
+        data = json.loads(res.data)
+        with self.app.app_context():
+            db.session.delete(db.session.query(Category).get(category_id))
+            db.session.commit()
+
+        self.assertEqual(data['categories'][str(category_id)], 'Test Category')
+
     def test_405_get_categories(self):
         res = self.client().post("/categories")
         data = json.loads(res.data)
@@ -61,8 +76,25 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['questions'])
         self.assertTrue(len(data['questions']))
         self.assertTrue(data['total_questions'])
+        self.assertEqual(data['questions_per_page'], 10)
         self.assertTrue(data['categories'])
 
+    def test_get_questions_after(self):
+        first = json.loads(self.client().get('/questions').data)['questions']
+        res = self.client().get('/questions?after=' + str(first[0]['id']))
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(data['questions'][0]['id'], first[1]['id'])
+
+    def test_questions_per_page_config(self):
+        res = create_app({'QUESTIONS_PER_PAGE': 2}).test_client().get('/questions?page=2')
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertEqual(len(data['questions']), 2)
+        self.assertEqual(data['questions_per_page'], 2)
+
     def test_404_get_paginated_questions(self):
         res = self.client().get('/questions?page=1000')
         data = json.loads(res.data)
@@ -138,6 +170,51 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['question'])
         self.assertTrue(len(data['question']))
 
+    def test_quiz_token_rounds(self):
+        quiz = {'quiz_category': {'type': 'Art', 'id': '2'}}
+        data = json.loads(self.client().post('/quizzes', json=quiz).data)
+        quiz['quiz_token'] = data['quiz_token']
+        seen = []
+        while data['question']:
+            seen.append(data['question']['id'])
+            self.assertEqual(str(data['question']['category']), '2')
+            data = json.loads(self.client().post('/quizzes', json=quiz).data)
+
+        art = db.session.query(Question).filter(Question.category == '2').count()
+        self.assertEqual(len(set(seen)), len(seen))
+        self.assertEqual(len(seen), art)
+
+    def test_quiz_in_redis_store(self):
+        client = create_app({'QUIZ_STORE': 'redis', 'QUIZ_REDIS_URL': 'local://'}).test_client()
+        quiz = {'quiz_category': {'type': 'Art', 'id': '2'}}
+        data = json.loads(client.post('/quizzes', json=quiz).data)
+        quiz['quiz_token'] = data['quiz_token']
+        seen = []
+        while data['question']:
+            seen.append(data['question']['id'])
+            data = json.loads(client.post('/quizzes', json=quiz).data)
+
+        art = db.session.query(Question).filter(Question.category == '2').count()
+        self.assertEqual(len(set(seen)), art)
+        self.assertEqual(len(seen), art)
+
+    def test_404_if_quiz_evicted(self):
+        client = create_app({'QUIZ_MAX_SESSIONS': 1}).test_client()
+        quiz = {'quiz_category': {'type': 'Art', 'id': '2'}}
+        quiz['quiz_token'] = json.loads(client.post('/quizzes', json=quiz).data)['quiz_token']
+        client.post('/quizzes', json={'quiz_category': {'type': 'Art', 'id': '2'}})
+        res = client.post('/quizzes', json=quiz)
+
+        self.assertEqual(res.status_code, 404)
+
+    def test_404_if_quiz_token_unknown(self):
+        quiz = {'quiz_category': {'type': 'Art', 'id': '2'}, 'quiz_token': 'NO_SUCH_QUIZ'}
+        res = self.client().post('/quizzes', json=quiz)
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 404)
+        self.assertEqual(data['success'], False)
+
     def test_422_if_quiz_questions_unproccessable(self):
         fakeQuiz = self.quiz
         fakeQuiz['quiz_category'] = None
@@ -157,6 +234,29 @@ class TriviaTestCase(unittest.TestCase):
         self.assertTrue(data['totalQuestions'])
         self.assertTrue(data['categories'])
 
+    def test_search_for_answers(self):
+        res = self.client().post('/questions/search', json={"searchTerm": "Uruguay"})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('Uruguay', [question['answer'] for question in data['questions']])
+
+    def test_search_pages(self):
+        client = create_app({'SEARCH_PER_PAGE': 1}).test_client()
+        first = json.loads(client.post('/questions/search', json={"searchTerm": "Cup"}).data)
+        second = json.loads(client.post('/questions/search', json={"searchTerm": "Cup", "page": 2}).data)
+
+        self.assertEqual(len(first['questions']), 1)
+        self.assertGreaterEqual(first['totalQuestions'], 2)
+        self.assertNotEqual(first['questions'][0]['id'], second['questions'][0]['id'])
+
+    def test_422_search_without_term(self):
+        res = self.client().post('/questions/search', json={"searchTerm": " "})
+        data = json.loads(res.data)
+
+        self.assertEqual(res.status_code, 422)
+        self.assertEqual(data['success'], False)
+
     def test_404_search_for_questions(self):
         res = self.client().post('/questions/search', json={"searchTerm":"NO_TERM_FOUND"})
         data = json.loads(res.data)
@@ -165,6 +265,52 @@ class TriviaTestCase(unittest.TestCase):
         self.assertEqual(data['success'], False)
         self.assertEqual(data['message'], 'not found')
 
+    def test_metrics(self):
+        client = create_app({'INSTRUMENTATION_EXPOSE_METRICS': True}).test_client()
+        client.get('/categories')
+        res = client.get('/metrics')
+        metrics = res.get_data(as_text=True)
+
+        self.assertEqual(res.status_code, 200)
+        self.assertIn('flask_request_duration_seconds_count{endpoint="getCategories"} 1', metrics)
+        self.assertIn('flask_sql_statements_total{endpoint="getCategories"}', metrics)
+
+    def test_404_metrics_not_exposed(self):
+        res = self.client().get('/metrics')
+
+        self.assertEqual(res.status_code, 404)
+
+
+PROJECTS = os.path.normpath(os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', '..', '..'))
+
+# modules each backend ships its own copy of, and the directories holding them
+SHARED_MODULES = {
+    'instrumentation.py': [
+        '01_fyyur/starter_code',
+        '02_trivia_api/starter/backend',
+        '03_coffee_shop_full_stack/starter_code/backend/src',
+    ],
+    'applog.py': [
+        '01_fyyur/starter_code',
+        '03_coffee_shop_full_stack/starter_code/backend/src',
+    ],
+}
+
+
+@unittest.skipUnless(os.path.isdir(os.path.join(PROJECTS, '01_fyyur')), 'the other projects are not checked out')
+class SharedModulesTestCase(unittest.TestCase):
+    def test_shared_module_copies_identical(self):
+        for name, directories in SHARED_MODULES.items():
+            with self.subTest(module=name):
+                copies = {}
+                for directory in directories:
+                    with open(os.path.join(PROJECTS, directory, name), 'rb') as f:
+                        copies[directory] = f.read()
+                first = directories[0]
+                for directory in directories[1:]:
+                    self.assertTrue(copies[directory] == copies[first],
+                                    '{0}/{2} differs from {1}/{2}'.format(directory, first, name))
+
 # Make the tests conveniently executable
 if __name__ == "__main__":
     unittest.main()
@@ -12,6 +12,7 @@ class QuestionView extends Component {
       questions: [],
       page: 1,
       totalQuestions: 0,
+      questionsPerPage: 10,
       categories: {},
       currentCategory: null,
     }
@@ -29,6 +30,7 @@ class QuestionView extends Component {
         this.setState({
           questions: result.questions,
           totalQuestions: result.total_questions,
+          questionsPerPage: result.questions_per_page,
           categories: result.categories,
           currentCategory: result.current_category })
         return;
@@ -46,7 +48,7 @@ class QuestionView extends Component {
 
   createPagination(){
     let pageNumbers = [];
-    let maxPage = Math.ceil(this.state.totalQuestions / 10)
+    let maxPage = Math.ceil(this.state.totalQuestions / this.state.questionsPerPage)
     for (let i = 1; i <= maxPage; i++) {
       pageNumbers.push(
         <span
@@ -10,6 +10,7 @@ class QuizView extends Component {
     super();
     this.state = {
         quizCategory: null,
+        quizToken: null,
         previousQuestions: [], 
         showAnswer: false,
         categories: {},
@@ -53,7 +54,7 @@ class QuizView extends Component {
       dataType: 'json',
       contentType: 'application/json',
       data: JSON.stringify({
-        previous_questions: previousQuestions,
+        quiz_token: this.state.quizToken,
         quiz_category: this.state.quizCategory
       }),
       xhrFields: {
@@ -63,6 +64,7 @@ class QuizView extends Component {
       success: (result) => {
         this.setState({
           showAnswer: false,
+          quizToken: result.quiz_token,
           previousQuestions: previousQuestions,
           currentQuestion: result.question,
           guess: '',
@@ -90,6 +92,7 @@ class QuizView extends Component {
   restartGame = () => {
     this.setState({
       quizCategory: null,
+      quizToken: null,
       previousQuestions: [], 
       showAnswer: false,
       numCorrect: 0,
@@ -6,10 +6,16 @@ from flask_cors import CORS
 
 from .database.models import db_drop_and_create_all, setup_db, Drink, db
 from .auth.auth import AuthError, requires_auth
+from .instrumentation import Instrumentation
+from . import applog
 
 app = Flask(__name__)
 setup_db(app)
 CORS(app)
+# /metrics and /metrics/profiles are not behind Auth0, off unless asked for
+app.config['INSTRUMENTATION_EXPOSE_METRICS'] = os.environ.get('COFFEE_SHOP_EXPOSE_METRICS') == '1'
+instrumentation = Instrumentation(app)
+applog.init_app(app)
 
 '''
 !! NOTE THIS WILL DROP ALL RECORDS AND START YOUR DB FROM SCRATCH
@@ -78,8 +84,8 @@ def create_drink():
         else:
             abort(422)
 
-    except Exception as ex:
-        print(ex)
+    except Exception:
+        app.logger.exception('create_drink failed')
         db.session.rollback()
         abort(422)
     finally:
@@ -108,8 +114,8 @@ def update_drink(id):
             'success': True,
             'drinks': [drink.long()]
         })
-    except Exception as ex:
-        print(ex)
+    except Exception:
+        app.logger.exception('update_drink failed')
         db.session.rollback()
         abort(422)
     finally:
@@ -1,5 +1,5 @@
 import json
-from flask import request, _request_ctx_stack, abort
+from flask import request, _request_ctx_stack, abort, current_app
 from functools import wraps
 from jose import jwt
 from urllib.request import urlopen
@@ -143,7 +143,7 @@ def requires_auth(permission=''):
                 check_permissions(permission, payload)
                 return f(*args, **kwargs)
             except Exception as ex:
-                print(ex)
+                current_app.logger.warning('authorization failed: %s', ex)
                 abort(401)
 
         return wrapper